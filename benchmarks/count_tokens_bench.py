@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import tiktoken
+
+from synthetic import write_requests
+
+from labeling.count_tokens import TOKENS_PER_MESSAGE, TOKENS_PER_REQUEST, ContadorTokens, analizar_costos_jsonl, normalizar_mensaje
+
+
+def contar_por_linea(file_path: str, encoding) -> int:
+    """
+    Implementación original: `json.loads` y `encoding.encode` de todos los
+    mensajes y del schema en cada línea, acumulando hasta el primer error
+    (p. ej. un token especial en el texto).
+    """
+    total = 0
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                body = json.loads(line).get("body", {})
+                for msg in body.get("messages", []):
+                    content, role = normalizar_mensaje(msg)
+                    total += len(encoding.encode(content))
+                    total += len(encoding.encode(role))
+                    total += TOKENS_PER_MESSAGE
+                total += TOKENS_PER_REQUEST
+                if "response_format" in body:
+                    total += len(encoding.encode(json.dumps(body["response_format"])))
+            except Exception:
+                pass
+    return total
+
+
+def cronometrar(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main(n_lines: int, task: str, encoding_name: str, threads: int, workers: int, input_file: str = None):
+    encoding = tiktoken.get_encoding(encoding_name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if input_file is None:
+            input_file = os.path.join(tmp, "requests.jsonl")
+            print(f"🔄 Generando {n_lines:,} peticiones sintéticas ({task})...")
+            write_requests(input_file, n_lines, task)
+        size_mb = os.path.getsize(input_file) / (1024 * 1024)
+
+        runs = [("Antes (por línea)", lambda: contar_por_linea(input_file, encoding))]
+        runs.append(("ContadorTokens", lambda: ContadorTokens(encoding).contar_lineas(open(input_file, "rb"))[0]))
+        if threads > 1:
+            runs.append((f"+ {threads} hilos", lambda: ContadorTokens(encoding, threads=threads).contar_lineas(open(input_file, "rb"))[0]))
+        if workers > 1:
+            def con_procesos():
+                import contextlib
+                import io
+                with contextlib.redirect_stdout(io.StringIO()):
+                    return analizar_costos_jsonl(input_file, encoding_name, workers=workers, threads=threads)["input_tokens"]
+            runs.append((f"+ {workers} procesos", con_procesos))
+
+        separator = "─" * 56
+        print(f"\n⏱️  BENCHMARK DE count_tokens ({size_mb:,.1f} MB, {os.cpu_count()} CPUs)")
+        print(separator)
+        reference = None
+        for name, fn in runs:
+            tokens, elapsed = cronometrar(fn)
+            if reference is None:
+                reference = (tokens, elapsed)
+            identical = "✅" if tokens == reference[0] else "❌ distinto"
+            print(f"{name:<20} : {elapsed:7.2f}s  {reference[1] / elapsed:5.1f}x  {tokens:,} tokens {identical}")
+        print(separator)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara el conteo de tokens original (línea a línea) con ContadorTokens.")
+    parser.add_argument("-n", "--n_lines", type=int, default=100_000, help="Peticiones sintéticas a generar.")
+    parser.add_argument("-t", "--type", type=str, default="sensacionalism", choices=["clickbait", "sensacionalism", "both"])
+    parser.add_argument("-f", "--file", type=str, default=None, help="JSONL existente en lugar de uno sintético.")
+    parser.add_argument("--encoding_name", type=str, default="o200k_base")
+    parser.add_argument("--threads", type=int, default=1, help="Hilos de tiktoken (`encode_ordinary_batch`).")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos de `analizar_costos_jsonl`.")
+
+    args = parser.parse_args()
+    main(args.n_lines, args.type, args.encoding_name, args.threads, args.workers, args.file)
@@ -0,0 +1,98 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from synthetic import peak_rss_mb, write_parquet
+
+from labeling.generate_file import TASKS, generate_file_from_parquet, response_format
+
+
+def generate_file_por_fila(filename: str, model: str, prompt: str, json_schema: dict, nombre_schema: str, input_file: str, text_column: str = "texto"):
+    """Implementación original: DataFrame completo, `to_dict(orient="records")` y `json.dumps` de cada petición."""
+    df = pd.read_parquet(input_file)
+    dataset = df.to_dict(orient="records")
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        for item in dataset:
+            request_body = {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": item[text_column]}
+                ],
+                "response_format": response_format(json_schema, nombre_schema)
+            }
+            batch_request = {
+                "custom_id": item["id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": request_body
+            }
+            f.write(json.dumps(batch_request, ensure_ascii=False) + '\n')
+
+
+def run_child(mode: str, input_file: str, output_file: str, task: str):
+    """Un modo en este proceso; imprime en la última línea `{"seconds", "peak_rss_mb"}`."""
+    prompt, model, schema_name = TASKS[task]
+    generate = generate_file_from_parquet if mode == "stream" else generate_file_por_fila
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate(output_file, "gpt-5-mini", prompt, model.model_json_schema(), schema_name, input_file)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_rss_mb()}))
+
+
+def measure(mode: str, input_file: str, output_file: str, task: str) -> dict:
+    """Cada medición en un proceso nuevo, para que el pico de RSS no arrastre el de la anterior."""
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode, "--input_file", input_file, "--output_file", output_file, "--type", task]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    digest = hashlib.sha256()
+    with open(output_file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    report["sha256"] = digest.hexdigest()
+    return report
+
+
+def main(n_rows: int, chars: int, task: str):
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "news.parquet")
+        print(f"🔄 Generando {n_rows:,} noticias sintéticas (~{chars} caracteres)...")
+        write_parquet(input_file, n_rows, chars)
+
+        separator = "─" * 60
+        print(f"\n⏱️  BENCHMARK DE generate_file ({task})")
+        print(separator)
+        reports = {}
+        for mode, name in (("rows", "Antes (por fila)"), ("stream", "Envelope + iter_batches")):
+            reports[mode] = report = measure(mode, input_file, os.path.join(tmp, f"{mode}.jsonl"), task)
+            print(f"{name:<24} : {n_rows / report['seconds']:>9,.0f} filas/s | {report['peak_rss_mb']:>6,.0f} MB RSS pico")
+        print(separator)
+        identical = reports["rows"]["sha256"] == reports["stream"]["sha256"]
+        print("✅ Salida idéntica byte a byte" if identical else "❌ Las salidas difieren")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara la generación original (por fila) con la de envelope preserializado e iter_batches.")
+    parser.add_argument("-n", "--n_rows", type=int, default=1_000_000, help="Filas del Parquet sintético.")
+    parser.add_argument("--chars", type=int, default=450, help="Longitud media de cada texto.")
+    parser.add_argument("-t", "--type", type=str, default="sensacionalism", choices=list(TASKS))
+    parser.add_argument("--child", type=str, choices=["rows", "stream"], default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--input_file", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output_file", type=str, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child, args.input_file, args.output_file, args.type)
+    else:
+        main(args.n_rows, args.chars, args.type)
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import peak_rss_mb, write_requests
+
+from labeling.runner import build_client, process_file, process_file_stream
+
+CONTENT = json.dumps({"clickbait_reasoning": "Titular informativo sin huecos de curiosidad.", "is_clickbait": False})
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # Cola de conexiones suficiente para la concurrencia del benchmark
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def serve(latency: float):
+    """
+    Endpoint de chat completions local con latencia fija, en su propio
+    proceso: el runner se mide con el cliente HTTP real de `openai` y su
+    pool de conexiones (keep-alive con HTTP/1.1). Imprime el puerto.
+    """
+    served = 0
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            nonlocal served
+            request = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))))
+            served += 1
+            time.sleep(latency)
+            body = {
+                "id": f"req_{served}",
+                "object": "chat.completion",
+                "created": 0,
+                "model": request["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": CONTENT}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+            }
+            out = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    httpd = StubHTTPServer(("127.0.0.1", 0), Handler)
+    print(httpd.server_address[1], flush=True)
+    httpd.serve_forever()
+
+
+def start_server(latency: float) -> tuple:
+    """Lanza `serve` en un subproceso y devuelve `(proceso, base_url)`."""
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--latency", str(latency)], stdout=subprocess.PIPE, text=True)
+    port = int(server.stdout.readline())
+    return server, f"http://127.0.0.1:{port}/v1"
+
+
+def run_child(mode: str, input_file: str, output_file: str, concurrency: int, base_url: str):
+    """Un modo en este proceso; imprime en la última línea `{"seconds", "peak_rss_mb"}`."""
+    client = build_client(api_key="bench", base_url=base_url)
+    started = time.perf_counter()
+    if mode == "stream":
+        asyncio.run(process_file_stream(input_file, output_file, client, concurrency))
+    else:
+        asyncio.run(process_file(input_file, output_file, client, concurrency))
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_rss_mb()}))
+
+
+def measure(mode: str, input_file: str, output_file: str, concurrency: int, base_url: str) -> dict:
+    """Cada medición en un proceso nuevo, para que el pico de RSS no arrastre el de la anterior."""
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode, "--input_file", input_file, "--output_file", output_file, "--concurrency", str(concurrency), "--base_url", base_url]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    report["results"] = report["errors"] = 0
+    with open(output_file, "rb") as f:
+        for line in f:
+            report["results"] += 1
+            report["errors"] += json.loads(line)["error"] is not None
+    return report
+
+
+def main(sizes: list, concurrency: int, latency: float):
+    separator = "─" * 75
+    print(f"\n⏱️  BENCHMARK DE process_async (concurrencia {concurrency}, servidor HTTP local con latencia {latency * 1000:.0f} ms)")
+    print(separator)
+    print(f"{'Líneas':>10} | {'Modo':<23} | {'req/s':>8} | {'RSS pico':>9} | {'Resultados':>10} | Errores")
+    print(separator)
+    server, base_url = start_server(latency)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in sizes:
+                input_file = os.path.join(tmp, f"requests_{n}.jsonl")
+                write_requests(input_file, n, "clickbait")
+                for mode, name in (("memory", "Antes (todo en memoria)"), ("stream", "--stream")):
+                    output_file = os.path.join(tmp, f"results_{mode}_{n}.jsonl")
+                    report = measure(mode, input_file, output_file, concurrency, base_url)
+                    print(f"{n:>10,} | {name:<23} | {n / report['seconds']:>8,.0f} | {report['peak_rss_mb']:>6,.0f} MB | {report['results']:>10,} | {report['errors']:,}")
+    finally:
+        server.terminate()
+        server.wait()
+    print(separator)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara la memoria y el throughput de process_file (todo en memoria) y process_file_stream contra un servidor HTTP local.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5_000, 20_000], help="Líneas de entrada de cada medición.")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01, help="Latencia del servidor local por petición, en segundos.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child", type=str, choices=["memory", "stream"], default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--input_file", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output_file", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--base_url", type=str, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.latency)
+    elif args.child:
+        run_child(args.child, args.input_file, args.output_file, args.concurrency, args.base_url)
+    else:
+        main(args.sizes, args.concurrency, args.latency)
@@ -0,0 +1,93 @@
+import json
+import os
+import random
+import sys
+
+# Los benchmarks se ejecutan como scripts desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = (
+    "el gobierno anuncia nuevas medidas para la economía tras la crisis "
+    "no vas a creer lo que pasó después increíble escándalo en el congreso "
+    "los expertos advierten sobre el impacto de la subida de precios "
+    "un vecino de madrid descubre el secreto que nadie quiere contar "
+    "última hora el tribunal supremo rechaza el recurso de la defensa"
+).split()
+
+
+def synthetic_texts(n: int, chars: int = 450, seed: int = 0) -> list:
+    """`n` noticias sintéticas de unos `chars` caracteres (titular + cuerpo), reproducibles con `seed`."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        words = []
+        length = 0
+        target = rng.randint(chars // 2, chars * 3 // 2)
+        while length < target:
+            word = rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        texts.append(" ".join(words).capitalize() + ".")
+    return texts
+
+
+def write_parquet(path: str, n: int, chars: int = 450, seed: int = 0, row_group_size: int = 65_536):
+    """Parquet de origen con las columnas `id` y `texto`, escrito por row groups."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([pa.field("id", pa.string()), pa.field("texto", pa.string())])
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, n, row_group_size):
+            size = min(row_group_size, n - start)
+            texts = synthetic_texts(size, chars, seed + start)
+            ids = [f"noticia-{i}" for i in range(start, start + size)]
+            writer.write_table(pa.table({"id": ids, "texto": texts}, schema=schema))
+
+
+def write_requests(path: str, n: int, task: str = "sensacionalism", chars: int = 450, seed: int = 0):
+    """JSONL de peticiones en formato Batch API, como el que produce `generate_file`."""
+    from labeling.generate_file import TASKS, build_envelope
+
+    prompt, model, schema_name = TASKS[task]
+    head, middle, tail = build_envelope("gpt-5-mini", prompt, model.model_json_schema(), schema_name)
+    with open(path, "w", encoding="utf-8") as f:
+        for i, text in enumerate(synthetic_texts(n, chars, seed)):
+            f.write(head + json.dumps(f"noticia-{i}") + middle + json.dumps(text, ensure_ascii=False) + tail)
+
+
+def synthetic_responses(model, n: int, invalid_ratio: float = 0.02, seed: int = 0) -> list:
+    """
+    Respuestas sintéticas del modelo Pydantic `model`: válidas y, con
+    `invalid_ratio`, truncadas, con texto extra, en un bloque ```json o rotas.
+    """
+    rng = random.Random(seed)
+    responses = []
+    for _ in range(n):
+        content = {}
+        for name, info in model.model_fields.items():
+            if info.annotation is bool:
+                content[name] = rng.random() < 0.5
+            else:
+                content[name] = " ".join(rng.choices(WORDS, k=rng.randint(5, 20)))
+        text = json.dumps(content, ensure_ascii=False)
+
+        if rng.random() < invalid_ratio:
+            kind = rng.randrange(4)
+            if kind == 0:
+                text = text[:rng.randint(1, len(text) - 1)]
+            elif kind == 1:
+                text = text + "\nEspero que este análisis sea útil."
+            elif kind == 2:
+                text = "```json\n" + text + "\n```"
+            else:
+                text = text.replace(":", " ", 1)
+        responses.append(text)
+    return responses
+
+
+def peak_rss_mb() -> float:
+    """Pico de memoria residente del proceso actual, en MB."""
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
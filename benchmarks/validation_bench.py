@@ -0,0 +1,66 @@
+import argparse
+import json
+import time
+
+from pydantic import ValidationError
+
+from synthetic import synthetic_responses
+
+from labeling.generate_file import TASKS
+from labeling.validation import ResponseValidator
+
+
+def main(task: str, n: int, invalid_ratio: float, chunk_size: int, baseline: bool, seed: int):
+    """
+    Mide el throughput de `ResponseValidator.check` sobre `n` respuestas
+    sintéticas (generadas por bloques, fuera del tiempo medido). Con
+    `baseline` mide también `json.loads` + `model_validate` como referencia.
+    """
+    model, schema_name = TASKS[task][1], TASKS[task][2]
+    validator = ResponseValidator()
+    adapter = validator.adapters[schema_name]
+
+    elapsed = baseline_elapsed = 0.0
+    done = 0
+    while done < n:
+        responses = synthetic_responses(model, min(chunk_size, n - done), invalid_ratio, seed + done)
+
+        started = time.perf_counter()
+        for content in responses:
+            validator.check(adapter, content)
+        elapsed += time.perf_counter() - started
+
+        if baseline:
+            started = time.perf_counter()
+            for content in responses:
+                try:
+                    model.model_validate(json.loads(content))
+                except (ValueError, ValidationError):
+                    pass
+            baseline_elapsed += time.perf_counter() - started
+        done += len(responses)
+
+    separator = "─" * 40
+    print(f"\n⏱️  BENCHMARK DE VALIDACIÓN ({task})")
+    print(separator)
+    print(f"{'Respuestas':<20} : {n:,}")
+    print(f"{'Tiempo':<20} : {elapsed:.2f}s ({n / elapsed:,.0f} resp/s)")
+    print(f"{'Válidas':<20} : {validator.valid:,}")
+    print(f"{'Reparadas':<20} : {validator.repaired:,}")
+    print(f"{'Inválidas':<20} : {sum(validator.errors.values()):,}")
+    if baseline:
+        print(f"{'Referencia':<20} : {baseline_elapsed:.2f}s ({n / baseline_elapsed:,.0f} resp/s)")
+    print(separator)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de validación y reparación de respuestas estructuradas.")
+    parser.add_argument("-t", "--type", type=str, choices=list(TASKS), default="both", help="Tarea cuyo modelo se valida.")
+    parser.add_argument("-n", "--n_responses", type=int, default=1_000_000, help="Número de respuestas sintéticas.")
+    parser.add_argument("--invalid_ratio", type=float, default=0.02, help="Fracción de respuestas truncadas, con texto extra o rotas.")
+    parser.add_argument("--chunk_size", type=int, default=100_000, help="Respuestas generadas por bloque (acota la memoria).")
+    parser.add_argument("--baseline", action="store_true", help="Compara con json.loads + model_validate.")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    main(args.type, args.n_responses, args.invalid_ratio, args.chunk_size, args.baseline, args.seed)
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+
+
+def request_key(body: dict, model: str = None) -> str:
+    """
+    Hash SHA-256 de (modelo, prompt de sistema, response_format, contenido de
+    usuario). Dos peticiones con la misma clave producen la misma respuesta.
+    """
+    messages = body.get("messages") or []
+    system = [m.get("content") for m in messages if m.get("role") == "system"]
+    user = [m.get("content") for m in messages if m.get("role") != "system"]
+
+    payload = json.dumps(
+        [model or body.get("model"), system, body.get("response_format"), user],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Caché persistente (SQLite) de respuestas indexada por `request_key`.
+    Admite expulsión por antigüedad (`max_age_days`) y por tamaño
+    (`max_entries`, se eliminan primero las entradas menos usadas), que se
+    aplica al abrir, al cerrar y cada `evict_every` escrituras.
+
+    Las peticiones con la misma clave que llegan mientras la primera sigue en
+    vuelo (`claim`) esperan su respuesta en lugar de repetir la llamada. Se
+    cuentan aparte (`coalesced`): ni son aciertos ni generan una llamada. Los
+    fallos (`misses`) son las peticiones que llaman a la API.
+    """
+
+    def __init__(self, path: str, max_entries: int = None, max_age_days: float = None, commit_every: int = 100, evict_every: int = 10_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.commit_every = commit_every
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._pending = 0
+        self._puts = 0
+        self._inflight = {}
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " content TEXT,"
+            " request_id TEXT,"
+            " created_at REAL,"
+            " accessed_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed_at)")
+        self.evict()
+
+    def get(self, key: str):
+        row = self.conn.execute(
+            "SELECT content, request_id, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or self._expired(row[2]):
+            # El fallo se cuenta en `claim`: la petición puede acabar esperando a otra en vuelo
+            return None
+
+        self.hits += 1
+        self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._maybe_commit()
+        return {"content": row[0], "request_id": row[1]}
+
+    def put(self, key: str, content: str, request_id: str = None):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, content, request_id, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, content, request_id, now, now),
+        )
+        waiting = self._inflight.pop(key, None)
+        if waiting is not None and not waiting.done():
+            waiting.set_result({"content": content, "request_id": request_id})
+
+        self._puts += 1
+        if self.evict_every and self._puts % self.evict_every == 0 and (self.max_entries or self.max_age_days):
+            self.evict()
+        else:
+            self._maybe_commit()
+
+    def claim(self, key: str):
+        """
+        Registra una petición en vuelo para `key`. Devuelve None si es la
+        primera (el llamador debe pedirla y luego llamar a `put` o `release`)
+        o un futuro con la entrada que guardará la que ya está en vuelo.
+        """
+        waiting = self._inflight.get(key)
+        if waiting is not None:
+            return waiting
+        self.misses += 1
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def release(self, key: str):
+        """Libera a quienes esperan `key` si la petición terminó sin respuesta (error o cancelación): reciben None."""
+        waiting = self._inflight.pop(key, None)
+        if waiting is not None and not waiting.done():
+            waiting.set_result(None)
+
+    def evict(self):
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            self.conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+
+        if self.max_entries is not None:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        self.conn.commit()
+
+    def close(self):
+        self.evict()
+        self.conn.close()
+
+    def print_summary(self):
+        total = self.hits + self.misses + self.coalesced
+        if not total:
+            return
+        print(f"💾 Caché: {self.hits} aciertos / {self.misses} fallos ({self.hits / total:.1%} de aciertos)")
+        if self.coalesced:
+            print(f"💾 {self.coalesced} peticiones repetidas esperaron a la que ya estaba en vuelo ({(self.hits + self.coalesced) / total:.1%} sin llamar a la API)")
+
+    def _expired(self, created_at: float) -> bool:
+        return self.max_age_days is not None and created_at < time.time() - self.max_age_days * 86400
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.conn.commit()
+            self._pending = 0
@@ -0,0 +1,129 @@
+import json
+import os
+
+try:
+    from .io_utils import compression_of, open_binary
+except ImportError:
+    from io_utils import compression_of, open_binary
+
+
+class Checkpoint:
+    """
+    Diario append-only de `custom_id` completados, junto al archivo de salida.
+
+    Cada entrada guarda el `custom_id` y el offset (en bytes) del archivo de
+    salida tras escribir su resultado. Al reanudar, el archivo de salida se
+    trunca al último offset registrado, de modo que una línea a medio escribir
+    en el momento del corte nunca queda en la salida. Entre sincronizaciones
+    el sistema puede llevar a disco el diario antes que la salida: tras un
+    corte de luz, las entradas que apuntan más allá del final de la salida se
+    descartan (y se vuelven a procesar).
+
+    Si la salida es `.gz`/`.zst`, los resultados se comprimen en bloques de
+    `sync_every` y se registran en el diario al cerrar cada bloque: al
+    reanudar se trunca en el último bloque completo y se repiten como mucho
+    los resultados del bloque interrumpido.
+    """
+
+    def __init__(self, output_file: str, sync_every: int = 100):
+        self.output_file = output_file
+        self.journal_file = output_file + ".ckpt"
+        self.sync_every = sync_every
+        self.compressed = compression_of(output_file) is not None
+        self._out = None
+        self._journal = None
+        self._pending = 0
+        self._block = []
+
+    def load(self) -> set:
+        """Lee el diario y devuelve el conjunto de `custom_id` ya completados."""
+        done = set()
+        offset = 0
+
+        if not os.path.exists(self.journal_file):
+            if os.path.exists(self.output_file) and os.path.getsize(self.output_file) > 0:
+                raise ValueError(
+                    f"❌ '{self.output_file}' existe pero no hay diario '{self.journal_file}'. "
+                    "No se puede reanudar sin perder datos."
+                )
+            return done
+
+        size = os.path.getsize(self.output_file) if os.path.exists(self.output_file) else 0
+        valid = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                try:
+                    entry_offset, custom_id = json.loads(line)
+                except (json.JSONDecodeError, ValueError):
+                    # Última línea incompleta tras un corte
+                    break
+                if not line.endswith(b'\n') or entry_offset > size:
+                    # Entrada sin terminar o cuya salida no llegó a disco
+                    break
+                offset = entry_offset
+                done.add(str(custom_id))
+                valid += len(line)
+
+        # Se descartan del diario las entradas no válidas para que no
+        # reaparezcan cuando la salida vuelva a crecer
+        with open(self.journal_file, 'r+b') as f:
+            f.truncate(valid)
+        if os.path.exists(self.output_file):
+            with open(self.output_file, 'r+b') as f:
+                f.truncate(offset)
+
+        return done
+
+    def open(self, resume: bool = False):
+        mode = 'ab' if resume else 'wb'
+        self._out = open_binary(self.output_file, mode)
+        self._journal = open(self.journal_file, mode)
+        return self
+
+    def write(self, result: dict):
+        """Escribe un resultado en la salida y lo registra en el diario."""
+        self._out.write((json.dumps(result, ensure_ascii=False) + '\n').encode('utf-8'))
+        if self.compressed:
+            self._block.append(result.get("custom_id"))
+        else:
+            self._out.flush()
+            self._log(self._out.tell(), [result.get("custom_id")])
+
+        self._pending += 1
+        if self._pending >= self.sync_every:
+            self.sync()
+
+    def _log(self, offset: int, custom_ids: list):
+        for custom_id in custom_ids:
+            entry = [offset, custom_id]
+            self._journal.write((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+        self._journal.flush()
+
+    def sync(self):
+        # Los bloques comprimidos se registran después de sincronizar la
+        # salida. Sin comprimir, el diario se escribe resultado a resultado y
+        # puede adelantarse a la salida hasta este fsync (ver `load`).
+        if self.compressed:
+            offset = self._out.end_block()
+            os.fsync(self._out.fileno())
+            self._log(offset, self._block)
+            self._block = []
+        else:
+            os.fsync(self._out.fileno())
+        os.fsync(self._journal.fileno())
+        self._pending = 0
+
+    def close(self):
+        if self._out is None:
+            return
+        self.sync()
+        self._out.close()
+        self._journal.close()
+        self._out = None
+        self._journal = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+
+from openai import AsyncOpenAI, AsyncAzureOpenAI
+
+try:
+    from .rate_limit import RateLimiter, create_with_rate_limit
+    from .retry import classify_error, retry_after_seconds
+except ImportError:
+    from rate_limit import RateLimiter, create_with_rate_limit
+    from retry import classify_error, retry_after_seconds
+
+# Clases de error que sacan temporalmente un endpoint de la rotación
+COOLDOWN_ERRORS = {"rate_limit", "server_error", "timeout", "connection"}
+
+
+class Endpoint:
+    """Un despliegue (Azure u OpenAI) del pool, con su cliente, peso y estadísticas."""
+
+    def __init__(self, name: str, client, model: str = None, weight: float = 1.0, max_concurrency: int = None, rate_limiter: RateLimiter = None):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.outstanding = 0
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.errors = 0
+        self.tokens = 0
+
+    def available(self, now: float) -> bool:
+        if now < self.cooldown_until:
+            return False
+        return self.max_concurrency is None or self.outstanding < self.max_concurrency
+
+    def load(self) -> float:
+        """Peticiones en vuelo relativas al peso (menor = más libre)."""
+        return (self.outstanding + 1) / self.weight
+
+
+def build_endpoint(config: dict) -> Endpoint:
+    """
+    Crea un `Endpoint` a partir de una entrada del archivo de configuración.
+    La clave se puede indicar en claro (`api_key`) o por variable de entorno
+    (`api_key_env`).
+    """
+    api_key = config.get("api_key") or os.getenv(config.get("api_key_env", ""))
+    if not api_key:
+        raise ValueError(f"❌ Falta la API Key del endpoint '{config.get('name')}' (api_key o api_key_env).")
+
+    if config.get("provider", "openai") == "azure":
+        client = AsyncAzureOpenAI(
+            api_key=api_key,
+            api_version=config.get("api_version", "2024-02-15-preview"),
+            azure_endpoint=config["azure_endpoint"],
+            max_retries=0
+        )
+    else:
+        client = AsyncOpenAI(api_key=api_key, base_url=config.get("base_url"), max_retries=0)
+
+    rpm, tpm = config.get("rpm"), config.get("tpm")
+    return Endpoint(
+        name=config.get("name") or config.get("azure_endpoint") or config.get("base_url") or "openai",
+        client=client,
+        model=config.get("force_model"),
+        weight=float(config.get("weight", 1.0)),
+        max_concurrency=config.get("max_concurrency"),
+        rate_limiter=RateLimiter(rpm=rpm, tpm=tpm) if (rpm or tpm) else None
+    )
+
+
+class ClientPool:
+    """
+    Reparte las peticiones entre varios endpoints. Se usa como un cliente
+    más (`pool.chat.completions.create(...)`), de modo que el runner no cambia:
+
+    * Enrutado por menor número de peticiones en vuelo, ponderado por `weight`.
+    * Un endpoint que devuelve 429/5xx (o timeouts/errores de conexión) sale de
+      la rotación durante `Retry-After` o un enfriamiento exponencial.
+    * Cada endpoint puede tener su propio límite RPM/TPM (`rpm`/`tpm`).
+    """
+
+    def __init__(self, endpoints: list, base_cooldown: float = 5.0, max_cooldown: float = 120.0):
+        if not endpoints:
+            raise ValueError("❌ El pool necesita al menos un endpoint.")
+        self.endpoints = endpoints
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.started_at = time.monotonic()
+        self._changed = asyncio.Condition()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ClientPool":
+        """Archivo JSON `{"endpoints": [{name, provider, api_key|api_key_env, azure_endpoint|base_url, api_version, force_model, weight, rpm, tpm, max_concurrency}]}`."""
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return cls([build_endpoint(entry) for entry in config["endpoints"]], **kwargs)
+
+    async def acquire(self) -> Endpoint:
+        async with self._changed:
+            while True:
+                now = time.monotonic()
+                candidates = [e for e in self.endpoints if e.available(now)]
+                if candidates:
+                    endpoint = min(candidates, key=Endpoint.load)
+                    endpoint.outstanding += 1
+                    return endpoint
+
+                # Todos enfriándose o llenos: se espera a una liberación o al primer fin de enfriamiento
+                cooling = [e.cooldown_until for e in self.endpoints if e.cooldown_until > now]
+                timeout = min(cooling) - now if cooling else None
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, endpoint: Endpoint, error: Exception = None, response=None, cancelled: bool = False):
+        endpoint.outstanding -= 1
+
+        if cancelled:
+            # Una llamada cancelada (p. ej. las muestras sobrantes de una votación)
+            # no es ni un éxito ni un fallo del endpoint: solo libera su hueco
+            pass
+        elif error is None:
+            endpoint.requests += 1
+            endpoint.consecutive_failures = 0
+            usage = getattr(response, "usage", None)
+            endpoint.tokens += getattr(usage, "total_tokens", 0) or 0
+        else:
+            endpoint.requests += 1
+            endpoint.errors += 1
+            error_class, _ = classify_error(error)
+            if error_class in COOLDOWN_ERRORS:
+                endpoint.consecutive_failures += 1
+                cooldown = retry_after_seconds(error)
+                if cooldown is None:
+                    cooldown = self.base_cooldown * 2 ** (endpoint.consecutive_failures - 1)
+                endpoint.cooldown_until = time.monotonic() + min(cooldown, self.max_cooldown)
+                # El enfriamiento ya aplica el `Retry-After`: `RetryPolicy` reintenta sin esperar
+                # y `acquire` elige otro endpoint (o espera si todos están enfriándose)
+                error.endpoint_cooldown = True
+                print(f"🧊 {endpoint.name} fuera de rotación {min(cooldown, self.max_cooldown):.1f}s ({error_class}).")
+
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def create(self, **kwargs):
+        endpoint = await self.acquire()
+        if endpoint.model:
+            kwargs["model"] = endpoint.model
+
+        error = response = None
+        cancelled = False
+        try:
+            response = await create_with_rate_limit(endpoint.client, endpoint.rate_limiter, kwargs, **kwargs)
+            return response
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            await self.release(endpoint, error, response, cancelled)
+
+    def print_summary(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        separator = "─" * 60
+        print("🌐 ENDPOINTS")
+        print(separator)
+        print(f"{'ENDPOINT':<20} | {'PETICIONES':<10} | {'ERRORES':<7} | {'REQ/S':<6} | {'TOKENS/S'}")
+        print(separator)
+        for e in self.endpoints:
+            print(f"{e.name[:20]:<20} | {e.requests:<10} | {e.errors:<7} | {e.requests / elapsed:<6.1f} | {e.tokens / elapsed:.0f}")
+        print(separator + "\n")
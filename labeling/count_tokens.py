@@ -1,16 +1,332 @@
 import tiktoken
 import json
 import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
 import argparse
 
+try:
+    from .forecast import SIN_SCHEMA, PrevisionSalida, bucket_tokens, schema_de_formato
+    from .objects import CombinedAnalysis
+    from .io_utils import compression_of, open_binary
+    from .tokens import TOKENS_PER_MESSAGE, TOKENS_PER_REQUEST, contar_tokens_request, normalizar_mensaje
+except ImportError:
+    from forecast import SIN_SCHEMA, PrevisionSalida, bucket_tokens, schema_de_formato
+    from objects import CombinedAnalysis
+    from io_utils import compression_of, open_binary
+    from tokens import TOKENS_PER_MESSAGE, TOKENS_PER_REQUEST, contar_tokens_request, normalizar_mensaje
+
+# Schema de las peticiones combinadas (`--type both`) y tareas que sustituye
+SCHEMA_COMBINADO = CombinedAnalysis.__name__
+TAREAS_SEPARADAS = ("clickbait", "sensacionalism")
+
+# Líneas por tarea del pool cuando la entrada está comprimida
+LINES_PER_TASK = 20_000
+
+# Caché de prefijos de OpenAI: a partir de 1024 tokens, en tramos de 128
+CACHE_MIN_TOKENS = 1024
+CACHE_INCREMENT = 128
+
+def tokens_cacheables(prefix_tokens: int) -> int:
+    """Tokens de un prefijo constante que el proveedor puede servir desde su caché."""
+    if prefix_tokens < CACHE_MIN_TOKENS:
+        return 0
+    return CACHE_MIN_TOKENS + (prefix_tokens - CACHE_MIN_TOKENS) // CACHE_INCREMENT * CACHE_INCREMENT
+
+class TokensParciales(Exception):
+    """
+    Error al contar una línea, con los tokens que ya se habían sumado antes
+    de fallar (el conteo original acumulaba mensaje a mensaje).
+    """
+
+    def __init__(self, tokens: int, error: Exception):
+        super().__init__(str(error))
+        self.tokens = tokens
+
+_SIN_FORMATO = object()
+
+class ContadorTokens:
+    """
+    Motor de conteo rápido, con el mismo resultado que `contar_tokens_request`:
+
+    * Las cadenas que se repiten en todas las líneas (prompt de sistema, roles
+      y `response_format` serializado) se cuentan una sola vez gracias a una
+      caché LRU acotada.
+    * Solo los textos de usuario se tokenizan en cada línea, con
+      `encode_ordinary` (sin la comprobación de tokens especiales), por lotes
+      de `batch_size` textos y, con `threads > 1`, con
+      `encode_ordinary_batch` en varios hilos del núcleo Rust de tiktoken.
+
+    Los textos que contienen tokens especiales (p. ej. `<|endoftext|>`) hacen
+    que `encoding.encode` falle; esas líneas (y cualquier otra que falle) se
+    cuentan con `_contar_exacto`, que repite el conteo original mensaje a
+    mensaje y suma lo que se había contado antes del error.
+
+    Además agrupa las peticiones por `(schema, tramo de longitud)` para la
+    previsión de tokens de salida (ver `forecast.py`) y, para las peticiones
+    combinadas (`--type both`), calcula cuántos tokens de entrada se ahorran
+    frente a enviar las dos tareas por separado.
+    """
+
+    def __init__(self, encoding, cache_size: int = 4096, batch_size: int = 4096, threads: int = 1):
+        self.encoding = encoding
+        self.batch_size = batch_size
+        self.threads = threads
+        self._ultimo_formato = _SIN_FORMATO
+        self._ultimo_formato_tokens = 0
+        self._ultimo_schema = SIN_SCHEMA
+        self.special_tokens = tuple(encoding.special_tokens_set)
+        self.contar_cacheado = lru_cache(maxsize=cache_size)(lambda text: len(encoding.encode(text)))
+        self._constantes_separadas = None
+
+    def _tiene_especiales(self, texts: list) -> bool:
+        return any("<|" in t and any(tok in t for tok in self.special_tokens) for t in texts)
+
+    def _contar_textos(self, texts: list) -> list:
+        if self.threads > 1:
+            return [len(t) for t in self.encoding.encode_ordinary_batch(texts, num_threads=self.threads)]
+        encode = self.encoding.encode_ordinary
+        return [len(encode(text)) for text in texts]
+
+    def _contar_formato(self, rsp_fmt) -> int:
+        # En un mismo archivo el `response_format` suele ser idéntico línea a
+        # línea: comparar dicts es mucho más barato que volver a serializarlo.
+        if rsp_fmt != self._ultimo_formato:
+            self._ultimo_formato = rsp_fmt
+            self._ultimo_formato_tokens = self.contar_cacheado(json.dumps(rsp_fmt))
+            self._ultimo_schema = schema_de_formato(rsp_fmt)
+        return self._ultimo_formato_tokens
+
+    def constantes_separadas(self) -> int:
+        """Tokens de prompt de sistema y schema de las dos tareas enviadas por separado."""
+        if self._constantes_separadas is None:
+            # `generate_file` arrastra pyarrow y pandas: solo se importa para
+            # este apartado del informe (peticiones combinadas)
+            try:
+                from .generate_file import TASKS, response_format
+            except ImportError:
+                from generate_file import TASKS, response_format
+
+            self._constantes_separadas = 0
+            for tarea in TAREAS_SEPARADAS:
+                prompt, schema_model, nombre_schema = TASKS[tarea]
+                formato = response_format(schema_model.model_json_schema(), nombre_schema)
+                self._constantes_separadas += (
+                    self.contar_cacheado("system") + TOKENS_PER_MESSAGE
+                    + self.contar_cacheado(prompt)
+                    + self.contar_cacheado(json.dumps(formato))
+                )
+        return self._constantes_separadas
+
+    def contar_body(self, body: dict) -> tuple:
+        """
+        Devuelve `(input_tokens, schema, constantes)` de un `body` de petición,
+        donde `constantes` son los tokens de los mensajes de sistema y del
+        `response_format` (lo que no depende del texto de la noticia).
+        """
+        line_tokens, schema, constantes, texts = self._preparar_body(body)
+        return line_tokens + sum(self._contar_textos(texts)), schema, constantes
+
+    def _contar_exacto(self, body: dict) -> int:
+        """
+        Conteo original, mensaje a mensaje con `encoding.encode`. Si falla,
+        lanza `TokensParciales` con los tokens sumados hasta el error.
+        """
+        tokens = 0
+        try:
+            for msg in body.get("messages", []):
+                content, role = normalizar_mensaje(msg)
+                tokens += len(self.encoding.encode(content))
+                tokens += len(self.encoding.encode(role))
+                tokens += TOKENS_PER_MESSAGE
+            tokens += TOKENS_PER_REQUEST
+            if "response_format" in body:
+                tokens += len(self.encoding.encode(json.dumps(body["response_format"])))
+        except Exception as e:
+            raise TokensParciales(tokens, e) from e
+        return tokens
+
+    def _preparar_body(self, body: dict) -> tuple:
+        """Como `contar_body`, pero sin tokenizar los textos de usuario: los devuelve aparte."""
+        try:
+            line_tokens, schema, constantes, texts = self._preparar_rapido(body)
+        except Exception:
+            return self._contar_exacto(body), SIN_SCHEMA, 0, []
+        if self._tiene_especiales(texts):
+            return self._contar_exacto(body), schema, constantes, []
+        return line_tokens, schema, constantes, texts
+
+    def _preparar_rapido(self, body: dict) -> tuple:
+        line_tokens = TOKENS_PER_REQUEST
+        constantes = 0
+        texts = []
+        for msg in body.get("messages", []):
+            content, role = normalizar_mensaje(msg)
+            msg_tokens = self.contar_cacheado(role) + TOKENS_PER_MESSAGE
+            if role == "system":
+                msg_tokens += self.contar_cacheado(content)
+                constantes += msg_tokens
+            else:
+                texts.append(content)
+            line_tokens += msg_tokens
+
+        schema = SIN_SCHEMA
+        if "response_format" in body:
+            formato_tokens = self._contar_formato(body["response_format"])
+            line_tokens += formato_tokens
+            constantes += formato_tokens
+            schema = self._ultimo_schema
+        return line_tokens, schema, constantes, texts
+
+    def contar_lineas(self, lines) -> tuple:
+        """
+        Cuenta un iterable de líneas JSONL (bytes o str). Devuelve
+        `(input_tokens, line_count, avisos, grupos, ahorro, cacheables)`, donde
+        cada aviso es `(número de línea local, detalle del error o None si el
+        JSON es inválido)`, `grupos` cuenta las peticiones por `(schema, tramo
+        de longitud)`, `ahorro` son los tokens de entrada ahorrados por las
+        peticiones combinadas y `cacheables` los tokens del prefijo constante
+        (prompt de sistema + schema) que puede servir la caché de prefijos.
+        """
+        total = 0
+        line_count = 0
+        warnings = []
+        grupos = Counter()
+        ahorro = 0
+        cacheables = 0
+
+        # Las líneas se completan cuando se tokeniza su lote de textos
+        pendientes = []
+        textos = []
+
+        def vaciar():
+            nonlocal total, ahorro, cacheables
+            conteos = iter(self._contar_textos(textos))
+            for line_tokens, schema, constantes, n_textos in pendientes:
+                line_tokens += sum(next(conteos) for _ in range(n_textos))
+                total += line_tokens
+                grupos[(schema, bucket_tokens(line_tokens))] += 1
+                cacheables += tokens_cacheables(TOKENS_PER_REQUEST + constantes)
+
+                if schema == SCHEMA_COMBINADO:
+                    # Por separado: el texto y la cabecera se envían dos veces,
+                    # cada una con su propio prompt de sistema y schema
+                    por_separado = 2 * (line_tokens - constantes) + self.constantes_separadas()
+                    ahorro += por_separado - line_tokens
+            pendientes.clear()
+            textos.clear()
+
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            line = line.strip()
+            if not line: continue
+
+            line_count += 1
+            try:
+                data = json.loads(line)
+                line_tokens, schema, constantes, texts = self._preparar_body(data.get("body", {}))
+                pendientes.append((line_tokens, schema, constantes, len(texts)))
+                textos.extend(texts)
+
+            except json.JSONDecodeError:
+                warnings.append((line_count, None))
+            except TokensParciales as e:
+                total += e.tokens
+                warnings.append((line_count, str(e)))
+            except Exception as e:
+                warnings.append((line_count, str(e)))
+
+            if len(textos) >= self.batch_size:
+                vaciar()
+
+        vaciar()
+        return total, line_count, warnings, grupos, ahorro, cacheables
+
+def _contar_rango(args: tuple) -> tuple:
+    """Worker del pool: cuenta las líneas de `file_path` entre los offsets `[start, end)`."""
+    file_path, encoding_name, start, end, threads = args
+    contador = ContadorTokens(tiktoken.get_encoding(encoding_name), threads=threads)
+
+    def lineas():
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            while f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                yield line
+
+    return contador.contar_lineas(lineas())
+
+def _contar_lote(args: tuple) -> tuple:
+    """Worker del pool: cuenta un lote de líneas ya leídas (entrada comprimida)."""
+    encoding_name, lines, threads = args
+    return ContadorTokens(tiktoken.get_encoding(encoding_name), threads=threads).contar_lineas(lines)
+
+def lotes_de_lineas(file_path: str, n_lines: int = LINES_PER_TASK):
+    """Lee el JSONL (descomprimiendo en streaming) en lotes de `n_lines` líneas."""
+    with open_binary(file_path) as f:
+        lote = []
+        for line in f:
+            lote.append(line)
+            if len(lote) >= n_lines:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+def map_acotado(pool, fn, items, max_pending: int):
+    """Como `pool.map`, pero con como mucho `max_pending` tareas en vuelo (memoria acotada)."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def dividir_por_bytes(file_path: str, n_chunks: int) -> list:
+    """Offsets `(inicio, fin)` de `n_chunks` trozos del archivo, alineados a fin de línea."""
+    size = os.path.getsize(file_path)
+    bounds = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, n_chunks):
+            f.seek(max(size * i // n_chunks, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
 def analizar_costos_jsonl(
     file_path: str, 
     encoding_name: str = "o200k_base", 
     price_input_per_1m: float = None, 
-    price_output_per_1m: float = None
+    price_output_per_1m: float = None,
+    workers: int = 1,
+    results_file: str = None,
+    price_cached_input_per_1m: float = None,
+    truncation_file: str = None,
+    threads: int = 1
 ) -> dict:
-    
+    """
+    Cuenta los tokens de entrada de un JSONL de la Batch API y estima el coste.
+    Con `workers > 1` el archivo se divide por offsets de bytes y cada trozo
+    se cuenta en un proceso distinto (si está comprimido, `.gz`/`.zst`, se
+    descomprime en streaming y se reparte por lotes de líneas). Con
+    `threads > 1` cada proceso tokeniza sus lotes de textos con
+    `encode_ordinary_batch` en ese número de hilos. Con `results_file` (resultados reales de
+    una ejecución anterior) se proyectan también los tokens de salida, con un
+    intervalo de confianza del 95%. Con `price_cached_input_per_1m` los tokens
+    del prefijo constante que admite la caché de prefijos se facturan a ese
+    precio (estimación optimista: supone que todas las peticiones aciertan).
+    Si existe `truncation_file` (por defecto `<file_path>.truncation.json`,
+    generado por `generate_file --max_input_tokens`) se muestran también los
+    tokens ahorrados al recortar o trocear los textos largos.
+    """
+
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"No se encontró el archivo: {file_path}")
 
@@ -23,64 +339,45 @@ def analizar_costos_jsonl(
     total_input_tokens = 0
     total_output_tokens = 0 
     line_count = 0
-
-    TOKENS_PER_MESSAGE = 3
-    TOKENS_PER_REQUEST = 3
+    grupos = Counter()
+    ahorro_combinado = 0
+    cached_input_tokens = 0
 
     print(f"🔄 Procesando {os.path.basename(file_path)} con '{encoding_name}'...\n")
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line: continue
-            
-            line_count += 1
-            try:
-                data = json.loads(line)
-                body = data.get("body", {})
-                
-                # --- 1. Calcular Input Tokens (Messages) ---
-                messages = body.get("messages", [])
-                for msg in messages:
-                    # --- CORRECCIÓN AQUÍ ---
-                    # Obtenemos el contenido. Si es None o no es string, lo manejamos.
-                    content = msg.get("content", "")
-                    role = msg.get("role", "")
-                    
-                    # 1. Si es None, lo convertimos a string vacío
-                    if content is None:
-                        content = ""
-                    # 2. Si es una lista (multimodal/imágenes), extraemos solo el texto
-                    elif isinstance(content, list):
-                        text_parts = []
-                        for part in content:
-                            if isinstance(part, dict) and part.get("type") == "text":
-                                text_parts.append(part.get("text", ""))
-                        content = " ".join(text_parts)
-                    # 3. Si es cualquier otra cosa (números, etc), forzamos string
-                    elif not isinstance(content, str):
-                        content = str(content)
-
-                    # Validamos role también por seguridad
-                    if not isinstance(role, str):
-                        role = str(role) if role is not None else ""
-
-                    total_input_tokens += len(encoding.encode(content))
-                    total_input_tokens += len(encoding.encode(role))
-                    total_input_tokens += TOKENS_PER_MESSAGE
-                
-                total_input_tokens += TOKENS_PER_REQUEST
-
-                # --- 2. Calcular Input Tokens (Structured Outputs) ---
-                if "response_format" in body:
-                    rsp_fmt = body["response_format"]
-                    fmt_str = json.dumps(rsp_fmt) 
-                    total_input_tokens += len(encoding.encode(fmt_str))
-                
-            except json.JSONDecodeError:
-                print(f"⚠️ Error al leer JSON en línea {line_count}")
-            except Exception as e:
-                print(f"⚠️ Error inesperado en línea {line_count}: {e}")
+    if workers > 1 and compression_of(file_path):
+        lotes = ((encoding_name, lote, threads) for lote in lotes_de_lineas(file_path))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(map_acotado(pool, _contar_lote, lotes, workers * 2))
+    elif workers > 1:
+        ranges = [(file_path, encoding_name, a, b, threads) for a, b in dividir_por_bytes(file_path, workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_contar_rango, ranges))
+    else:
+        with open_binary(file_path) as f:
+            results = [ContadorTokens(encoding, threads=threads).contar_lineas(f)]
+
+    for chunk_tokens, chunk_lines, warnings, chunk_grupos, chunk_ahorro, chunk_cacheables in results:
+        for local_line, detail in warnings:
+            if detail is None:
+                print(f"⚠️ Error al leer JSON en línea {line_count + local_line}")
+            else:
+                print(f"⚠️ Error inesperado en línea {line_count + local_line}: {detail}")
+        total_input_tokens += chunk_tokens
+        line_count += chunk_lines
+        grupos.update(chunk_grupos)
+        ahorro_combinado += chunk_ahorro
+        cached_input_tokens += chunk_cacheables
+
+    prevision = None
+    if results_file:
+        prevision_salida = PrevisionSalida(encoding)
+        prevision_salida.aprender(results_file)
+        if prevision_salida.muestras:
+            prevision = prevision_salida.proyectar(grupos)
+            total_output_tokens = prevision["output_tokens"]
+        else:
+            print(f"⚠️ No se encontraron respuestas válidas en {results_file}; no se proyectan tokens de salida.")
 
     total_tokens = total_input_tokens + total_output_tokens
 
@@ -91,6 +388,8 @@ def analizar_costos_jsonl(
     
     if price_input_per_1m is not None:
         cost_input = (total_input_tokens / 1_000_000) * price_input_per_1m
+        if price_cached_input_per_1m is not None:
+            cost_input -= (cached_input_tokens / 1_000_000) * (price_input_per_1m - price_cached_input_per_1m)
     
     if price_output_per_1m is not None:
         cost_output = (total_output_tokens / 1_000_000) * price_output_per_1m
@@ -109,6 +408,9 @@ def analizar_costos_jsonl(
     
     p_in_str = f"${cost_input:.4f}" if price_input_per_1m else "N/A"
     print(f"{'Input Tokens':<15} | {total_input_tokens:<10} | {p_in_str}")
+    if price_cached_input_per_1m is not None:
+        p_cached_str = f"${(cached_input_tokens / 1_000_000) * price_cached_input_per_1m:.4f}"
+        print(f"{'  (cacheados)':<15} | {cached_input_tokens:<10} | {p_cached_str}")
     
     p_out_str = f"${cost_output:.4f}" if price_output_per_1m else "N/A"
     print(f"{'Output Tokens':<15} | {total_output_tokens:<10} | {p_out_str}")
@@ -116,15 +418,74 @@ def analizar_costos_jsonl(
     print(separator)
     p_total_str = f"${total_cost:.4f}" if (price_input_per_1m or price_output_per_1m) else "N/A"
     print(f"{'TOTAL':<15} | {total_tokens:<10} | {p_total_str}")
-    print(separator + "\n")
+    print(separator)
 
-    return {
+    report = {
         "input_tokens": total_input_tokens,
         "output_tokens": total_output_tokens,
         "total_tokens": total_tokens,
-        "estimated_cost_usd": total_cost if (price_input_per_1m or price_output_per_1m) else None
+        "estimated_cost_usd": total_cost if (price_input_per_1m or price_output_per_1m) else None,
+        "cached_input_tokens": cached_input_tokens
     }
 
+    if prevision:
+        low, high = prevision["output_tokens_low"], prevision["output_tokens_high"]
+        print(f"🔮 Salida proyectada con {prevision['muestras']} respuestas reales (IC 95%)")
+        print(f"{'Output (IC 95%)':<15} | {f'{low}-{high}':<10} | ", end="")
+        if price_output_per_1m:
+            cost_low = cost_input + (low / 1_000_000) * price_output_per_1m
+            cost_high = cost_input + (high / 1_000_000) * price_output_per_1m
+            print(f"${cost_low:.4f}-${cost_high:.4f} (total)")
+            report["estimated_cost_usd_low"] = cost_low
+            report["estimated_cost_usd_high"] = cost_high
+        else:
+            print("N/A")
+        print(separator)
+        report["output_tokens_low"] = low
+        report["output_tokens_high"] = high
+        report["forecast_samples"] = prevision["muestras"]
+
+    if ahorro_combinado:
+        por_separado = total_input_tokens + ahorro_combinado
+        print(f"🧩 Peticiones combinadas (clickbait + sensacionalismo en una sola llamada)")
+        p_sep_str = f"${(por_separado / 1_000_000) * price_input_per_1m:.4f}" if price_input_per_1m else "N/A"
+        print(f"{'Input separado':<15} | {por_separado:<10} | {p_sep_str}")
+        p_ahorro_str = f"${(ahorro_combinado / 1_000_000) * price_input_per_1m:.4f}" if price_input_per_1m else "N/A"
+        print(f"{'Ahorro input':<15} | {ahorro_combinado:<10} | {p_ahorro_str} ({ahorro_combinado / por_separado:.1%})")
+        print(separator)
+        report["input_tokens_separate"] = por_separado
+        report["input_tokens_saved"] = ahorro_combinado
+
+    try:
+        from .truncate import stats_path
+    except ImportError:
+        from truncate import stats_path
+    truncation_file = truncation_file or stats_path(file_path)
+    if os.path.exists(truncation_file):
+        with open(truncation_file, 'r', encoding='utf-8') as f:
+            recorte = json.load(f)
+        ahorro_recorte = recorte["original_tokens"] - recorte["kept_tokens"]
+        if recorte["mode"] == "chunk":
+            detalle = f"{recorte['chunked']} textos troceados en {recorte['chunks']} fragmentos (+{recorte['chunks'] - recorte['chunked']} peticiones)"
+        else:
+            detalle = f"{recorte['truncated']} textos recortados"
+        print(f"✂️  Textos largos (límite {recorte['max_tokens']} tokens): {detalle}")
+        print(f"{'Texto original':<15} | {recorte['original_tokens']:<10} |")
+        print(f"{'Texto enviado':<15} | {recorte['kept_tokens']:<10} |")
+        if ahorro_recorte > 0:
+            p_recorte_str = f"${(ahorro_recorte / 1_000_000) * price_input_per_1m:.4f}" if price_input_per_1m else "N/A"
+            print(f"{'Ahorro input':<15} | {ahorro_recorte:<10} | {p_recorte_str} ({ahorro_recorte / (total_input_tokens + ahorro_recorte):.1%})")
+        print(separator)
+        report["truncation_tokens_saved"] = ahorro_recorte
+        report["truncated_texts"] = recorte["truncated"]
+        report["chunked_texts"] = recorte["chunked"]
+
+    if price_cached_input_per_1m is not None and not cached_input_tokens:
+        print(f"ℹ️ El prefijo constante no llega a {CACHE_MIN_TOKENS} tokens: la caché de prefijos no se aplicará.")
+
+    print()
+    return report
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Calcula los tokens y el costo estimado de un archivo JSONL para OpenAI Batch API."
@@ -155,11 +516,47 @@ if __name__ == "__main__":
         help="Precio en USD por cada 1 Millón de tokens de salida."
     )
 
+    parser.add_argument(
+        "--workers", 
+        type=int, 
+        default=1, 
+        help="Número de procesos para contar en paralelo (el archivo se divide por offsets de bytes)."
+    )
+    parser.add_argument(
+        "--threads", 
+        type=int, 
+        default=1, 
+        help="Hilos de tiktoken por proceso para tokenizar los textos por lotes (`encode_ordinary_batch`)."
+    )
+    parser.add_argument(
+        "--results_file", 
+        type=str, 
+        default=None, 
+        help="JSONL de resultados de una ejecución anterior para proyectar los tokens de salida."
+    )
+    parser.add_argument(
+        "--cached_input_price", 
+        type=float, 
+        default=None, 
+        help="Precio en USD por cada 1 Millón de tokens de entrada cacheados (caché de prefijos)."
+    )
+    parser.add_argument(
+        "--truncation_stats", 
+        type=str, 
+        default=None, 
+        help="Estadísticas de recorte de `generate_file --max_input_tokens` (por defecto `<file>.truncation.json` si existe)."
+    )
+
     args = parser.parse_args()
 
     analizar_costos_jsonl(
         file_path=args.file, 
         encoding_name=args.encoding_name, 
         price_input_per_1m=args.input_price,
-        price_output_per_1m=args.output_price
+        price_output_per_1m=args.output_price,
+        workers=args.workers,
+        results_file=args.results_file,
+        price_cached_input_per_1m=args.cached_input_price,
+        truncation_file=args.truncation_stats,
+        threads=args.threads
     )
\ No newline at end of file
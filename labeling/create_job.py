@@ -1,15 +1,22 @@
 from openai import OpenAI
 import argparse
 
+try:
+    from .io_utils import upload_source
+except ImportError:
+    from io_utils import upload_source
+
 def create_batch_job(
         client : OpenAI,
         filename : str,
         batch_job_name : str = "Etiquetado de noticias",
 ) -> str:
-    batch_input_file = client.files.create(
-        file = open(filename, "rb"),
-        purpose = "batch"
-    )
+    # Los `.gz`/`.zst` se descomprimen mientras se suben
+    with upload_source(filename) as file:
+        batch_input_file = client.files.create(
+            file = file,
+            purpose = "batch"
+        )
 
     print(f"Archivo subido. ID: {batch_input_file.id}")
 
@@ -35,7 +42,7 @@ if __name__ == "__main__":
         "-f", "--file", 
         type=str, 
         required=True, 
-        help="Ruta al archivo `.jsonl` local que se va a subir."
+        help="Ruta al archivo `.jsonl` local que se va a subir (`.jsonl.gz`/`.jsonl.zst` se suben descomprimidos)."
     )
 
     parser.add_argument(
@@ -0,0 +1,299 @@
+import json
+import os
+import re
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from numpy.lib.format import open_memmap
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Sufijo de fuente al final del titular: " - El País", " | EFE", " — Europa Press"
+SOURCE_SUFFIX_RE = re.compile(r"\s+[-|–—]\s+[^-|–—]{1,40}$")
+PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+SPACES_RE = re.compile(r"\s+")
+
+HASH_SEED = 42
+
+
+def normalize_texts(texts: pd.Series) -> pd.Series:
+    """Minúsculas, sin sufijo de fuente, sin puntuación y con espacios colapsados."""
+    return (
+        texts.fillna("")
+        .astype(str)
+        .str.replace(SOURCE_SUFFIX_RE, "", regex=True)
+        .str.lower()
+        .str.replace(PUNCTUATION_RE, " ", regex=True)
+        .str.replace(SPACES_RE, " ", regex=True)
+        .str.strip()
+    )
+
+
+def minhash_signatures(texts: list, num_perm: int, shingle_size: int, max_block_bytes: int = 64 << 20) -> np.ndarray:
+    """
+    Firmas MinHash de un lote de textos, calculadas de forma vectorizada:
+    hash polinómico de todas las ventanas de `shingle_size` bytes sobre un
+    único buffer concatenado y mínimo por documento con `np.minimum.reduceat`.
+    Las permutaciones se aplican por bloques sobre un único buffer de como
+    mucho `max_block_bytes`, en lugar de materializar la matriz completa
+    shingles × permutaciones.
+    """
+    encoded = [t.encode("utf-8").ljust(shingle_size) for t in texts]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    # Hash de cada ventana (aritmética uint64 con desbordamiento)
+    powers = np.uint64(1099511628211) ** np.arange(shingle_size, dtype=np.uint64)
+    windows = sliding_window_view(buffer, shingle_size)
+    window_hashes = windows.astype(np.uint64) @ powers
+
+    # Solo las ventanas que no cruzan la frontera entre documentos
+    n_windows = lengths - shingle_size + 1
+    seg_starts = np.concatenate(([0], np.cumsum(n_windows)[:-1]))
+    valid = np.repeat(starts - seg_starts, n_windows) + np.arange(n_windows.sum())
+    shingles = window_hashes[valid][:, None]
+    del window_hashes, valid
+
+    rng = np.random.default_rng(HASH_SEED)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+    block = int(min(num_perm, max(1, max_block_bytes // (8 * len(shingles)))))
+    permuted = np.empty((len(shingles), block), dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for p in range(0, num_perm, block):
+        out = permuted[:, :min(block, num_perm - p)]
+        np.multiply(shingles, a[p:p + block], out=out)
+        out += b[p:p + block]
+        np.minimum.reduceat(out, seg_starts, axis=0, out=signatures[:, p:p + block])
+    return signatures
+
+
+def lsh_clusters(signatures: np.ndarray, bands: int, threshold: float, batch_size: int = 100_000) -> np.ndarray:
+    """
+    Agrupa filas casi duplicadas. Para cada banda LSH, cada fila se compara con
+    la primera fila de su cubo y la arista solo se acepta si la similitud
+    estimada (fracción de valores MinHash iguales) supera `threshold`. Las
+    componentes conexas de esas aristas solo son candidatas: como A~B y B~C no
+    implican A~C, dentro de cada una las filas se comparan con los
+    representantes (`_assign_representatives`) para no encadenar textos
+    distintos. Devuelve, para cada fila, la posición de su representante.
+    """
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    mix = np.random.default_rng(HASH_SEED).integers(1, 2**63, size=rows, dtype=np.uint64)
+
+    sources, targets = [], []
+    for i in range(bands):
+        keys = np.asarray(signatures[:, i * rows:(i + 1) * rows]) @ mix
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        group_starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+        group_sizes = np.diff(np.append(group_starts, n))
+        heads = np.repeat(order[group_starts], group_sizes)
+
+        candidates = heads != order
+        u, v = order[candidates], heads[candidates]
+        for start in range(0, len(u), batch_size):
+            bu, bv = u[start:start + batch_size], v[start:start + batch_size]
+            similarity = (np.asarray(signatures[bu]) == np.asarray(signatures[bv])).mean(axis=1)
+            keep = similarity >= threshold
+            sources.append(bu[keep])
+            targets.append(bv[keep])
+
+    labels = np.arange(n)
+    if not sources:
+        return labels
+    u, v = np.concatenate(sources), np.concatenate(targets)
+
+    # Componentes conexas por propagación de la etiqueta mínima
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, u, labels[v])
+        np.minimum.at(labels, v, labels[u])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            break
+    return _assign_representatives(signatures, labels, threshold)
+
+
+def _assign_representatives(signatures: np.ndarray, components: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Dentro de cada componente, en orden de fila, cada fila se asigna al primer
+    representante con el que alcanza `threshold` o, si no hay ninguno, pasa a
+    ser un representante más. Todo duplicado se parece a su representante.
+    """
+    n = len(components)
+    representatives = np.arange(n)
+    members = np.flatnonzero(np.bincount(components, minlength=n)[components] > 1)
+    members = members[np.argsort(components[members], kind="stable")]
+    boundaries = np.flatnonzero(np.diff(components[members])) + 1
+
+    for group in np.split(members, boundaries):
+        if len(group) < 2:
+            continue
+        group_signatures = np.asarray(signatures[group])
+        reps = [0]
+        for i in range(1, len(group)):
+            similarity = (group_signatures[reps] == group_signatures[i]).mean(axis=1)
+            matches = np.flatnonzero(similarity >= threshold)
+            if len(matches):
+                representatives[group[i]] = group[reps[matches[0]]]
+            else:
+                reps.append(i)
+    return representatives
+
+
+def _fill_signatures(index_dir: str, text_batches, n_rows: int, num_perm: int, shingle_size: int) -> np.ndarray:
+    """Escribe en `index_dir/signatures.npy` (memmap en disco) las firmas de cada lote de textos."""
+    os.makedirs(index_dir, exist_ok=True)
+    signatures = open_memmap(
+        os.path.join(index_dir, "signatures.npy"), mode="w+", dtype=np.uint64, shape=(n_rows, num_perm)
+    )
+    start = 0
+    for texts in text_batches:
+        batch = normalize_texts(texts).tolist()
+        signatures[start:start + len(batch)] = minhash_signatures(batch, num_perm, shingle_size)
+        start += len(batch)
+    signatures.flush()
+    return signatures
+
+
+def find_near_duplicates(
+        df : pd.DataFrame,
+        text_column : str = "texto",
+        index_dir : str = "dedup_index",
+        num_perm : int = 128,
+        bands : int = 32,
+        shingle_size : int = 5,
+        threshold : float = 0.8,
+        batch_size : int = 5000
+) -> np.ndarray:
+    """
+    Devuelve, para cada fila de `df`, la posición de su representante. Las
+    firmas se guardan en `index_dir/signatures.npy` (memmap en disco).
+    """
+    text_batches = (df[text_column].iloc[start:start + batch_size] for start in range(0, len(df), batch_size))
+    signatures = _fill_signatures(index_dir, text_batches, len(df), num_perm, shingle_size)
+    return lsh_clusters(signatures, bands, threshold)
+
+
+def dedup_parquet(
+        input_file : str,
+        output_file : str,
+        mapping_file : str,
+        text_column : str = "texto",
+        index_dir : str = "dedup_index",
+        num_perm : int = 128,
+        bands : int = 32,
+        shingle_size : int = 5,
+        threshold : float = 0.8,
+        batch_size : int = 5000
+) -> tuple:
+    """
+    `find_near_duplicates` sobre un Parquet sin cargarlo entero: una pasada
+    por lotes (solo la columna de texto) para las firmas y otra para escribir
+    los representantes y el mapeo `custom_id` → `representative_id`.
+    Devuelve `(filas, representantes)`.
+    """
+    parquet = pq.ParquetFile(input_file)
+    n_rows = parquet.metadata.num_rows
+    text_batches = (
+        batch.column(0).to_pandas()
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=[text_column])
+    )
+    signatures = _fill_signatures(index_dir, text_batches, n_rows, num_perm, shingle_size)
+    representatives = lsh_clusters(signatures, bands, threshold)
+    is_representative = representatives == np.arange(n_rows)
+
+    # Los representantes siempre van antes que sus duplicados: basta con
+    # recordar el id de los que tienen alguno
+    wanted = np.zeros(n_rows, dtype=bool)
+    wanted[representatives[~is_representative]] = True
+    representative_ids = {}
+
+    start = 0
+    with pq.ParquetWriter(output_file, parquet.schema_arrow) as writer, open(mapping_file, 'w', encoding='utf-8') as f:
+        for batch in parquet.iter_batches(batch_size=batch_size):
+            end = start + batch.num_rows
+            writer.write_batch(batch.filter(is_representative[start:end]))
+            ids = batch.column("id").to_pylist()
+            for pos in np.flatnonzero(wanted[start:end]):
+                representative_ids[start + pos] = ids[pos]
+            for pos in np.flatnonzero(~is_representative[start:end]):
+                entry = {"custom_id": ids[pos], "representative_id": representative_ids[representatives[start + pos]]}
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            start = end
+
+    return n_rows, int(is_representative.sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Agrupa noticias casi duplicadas (MinHash/LSH) y deja un representante por grupo antes de etiquetar."
+    )
+    parser.add_argument(
+        "-i", "--input_file",
+        type=str,
+        required=True,
+        help="Ruta al archivo `.parquet` de origen."
+    )
+    parser.add_argument(
+        "-o", "--output_file",
+        type=str,
+        required=True,
+        help="Ruta del `.parquet` con un representante por grupo (entrada para `generate_file`)."
+    )
+    parser.add_argument(
+        "-m", "--mapping_file",
+        type=str,
+        required=True,
+        help="Ruta del `.jsonl` de mapeo `custom_id` → `representative_id` (para `expand_results`)."
+    )
+    parser.add_argument(
+        "--text_column",
+        type=str,
+        default="texto",
+        help="Nombre de la columna en el Parquet que contiene el texto a comparar."
+    )
+    parser.add_argument(
+        "--index_dir",
+        type=str,
+        default="dedup_index",
+        help="Directorio donde se guardan las firmas MinHash."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.8,
+        help="Similitud Jaccard estimada mínima para considerar dos textos duplicados."
+    )
+    parser.add_argument(
+        "--num_perm",
+        type=int,
+        default=128,
+        help="Número de permutaciones MinHash."
+    )
+    parser.add_argument(
+        "--bands",
+        type=int,
+        default=32,
+        help="Número de bandas LSH (debe dividir a --num_perm)."
+    )
+
+    args = parser.parse_args()
+
+    rows, representatives = dedup_parquet(
+        args.input_file,
+        args.output_file,
+        args.mapping_file,
+        text_column=args.text_column,
+        index_dir=args.index_dir,
+        num_perm=args.num_perm,
+        bands=args.bands,
+        threshold=args.threshold
+    )
+
+    print(f"✅ {rows} noticias → {representatives} representantes. Mapeo guardado en '{args.mapping_file}'.")
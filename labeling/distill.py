@@ -0,0 +1,117 @@
+import argparse
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+try:
+    from .generate_file import TASKS
+    from .local_model import LocalClassifier
+    from .merge_results import LabelTable, parse_result
+    from .io_utils import open_binary
+except ImportError:
+    from generate_file import TASKS
+    from local_model import LocalClassifier
+    from merge_results import LabelTable, parse_result
+    from io_utils import open_binary
+
+REPORT_THRESHOLDS = (0.8, 0.9, 0.95, 0.98, 0.99)
+
+
+def load_training_data(results_files: list, source_file: str, task: str, text_column: str = "texto", batch_size: int = 65_536) -> tuple:
+    """
+    Une los resultados correctos del LLM con el texto del Parquet de origen
+    (`custom_id` = `id`). Devuelve `(textos, etiquetas)` con una columna 0/1
+    por cada campo booleano de la tarea.
+    """
+    model = TASKS[task][1]
+    fields = [name for name, info in model.model_fields.items() if info.annotation is bool]
+
+    labels = LabelTable(model)
+    for results_file in results_files:
+        with open_binary(results_file) as f:
+            for line in f:
+                if line.strip():
+                    labels.add(*parse_result(line))
+    label_rows = labels.table()
+    index = labels.index
+
+    texts, rows = [], []
+    parquet = pq.ParquetFile(source_file)
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=["id", text_column]):
+        ids = pc.cast(batch.column("id"), pa.string()).to_pylist()
+        batch_texts = batch.column(text_column).to_pylist()
+        for custom_id, text in zip(ids, batch_texts):
+            position = index.get(custom_id)
+            if position is not None and position[1]:
+                texts.append(text or "")
+                rows.append(position[0])
+
+    matched = label_rows.take(pa.array(rows, type=pa.int64()))
+    y = np.stack([matched.column(name).to_numpy(zero_copy_only=False).astype(np.float64) for name in fields], axis=1) if rows else np.zeros((0, len(fields)))
+    return texts, y, fields
+
+
+def agreement_report(model: LocalClassifier, texts: list, y: np.ndarray, threshold: float):
+    """Concordancia con el LLM en el conjunto de validación, global y por umbral de confianza."""
+    proba = model.predict_proba(texts)
+    confidence = model.confidence(proba)
+    agree = ((proba >= 0.5) == (y >= 0.5)).all(axis=1)
+
+    separator = "─" * 56
+    print("🤝 CONCORDANCIA CON EL LLM (validación)")
+    print(separator)
+    print(f"{'Filas de validación':<22} : {len(texts)}")
+    print(f"{'Concordancia global':<22} : {agree.mean():.1%}")
+    for name, p, labels in zip(model.fields, proba.T, y.T):
+        print(f"{'  ' + name:<22} : {((p >= 0.5) == (labels >= 0.5)).mean():.1%}")
+    print(separator)
+    print(f"{'UMBRAL':<8} | {'COBERTURA (sin API)':<20} | {'CONCORDANCIA':<12}")
+    print(separator)
+    for t in sorted(set(REPORT_THRESHOLDS) | {threshold}):
+        confident = confidence >= t
+        coverage = confident.mean()
+        accuracy = agree[confident].mean() if confident.any() else float("nan")
+        marker = " ◀" if t == threshold else ""
+        print(f"{t:<8} | {coverage:<20.1%} | {accuracy:<12.1%}{marker}")
+    print(separator + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Entrena un clasificador local (n-gramas hasheados + regresión logística) con los resultados del LLM."
+    )
+    parser.add_argument("-r", "--results_files", type=str, nargs="+", required=True, help="Archivos `.jsonl` de resultados (Batch API o process_async).")
+    parser.add_argument("-i", "--input_file", type=str, required=True, help="Parquet de origen (columna `id` = `custom_id`).")
+    parser.add_argument("-o", "--model_file", type=str, required=True, help="Ruta del modelo entrenado (`.npz`), para `generate_file --local_model`.")
+    parser.add_argument("-t", "--type", type=str, required=True, choices=list(TASKS), help="Tipo de análisis de los resultados: 'clickbait', 'sensacionalism' o 'both'.")
+    parser.add_argument("--text_column", type=str, default="texto", help="Nombre de la columna en el Parquet que contiene el texto.")
+    parser.add_argument("--holdout", type=float, default=0.1, help="Fracción de filas reservada para medir la concordancia.")
+    parser.add_argument("--threshold", type=float, default=0.95, help="Umbral de confianza que se destaca en el informe.")
+    parser.add_argument("--n_features", type=int, default=1 << 20, help="Número de cubos del hashing de n-gramas.")
+    parser.add_argument("--max_tokens", type=int, default=256, help="Tokens por texto usados como rasgos.")
+    parser.add_argument("--epochs", type=int, default=100, help="Épocas de descenso por gradiente.")
+    parser.add_argument("--l2", type=float, default=1e-6, help="Regularización L2.")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla de la partición entrenamiento/validación.")
+
+    args = parser.parse_args()
+
+    texts, y, fields = load_training_data(args.results_files, args.input_file, args.type, args.text_column)
+    if not texts:
+        raise ValueError("❌ Ningún resultado correcto coincide con las filas del Parquet de origen.")
+
+    order = np.random.default_rng(args.seed).permutation(len(texts))
+    n_holdout = int(len(texts) * args.holdout)
+    train, valid = order[n_holdout:], order[:n_holdout]
+    print(f"📚 {len(texts)} ejemplos etiquetados ({len(train)} entrenamiento, {len(valid)} validación). Campos: {fields}")
+
+    reasoning_fields = [name for name, info in TASKS[args.type][1].model_fields.items() if info.annotation is str]
+    model = LocalClassifier(fields, reasoning_fields, n_features=args.n_features, max_tokens=args.max_tokens, task=args.type)
+    model.fit([texts[i] for i in train], y[train], epochs=args.epochs, l2=args.l2)
+
+    if n_holdout:
+        agreement_report(model, [texts[i] for i in valid], y[valid], args.threshold)
+
+    model.save(args.model_file)
+    print(f"✅ Modelo guardado en '{args.model_file}'. Úsalo con `generate_file --local_model {args.model_file} --local_threshold {args.threshold}`.")
@@ -1,10 +1,149 @@
 from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import hashlib
+import os
 import argparse
 
+try:
+    from .io_utils import CompressedWriter, compression_of, open_binary, split_ext
+except ImportError:
+    from io_utils import CompressedWriter, compression_of, open_binary, split_ext
+
+CHUNK_SIZE = 1 << 20
+
+def _last_block(index_filename : str, part_filename : str) -> tuple:
+    """`(bytes sin comprimir, offset comprimido)` del último bloque completo registrado en el índice."""
+    offset = raw_offset = 0
+    if not (os.path.exists(index_filename) and os.path.exists(part_filename)):
+        return offset, raw_offset
+    size = os.path.getsize(part_filename)
+    with open(index_filename, "r", encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            if not line.endswith("\n") or len(fields) != 2 or int(fields[0]) > size:
+                break
+            raw_offset, offset = int(fields[0]), int(fields[1])
+    return offset, raw_offset
+
+class PartialDownload:
+    """
+    Descarga reanudable de un archivo a `<output_filename>.part`, calculando
+    el SHA-256 mientras escribe; `finish()` lo renombra de forma atómica y
+    guarda el checksum en `<output_filename>.sha256`. Si existe un `.part`
+    previo (descarga cortada) la petición lleva una cabecera `Range`
+    (`headers`); si el servidor no la admite, se empieza de cero.
+
+    Si `output_filename` termina en `.gz` o `.zst` el contenido se comprime
+    en streaming en bloques independientes de ~`chunk_size` bytes, y el
+    offset tras cada bloque se anota en `<output_filename>.part.idx` para
+    poder reanudar desde el último bloque completo. El checksum es siempre
+    el del contenido sin comprimir (el que sirve la API).
+
+    No depende del cliente: lo usan `stream_file_to_disk` (síncrono) y el
+    orquestador (`AsyncOpenAI`).
+    """
+
+    def __init__(self, output_filename : str, chunk_size : int = CHUNK_SIZE):
+        self.output_filename = output_filename
+        self.part_filename = output_filename + ".part"
+        self.index_filename = self.part_filename + ".idx"
+        self.chunk_size = chunk_size
+        self.compression = compression_of(output_filename)
+
+        if self.compression:
+            self.offset, self.raw_offset = _last_block(self.index_filename, self.part_filename)
+            if self.raw_offset:
+                with open(self.part_filename, "r+b") as f:
+                    f.truncate(self.raw_offset)
+        else:
+            self.offset = self.raw_offset = os.path.getsize(self.part_filename) if os.path.exists(self.part_filename) else 0
+
+        self.hasher = hashlib.sha256()
+        if self.offset:
+            with open_binary(self.part_filename, "rb", self.compression) as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    self.hasher.update(chunk)
+
+    @property
+    def headers(self):
+        return {"Range": f"bytes={self.offset}-"} if self.offset else None
+
+    @contextlib.contextmanager
+    def writer(self, status_code : int, file_id : str):
+        """Abre el `.part` según la respuesta (`206` = reanudación) y devuelve la función que escribe cada bloque."""
+        if self.offset and status_code != 206:
+            print(f"⚠️  El servidor no admite reanudar '{file_id}'. Descargando desde el principio.")
+            self.offset = self.raw_offset = 0
+            self.hasher = hashlib.sha256()
+
+        with open(self.part_filename, "r+b" if self.raw_offset else "wb") as f:
+            f.seek(self.raw_offset)
+            if self.compression:
+                f.truncate()
+                out = CompressedWriter(f, self.compression)
+                with open(self.index_filename, "a" if self.raw_offset else "w", encoding="utf-8") as index:
+                    pending = 0
+
+                    def write(chunk : bytes):
+                        nonlocal pending
+                        out.write(chunk)
+                        self.hasher.update(chunk)
+                        self.offset += len(chunk)
+                        pending += len(chunk)
+                        if pending >= self.chunk_size:
+                            index.write(f"{out.end_block()} {self.offset}\n")
+                            index.flush()
+                            pending = 0
+
+                    yield write
+                    out.end_block()
+            else:
+                def write(chunk : bytes):
+                    f.write(chunk)
+                    self.hasher.update(chunk)
+
+                yield write
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+    def finish(self) -> str:
+        os.replace(self.part_filename, self.output_filename)
+        if os.path.exists(self.index_filename):
+            os.remove(self.index_filename)
+
+        checksum = self.hasher.hexdigest()
+        with open(self.output_filename + ".sha256", "w", encoding="utf-8") as f:
+            f.write(f"{checksum}  {os.path.basename(self.output_filename)}\n")
+        return checksum
+
+def stream_file_to_disk(
+        client : OpenAI,
+        file_id : str,
+        output_filename : str,
+        chunk_size : int = CHUNK_SIZE
+) -> str:
+    """
+    Descarga `file_id` en bloques con reanudación y checksum (ver
+    `PartialDownload`). Devuelve el SHA-256 del contenido.
+    """
+    download = PartialDownload(output_filename, chunk_size)
+    with client.files.with_streaming_response.content(file_id, extra_headers=download.headers) as response:
+        with download.writer(response.status_code, file_id) as write:
+            for chunk in response.iter_bytes(chunk_size):
+                write(chunk)
+    return download.finish()
+
+def error_filename_for(output_filename : str) -> str:
+    base, ext = split_ext(output_filename)
+    return f"{base}.errors{ext or '.jsonl'}"
+
 def download_batch_output(
         client : OpenAI,
         batch_id: str,
-        output_filename: str
+        output_filename: str,
+        error_filename: str = None
 ) -> None:
     try:
         batch_status = client.batches.retrieve(batch_id)
@@ -21,18 +160,25 @@ def download_batch_output(
         
         if not output_file_id:
             print("Error: El batch está completado pero no tiene 'output_file_id'.")
-            return
+            if not batch_status.error_file_id:
+                return
 
-        try:
-            file_response = client.files.content(output_file_id)
-            content = file_response.text
-            
-            with open(output_filename, "w", encoding='utf-8') as f:
-                f.write(content)
+        # Salida y archivo de errores se descargan en paralelo y en streaming
+        downloads = {output_file_id: output_filename} if output_file_id else {}
+        if batch_status.error_file_id:
+            downloads[batch_status.error_file_id] = error_filename or error_filename_for(output_filename)
 
-            print(f"✅ Resultados guardados exitosamente en '{output_filename}'")
-        except Exception as e:
-            print(f"Error al descargar o guardar el archivo: {e}")
+        with ThreadPoolExecutor(max_workers=len(downloads)) as pool:
+            futures = {
+                pool.submit(stream_file_to_disk, client, file_id, filename): filename
+                for file_id, filename in downloads.items()
+            }
+            for future, filename in futures.items():
+                try:
+                    checksum = future.result()
+                    print(f"✅ Resultados guardados exitosamente en '{filename}' (sha256 {checksum[:12]}…)")
+                except Exception as e:
+                    print(f"Error al descargar o guardar '{filename}': {e}. Vuelve a ejecutar para reanudar.")
 
     elif batch_status.status == "failed":
         print("❌ El proceso falló.")
@@ -62,7 +208,13 @@ if __name__ == "__main__":
         "-o", "--output_file", 
         type=str, 
         required=True, 
-        help="Ruta y nombre del archivo `.jsonl` donde se guardarán los resultados."
+        help="Ruta y nombre del archivo `.jsonl` donde se guardarán los resultados (`.jsonl.gz` o `.jsonl.zst` para comprimirlos en streaming)."
+    )
+    parser.add_argument(
+        "--error_file", 
+        type=str, 
+        default=None, 
+        help="Ruta para el archivo de errores del batch (por defecto `<output_file>.errors.jsonl`)."
     )
 
     args = parser.parse_args()
@@ -72,5 +224,6 @@ if __name__ == "__main__":
     download_batch_output(
         client = client,
         batch_id = args.batch_id,
-        output_filename = args.output_file
+        output_filename = args.output_file,
+        error_filename = args.error_file
     )
\ No newline at end of file
@@ -0,0 +1,75 @@
+import json
+import argparse
+from collections import defaultdict
+
+try:
+    from .io_utils import open_text
+except ImportError:
+    from io_utils import open_text
+
+
+def expand_results(
+        results_filename : str,
+        mapping_filename : str,
+        output_filename : str
+) -> int:
+    """
+    Reparte cada resultado a todos los `custom_id` que comparten su petición
+    (archivo de mapeo `{"custom_id", "representative_id"}`).
+    Devuelve el número de líneas escritas.
+    """
+    members = defaultdict(list)
+    with open(mapping_filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                members[entry["representative_id"]].append(entry["custom_id"])
+
+    written = 0
+    with open_text(results_filename) as f_in, open_text(output_filename, 'w') as f_out:
+        for line in f_in:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            f_out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            written += 1
+
+            for custom_id in members.get(result.get("custom_id"), []):
+                copy = dict(result, custom_id=custom_id, id=f"batch_req_{custom_id}")
+                f_out.write(json.dumps(copy, ensure_ascii=False) + '\n')
+                written += 1
+
+    print(f"✅ {written} resultados guardados en '{output_filename}'")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reparte los resultados de las peticiones deduplicadas a todos sus `custom_id`."
+    )
+    parser.add_argument(
+        "-r", "--results_file", 
+        type=str, 
+        required=True, 
+        help="Archivo `.jsonl` de resultados (Batch API o process_async)."
+    )
+    parser.add_argument(
+        "-m", "--mapping_file", 
+        type=str, 
+        required=True, 
+        help="Archivo de mapeo `.mapping.jsonl` generado con --dedup."
+    )
+    parser.add_argument(
+        "-o", "--output_file", 
+        type=str, 
+        required=True, 
+        help="Ruta del archivo `.jsonl` con los resultados expandidos."
+    )
+
+    args = parser.parse_args()
+
+    expand_results(
+        results_filename=args.results_file,
+        mapping_filename=args.mapping_file,
+        output_filename=args.output_file
+    )
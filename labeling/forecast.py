@@ -0,0 +1,154 @@
+import json
+import math
+
+try:
+    from .objects import ClickbaitAnalysis, SensationalismAnalysis, CombinedAnalysis
+    from .io_utils import open_text
+except ImportError:
+    from objects import ClickbaitAnalysis, SensationalismAnalysis, CombinedAnalysis
+    from io_utils import open_text
+
+SCHEMAS = (ClickbaitAnalysis, SensationalismAnalysis, CombinedAnalysis)
+SIN_SCHEMA = "sin_schema"
+Z_95 = 1.96
+
+
+def detectar_schema(keys) -> str:
+    """Nombre del modelo Pydantic cuyos campos coinciden con `keys`."""
+    keys = set(keys)
+    for model in SCHEMAS:
+        if keys == set(model.model_fields):
+            return model.__name__
+    return SIN_SCHEMA
+
+
+def schema_de_formato(rsp_fmt) -> str:
+    """Schema de una petición a partir de su `response_format`."""
+    try:
+        return detectar_schema(rsp_fmt["json_schema"]["schema"]["properties"])
+    except (KeyError, TypeError):
+        return SIN_SCHEMA
+
+
+def bucket_tokens(n_tokens: int) -> int:
+    """Tramo logarítmico (base 2) de longitud de entrada."""
+    return int(math.log2(n_tokens)) if n_tokens and n_tokens > 0 else 0
+
+
+class Estadistico:
+    """Media y varianza en una sola pasada (algoritmo de Welford)."""
+
+    __slots__ = ("n", "media", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def agregar(self, x: float):
+        self.n += 1
+        delta = x - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (x - self.media)
+
+    @property
+    def varianza(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+
+def combinar(estadisticos) -> Estadistico:
+    """Combina varios `Estadistico` en uno (fórmula de Chan et al.)."""
+    estadisticos = [s for s in estadisticos if s.n]
+    total = Estadistico()
+    total.n = sum(s.n for s in estadisticos)
+    if total.n:
+        total.media = sum(s.media * s.n for s in estadisticos) / total.n
+        total.m2 = sum(s.m2 + s.n * (s.media - total.media) ** 2 for s in estadisticos)
+    return total
+
+
+class PrevisionSalida:
+    """
+    Aprende la distribución de `completion_tokens` por schema y tramo de
+    longitud de entrada a partir de un JSONL de resultados (formato Batch API
+    o `process_async`) y proyecta los tokens de salida de un archivo nuevo.
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+        self.grupos = {}
+        self.por_schema = {}
+        self.muestras = 0
+
+    def aprender(self, results_file: str):
+        """Recorre el archivo de resultados una sola vez, en streaming."""
+        with open_text(results_file) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    result = json.loads(line)
+                    body = (result.get("response") or {}).get("body") or {}
+                    content = body["choices"][0]["message"]["content"]
+                    schema = detectar_schema(json.loads(content).keys())
+                except (json.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError):
+                    continue
+
+                usage = body.get("usage") or {}
+                completion = usage.get("completion_tokens")
+                if completion is None:
+                    if self.encoding is None:
+                        continue
+                    # Sin `usage` se aproxima con el propio contenido (sin tokens de razonamiento)
+                    completion = len(self.encoding.encode_ordinary(content))
+
+                bucket = bucket_tokens(usage.get("prompt_tokens"))
+                self.grupos.setdefault((schema, bucket), Estadistico()).agregar(completion)
+                self.por_schema.setdefault(schema, Estadistico()).agregar(completion)
+                self.muestras += 1
+
+    def _estadistico(self, schema: str, bucket: int) -> tuple:
+        """
+        `(clave, Estadistico)` para un grupo: el del propio grupo, o si tiene
+        menos de 2 muestras el de su schema, o si el schema no se ha visto el
+        de todos los resultados. La clave identifica de qué nivel sale.
+        """
+        stats = self.grupos.get((schema, bucket))
+        if stats is not None and stats.n >= 2:
+            return (schema, bucket), stats
+        if schema in self.por_schema:
+            return schema, self.por_schema[schema]
+        if self.por_schema:
+            # Schema nunca visto: se usan todos los resultados
+            return None, combinar(self.por_schema.values())
+        return None, None
+
+    def proyectar(self, conteo_grupos: dict, z: float = Z_95) -> dict:
+        """
+        Proyecta los tokens de salida de un archivo a partir del número de
+        peticiones por `(schema, tramo)`. El intervalo combina la variabilidad
+        de cada petición y la incertidumbre de la media estimada.
+        """
+        # Peticiones asignadas a cada estadístico (varios tramos pueden
+        # compartir el mismo al recurrir al del schema o al de todos)
+        asignadas = {}
+        for (schema, bucket), m in conteo_grupos.items():
+            clave, stats = self._estadistico(schema, bucket)
+            if stats is None or stats.n == 0:
+                continue
+            previo = asignadas.get(clave, (stats, 0))[1]
+            asignadas[clave] = (stats, previo + m)
+
+        media = 0.0
+        varianza = 0.0
+        for stats, m in asignadas.values():
+            media += m * stats.media
+            varianza += m * stats.varianza + (m ** 2) * stats.varianza / stats.n
+
+        margen = z * math.sqrt(varianza)
+        return {
+            "output_tokens": round(media),
+            "output_tokens_low": max(0, round(media - margen)),
+            "output_tokens_high": round(media + margen),
+            "muestras": self.muestras
+        }
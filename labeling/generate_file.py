@@ -1,15 +1,279 @@
 import pandas as pd
+import pyarrow.parquet as pq
+import hashlib
 import json
+import os
 
 import argparse
 
 try:
-    from .prompts import CLICKBAIT_PROMPT, SENSACIONALISM_PROMPT
-    from .objects import ClickbaitAnalysis, SensationalismAnalysis
+    from .prompts import CLICKBAIT_PROMPT, SENSACIONALISM_PROMPT, COMBINED_PROMPT
+    from .objects import ClickbaitAnalysis, SensationalismAnalysis, CombinedAnalysis
+    from .local_model import LocalClassifier, LocalFilter
+    from .truncate import TextBudget, stats_path
+    from .io_utils import compression_of, open_binary, split_ext
     
 except ImportError:
-    from prompts import CLICKBAIT_PROMPT, SENSACIONALISM_PROMPT
-    from objects import ClickbaitAnalysis, SensationalismAnalysis
+    from prompts import CLICKBAIT_PROMPT, SENSACIONALISM_PROMPT, COMBINED_PROMPT
+    from objects import ClickbaitAnalysis, SensationalismAnalysis, CombinedAnalysis
+    from local_model import LocalClassifier, LocalFilter
+    from truncate import TextBudget, stats_path
+    from io_utils import compression_of, open_binary, split_ext
+
+_ID_SENTINEL = "\x00__custom_id__\x00"
+_TEXT_SENTINEL = "\x00__user_text__\x00"
+
+WRITE_BUFFER_SIZE = 1 << 20
+# Líneas que se serializan antes de pasarlas a la salida (acota la memoria)
+WRITE_CHUNK_LINES = 4096
+
+# Límites por lote de la Batch API de OpenAI
+BATCH_MAX_REQUESTS = 50_000
+BATCH_MAX_BYTES = 200 * 1024 * 1024
+
+# Tipo de análisis → (prompt de sistema, modelo Pydantic, nombre del schema)
+TASKS = {
+    "clickbait": (CLICKBAIT_PROMPT, ClickbaitAnalysis, "clickbait_analysis_schema"),
+    "sensacionalism": (SENSACIONALISM_PROMPT, SensationalismAnalysis, "sensationalism_analysis_schema"),
+    "both": (COMBINED_PROMPT, CombinedAnalysis, "combined_analysis_schema")
+}
+
+def canonical_schema(node, keep_order : bool = False):
+    """
+    Forma canónica del JSON schema: claves ordenadas en todos los niveles para
+    que el prefijo de la petición sea idéntico byte a byte entre ejecuciones y
+    versiones de Pydantic. El orden de `properties` se conserva, porque marca
+    el orden en que el modelo genera los campos (razonamiento antes que etiqueta).
+    """
+    if isinstance(node, dict):
+        keys = node if keep_order else sorted(node)
+        return {key: canonical_schema(node[key], keep_order=(key == "properties" and not keep_order)) for key in keys}
+    if isinstance(node, list):
+        return [canonical_schema(item) for item in node]
+    return node
+
+def response_format(json_schema : dict, nombre_schema : str) -> dict:
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": nombre_schema,
+            "schema": canonical_schema(json_schema),
+            "strict": True
+        }
+    }
+
+def prefix_cache_key(prompt : str, json_schema : dict, nombre_schema : str) -> str:
+    """Clave estable del prefijo constante (prompt + schema) para `prompt_cache_key`."""
+    prefix = json.dumps([prompt, response_format(json_schema, nombre_schema)], ensure_ascii=False)
+    return f"{nombre_schema}-{hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:16]}"
+
+def build_envelope(
+        model : str,
+        prompt : str,
+        json_schema : dict,
+        nombre_schema : str,
+        prompt_cache_key : str = None
+) -> tuple:
+    """
+    Serializa una sola vez la parte constante de la petición (modelo, prompt
+    de sistema y schema). Devuelve los tres fragmentos de texto que rodean al
+    `custom_id` y al texto de usuario, de modo que cada línea es idéntica byte
+    a byte a `json.dumps(batch_request, ensure_ascii=False)`.
+
+    El prompt de sistema va primero y el texto de usuario al final, de modo
+    que todo lo constante forma un prefijo común que el proveedor puede
+    servir desde su caché de prefijos.
+    """
+    request_body = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": _TEXT_SENTINEL}
+        ],
+        "response_format": response_format(json_schema, nombre_schema)
+    }
+    if prompt_cache_key:
+        request_body["prompt_cache_key"] = prompt_cache_key
+    
+    batch_request = {
+        "custom_id": _ID_SENTINEL,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": request_body
+    }
+
+    serialized = json.dumps(batch_request, ensure_ascii=False)
+    head, rest = serialized.split(json.dumps(_ID_SENTINEL, ensure_ascii=False))
+    middle, tail = rest.split(json.dumps(_TEXT_SENTINEL, ensure_ascii=False))
+    return head, middle, tail + '\n'
+
+class ShardedOutput:
+    """
+    Destino de escritura del JSONL. Sin límites escribe un único archivo
+    `filename`; con `max_requests`/`max_bytes` reparte las líneas en
+    `<base>.shard0000.jsonl`, `<base>.shard0001.jsonl`... contando los bytes
+    exactos (UTF-8) de cada línea, y guarda un manifiesto con el rango de
+    `custom_id` de cada shard en `<filename>.manifest.json`.
+
+    Si `filename` termina en `.gz` o `.zst` los shards se comprimen en
+    streaming; los límites y el manifiesto se refieren siempre a los bytes
+    sin comprimir, que son los que se suben a la Batch API.
+    """
+
+    def __init__(self, filename : str, max_requests : int = None, max_bytes : int = None):
+        self.filename = filename
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.sharded = bool(max_requests or max_bytes)
+        self.manifest_filename = f"{filename}.manifest.json"
+        self.shards = []
+        self._f = None
+
+    def _open_shard(self):
+        if self._f:
+            self._f.close()
+
+        if self.sharded:
+            base, ext = split_ext(self.filename)
+            path = f"{base}.shard{len(self.shards):04d}{ext or '.jsonl'}"
+        else:
+            path = self.filename
+
+        if compression_of(path):
+            self._f = open_binary(path, 'wb')
+        else:
+            self._f = open(path, 'wb', buffering=WRITE_BUFFER_SIZE)
+        # En el manifiesto las rutas son relativas a su propio directorio
+        relative = os.path.relpath(path, os.path.dirname(os.path.abspath(self.manifest_filename)))
+        self.shards.append({"file": relative, "requests": 0, "bytes": 0, "first_custom_id": None, "last_custom_id": None})
+
+    def _is_full(self, n_bytes : int) -> bool:
+        shard = self.shards[-1]
+        if shard["requests"] == 0:
+            return False
+        if self.max_requests and shard["requests"] + 1 > self.max_requests:
+            return True
+        if self.max_bytes and shard["bytes"] + n_bytes > self.max_bytes:
+            return True
+        return False
+
+    def write_lines(self, ids : list, lines : list):
+        if not lines:
+            return
+        if self._f is None:
+            self._open_shard()
+
+        if not self.sharded:
+            data = "".join(lines).encode('utf-8')
+            self._f.write(data)
+            shard = self.shards[-1]
+            shard["requests"] += len(lines)
+            shard["bytes"] += len(data)
+            if shard["first_custom_id"] is None:
+                shard["first_custom_id"] = ids[0]
+            shard["last_custom_id"] = ids[-1]
+            return
+
+        for custom_id, line in zip(ids, lines):
+            data = line.encode('utf-8')
+            if self._is_full(len(data)):
+                self._open_shard()
+
+            self._f.write(data)
+            shard = self.shards[-1]
+            shard["requests"] += 1
+            shard["bytes"] += len(data)
+            if shard["first_custom_id"] is None:
+                shard["first_custom_id"] = custom_id
+            shard["last_custom_id"] = custom_id
+
+    def close(self):
+        if self._f is None:
+            # Sin peticiones: se deja igualmente el archivo (vacío)
+            self._open_shard()
+        self._f.close()
+
+        if self.sharded:
+            manifest = {
+                "source": os.path.basename(self.filename),
+                "max_requests": self.max_requests,
+                "max_bytes": self.max_bytes,
+                "total_requests": sum(s["requests"] for s in self.shards),
+                "shards": self.shards
+            }
+            with open(self.manifest_filename, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            print(f"🧩 {len(self.shards)} shards generados. Manifiesto guardado en '{self.manifest_filename}'.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class RequestWriter:
+    """
+    Escribe las líneas del JSONL a partir de columnas (`ids`, `texts`) usando
+    el sobre preserializado, con deduplicación opcional de textos idénticos.
+    Las líneas se pasan a la salida cada `WRITE_CHUNK_LINES`, de modo que la
+    memoria no depende del tamaño del lote (cada línea repite el prompt y el schema).
+    """
+
+    def __init__(self, output : ShardedOutput, envelope : tuple, mapping = None):
+        self.output = output
+        self.head, self.middle, self.tail = envelope
+        self.mapping = mapping
+        self.seen = {} if mapping is not None else None
+        self.written = 0
+        self.duplicates = 0
+
+    def write_columns(self, ids : list, texts : list):
+        dumps = json.dumps
+        head, middle, tail = self.head, self.middle, self.tail
+        kept_ids, lines = [], []
+
+        for custom_id, text in zip(ids, texts):
+            text_json = dumps(text, ensure_ascii=False)
+
+            if self.seen is not None:
+                # Dentro de un archivo el sobre es constante: el body solo depende del texto
+                key = hashlib.blake2b(text_json.encode('utf-8'), digest_size=16).digest()
+                representative = self.seen.get(key)
+                if representative is not None:
+                    self.mapping.write(dumps({"custom_id": custom_id, "representative_id": representative}, ensure_ascii=False) + '\n')
+                    self.duplicates += 1
+                    continue
+                self.seen[key] = custom_id
+
+            kept_ids.append(custom_id)
+            lines.append(head + dumps(custom_id, ensure_ascii=False) + middle + text_json + tail)
+            if len(lines) >= WRITE_CHUNK_LINES:
+                self._flush(kept_ids, lines)
+                kept_ids, lines = [], []
+
+        self._flush(kept_ids, lines)
+
+    def _flush(self, ids : list, lines : list):
+        self.output.write_lines(ids, lines)
+        self.written += len(lines)
+
+def _filter_rows(row_filter, ids : list, texts : list, preprocessor = None) -> tuple:
+    if row_filter is not None:
+        keep = row_filter(ids, texts)
+        ids, texts = [i for i, k in zip(ids, keep) if k], [t for t, k in zip(texts, keep) if k]
+    if preprocessor is not None:
+        ids, texts = preprocessor(ids, texts)
+    return ids, texts
+
+def _open_mapping(filename : str, dedup : bool, mapping_filename : str):
+    mapping_filename = mapping_filename or f"{filename}.mapping.jsonl"
+    mapping = open(mapping_filename, 'w', encoding='utf-8') if dedup else None
+    return mapping, mapping_filename
+
+def _close_mapping(writer : RequestWriter, mapping, mapping_filename : str):
+    if mapping:
+        mapping.close()
+        print(f"🔁 {writer.duplicates} peticiones duplicadas omitidas. Mapeo guardado en '{mapping_filename}'.")
 
 def generate_file(
         filename : str,
@@ -18,39 +282,77 @@ def generate_file(
         json_schema : dict,
         nombre_schema : str,
         df : pd.DataFrame,
-        text_column : str = "texto"
+        text_column : str = "texto",
+        dedup : bool = False,
+        mapping_filename : str = None,
+        max_requests_per_shard : int = None,
+        max_bytes_per_shard : int = None,
+        prompt_cache_key : str = None,
+        row_filter = None,
+        preprocessor = None
 ) -> str:
-    dataset = df.to_dict(orient="records")
-
-    with open(filename, 'w', encoding='utf-8') as f:
-        for item in dataset:
-            request_body = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": item[text_column]}
-                ],
-                "response_format": {
-                    "type": "json_schema",
-                    "json_schema": {
-                        "name": nombre_schema,
-                        "schema": json_schema,
-                        "strict": True
-                    }
-                }
-            }
-            
-            batch_request = {
-                "custom_id": item["id"],
-                "method": "POST",
-                "url": "/v1/chat/completions",
-                "body": request_body
-            }
-            
-            f.write(json.dumps(batch_request, ensure_ascii=False) + '\n')
+    """
+    Con `dedup=True` solo se escribe una petición por cada `body` idéntico.
+    Los `custom_id` duplicados se guardan en `mapping_filename` (por defecto
+    `<filename>.mapping.jsonl`) como `{"custom_id", "representative_id"}`,
+    para repartir después los resultados con `expand_results.py`.
+
+    Con `max_requests_per_shard`/`max_bytes_per_shard` la salida se divide en
+    varios archivos (ver `ShardedOutput`) para respetar los límites por lote.
+
+    Con `prompt_cache_key` cada petición lleva esa clave, para que el
+    proveedor enrute las peticiones con el mismo prefijo a la misma caché.
+
+    `row_filter(ids, texts)` devuelve, para cada fila, si debe enviarse a la
+    API (p. ej. `LocalFilter`, que etiqueta en local los casos evidentes).
+    `preprocessor(ids, texts)` transforma después cada lote y devuelve
+    `(ids, texts)` (p. ej. `TextBudget`, que recorta o trocea textos largos).
+    """
+    envelope = build_envelope(model, prompt, json_schema, nombre_schema, prompt_cache_key)
+    mapping, mapping_filename = _open_mapping(filename, dedup, mapping_filename)
+
+    with ShardedOutput(filename, max_requests_per_shard, max_bytes_per_shard) as output:
+        writer = RequestWriter(output, envelope, mapping)
+        writer.write_columns(*_filter_rows(row_filter, df["id"].tolist(), df[text_column].tolist(), preprocessor))
 
+    _close_mapping(writer, mapping, mapping_filename)
     print(f"Archivo '{filename}' creado exitosamente.")
 
+def generate_file_from_parquet(
+        filename : str,
+        model : str,
+        prompt : str,
+        json_schema : dict,
+        nombre_schema : str,
+        input_file : str,
+        text_column : str = "texto",
+        dedup : bool = False,
+        mapping_filename : str = None,
+        batch_size : int = 65_536,
+        max_requests_per_shard : int = None,
+        max_bytes_per_shard : int = None,
+        prompt_cache_key : str = None,
+        row_filter = None,
+        preprocessor = None
+) -> str:
+    """
+    Igual que `generate_file`, pero lee el Parquet por lotes
+    (`iter_batches`, solo las columnas `id` y `text_column`) en lugar de
+    cargar el DataFrame completo. La memoria queda acotada por `batch_size`.
+    """
+    envelope = build_envelope(model, prompt, json_schema, nombre_schema, prompt_cache_key)
+    mapping, mapping_filename = _open_mapping(filename, dedup, mapping_filename)
+    # Sin `pre_buffer`, pyarrow no retiene los column chunks ya leídos
+    parquet = pq.ParquetFile(input_file, pre_buffer=False)
+
+    with ShardedOutput(filename, max_requests_per_shard, max_bytes_per_shard) as output:
+        writer = RequestWriter(output, envelope, mapping)
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=["id", text_column]):
+            writer.write_columns(*_filter_rows(row_filter, batch.column("id").to_pylist(), batch.column(text_column).to_pylist(), preprocessor))
+
+    _close_mapping(writer, mapping, mapping_filename)
+    print(f"Archivo '{filename}' creado exitosamente ({writer.written} peticiones).")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Genera un archivo JSONL listo para Batch API a partir de un dataset Parquet."
@@ -66,7 +368,7 @@ if __name__ == "__main__":
         "-o", "--output_file", 
         type=str, 
         required=True, 
-        help="Ruta donde se guardará el archivo `.jsonl` generado."
+        help="Ruta donde se guardará el archivo `.jsonl` generado (`.jsonl.gz` o `.jsonl.zst` para comprimirlo en streaming)."
     )
     parser.add_argument(
         "-m", "--model", 
@@ -79,8 +381,8 @@ if __name__ == "__main__":
         "-t", "--type", 
         type=str, 
         required=True, 
-        choices=["clickbait", "sensacionalism"], 
-        help="Tipo de análisis a realizar: 'clickbait' o 'sensacionalism'."
+        choices=list(TASKS), 
+        help="Tipo de análisis a realizar: 'clickbait', 'sensacionalism' o 'both' (ambos en una sola petición)."
     )
     parser.add_argument(
         "--text_column", 
@@ -88,27 +390,102 @@ if __name__ == "__main__":
         default="texto", 
         help="Nombre de la columna en el Parquet que contiene el texto a analizar."
     )
+    parser.add_argument(
+        "--dedup", 
+        action="store_true", 
+        help="Escribe una sola petición por cada body idéntico y guarda el mapeo de duplicados en `<output_file>.mapping.jsonl`."
+    )
+    parser.add_argument(
+        "--shard", 
+        action="store_true", 
+        help=f"Divide la salida en varios archivos respetando los límites de la Batch API ({BATCH_MAX_REQUESTS} peticiones / {BATCH_MAX_BYTES // (1024 * 1024)} MB por lote)."
+    )
+    parser.add_argument(
+        "--max_requests_per_shard", 
+        type=int, 
+        default=None, 
+        help="Máximo de peticiones por shard (implica --shard)."
+    )
+    parser.add_argument(
+        "--max_bytes_per_shard", 
+        type=int, 
+        default=None, 
+        help="Máximo de bytes por shard (implica --shard)."
+    )
+    parser.add_argument(
+        "--prompt_cache_key", 
+        action="store_true", 
+        help="Añade a cada petición un `prompt_cache_key` derivado del prompt y el schema (mejora los aciertos de la caché de prefijos)."
+    )
+    parser.add_argument(
+        "--local_model", 
+        type=str, 
+        default=None, 
+        help="Clasificador local entrenado con `distill.py`: las filas que clasifica con confianza no se envían a la API."
+    )
+    parser.add_argument(
+        "--local_threshold", 
+        type=float, 
+        default=0.95, 
+        help="Confianza mínima del clasificador local para no enviar una fila a la API."
+    )
+    parser.add_argument(
+        "--local_labels_file", 
+        type=str, 
+        default=None, 
+        help="Dónde guardar las etiquetas locales, en formato de resultados (por defecto `<output_file>.local.jsonl`)."
+    )
+    parser.add_argument(
+        "--max_input_tokens", 
+        type=int, 
+        default=None, 
+        help="Límite de tokens del texto de cada petición: los textos más largos se recortan (titular, entradilla y cierre)."
+    )
+    parser.add_argument(
+        "--chunk", 
+        action="store_true", 
+        help="Con --max_input_tokens, divide los textos largos en fragmentos en lugar de recortarlos (combínalos después con `truncate.py`)."
+    )
 
     args = parser.parse_args()
 
-    df = pd.read_parquet(args.input_file)
+    prompt, schema_model, nombre_schema = TASKS[args.type]
+    json_schema = schema_model.model_json_schema()
 
-    if args.type == "clickbait":
-        prompt = CLICKBAIT_PROMPT
-        json_schema = ClickbaitAnalysis.model_json_schema()
-        nombre_schema = "clickbait_analysis_schema"
-    
-    elif args.type == "sensacionalism":
-        prompt = SENSACIONALISM_PROMPT
-        json_schema = SensationalismAnalysis.model_json_schema()
-        nombre_schema = "sensationalism_analysis_schema"
+    max_requests, max_bytes = args.max_requests_per_shard, args.max_bytes_per_shard
+    if args.shard or max_requests or max_bytes:
+        max_requests = max_requests or BATCH_MAX_REQUESTS
+        max_bytes = max_bytes or BATCH_MAX_BYTES
+
+    row_filter = None
+    if args.local_model:
+        row_filter = LocalFilter(
+            LocalClassifier.load(args.local_model, task=args.type),
+            threshold=args.local_threshold,
+            labels_file=args.local_labels_file or f"{args.output_file}.local.jsonl",
+            constant_text=prompt + json.dumps(response_format(json_schema, nombre_schema), ensure_ascii=False)
+        )
+
+    preprocessor = TextBudget(args.max_input_tokens, chunk=args.chunk) if args.max_input_tokens else None
 
-    generate_file(
+    generate_file_from_parquet(
         filename=args.output_file,
         model=args.model,
         prompt=prompt,
         json_schema=json_schema,
         nombre_schema=nombre_schema,
-        df=df,
-        text_column=args.text_column
-    )
\ No newline at end of file
+        input_file=args.input_file,
+        text_column=args.text_column,
+        dedup=args.dedup,
+        max_requests_per_shard=max_requests,
+        max_bytes_per_shard=max_bytes,
+        prompt_cache_key=prefix_cache_key(prompt, json_schema, nombre_schema) if args.prompt_cache_key else None,
+        row_filter=row_filter,
+        preprocessor=preprocessor
+    )
+
+    if row_filter is not None:
+        row_filter.close()
+    if preprocessor is not None:
+        preprocessor.print_summary()
+        preprocessor.save_stats(stats_path(args.output_file))
\ No newline at end of file
@@ -0,0 +1,340 @@
+import asyncio
+import json
+import os
+import time
+import argparse
+
+import tiktoken
+from openai import OpenAI, AsyncOpenAI
+
+try:
+    from .client_pool import ClientPool
+    from .count_tokens import ContadorTokens
+    from .create_job import create_batch_job
+    from .download_output import stream_file_to_disk
+    from .io_utils import iter_jsonl, open_binary, open_text
+    from .runner import process_file_stream
+    from .retry import RetryPolicy
+    from .validation import ResponseValidator
+except ImportError:
+    from client_pool import ClientPool
+    from count_tokens import ContadorTokens
+    from create_job import create_batch_job
+    from download_output import stream_file_to_disk
+    from io_utils import iter_jsonl, open_binary, open_text
+    from runner import process_file_stream
+    from retry import RetryPolicy
+    from validation import ResponseValidator
+
+# La Batch API factura la mitad que las llamadas en tiempo real
+BATCH_DISCOUNT = 0.5
+BATCH_DONE = {"completed", "failed", "expired", "cancelled"}
+
+
+class HybridState:
+    """Estado persistente (JSON, escritura atómica) para poder relanzar el mismo comando."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+def request_costs(input_file: str, price_input_per_1m: float, price_output_per_1m: float, avg_output_tokens: int, encoding_name: str = "o200k_base") -> list:
+    """Coste estimado en tiempo real (USD) de cada línea, en el orden del archivo."""
+    contador = ContadorTokens(tiktoken.get_encoding(encoding_name))
+    costs = []
+    for line in iter_jsonl(input_file):
+        input_tokens, _, _ = contador.contar_body(line.get("body", {}))
+        costs.append((input_tokens * (price_input_per_1m or 0) + avg_output_tokens * (price_output_per_1m or 0)) / 1_000_000)
+    return costs
+
+
+def plan_split(costs: list, budget: float = None, realtime_fraction: float = None) -> int:
+    """
+    Número de líneas iniciales que van por tiempo real. Con `budget`, se
+    adelantan tantas como permita el presupuesto sobre el coste de enviarlo
+    todo por Batch (cada línea adelantada cuesta su precio completo en lugar
+    de la mitad).
+    """
+    if realtime_fraction is not None:
+        return int(len(costs) * realtime_fraction)
+    if budget is None:
+        return 0
+
+    batch_cost = sum(costs) * BATCH_DISCOUNT
+    extra = budget - batch_cost
+    if extra < 0:
+        print(f"⚠️ El presupuesto (${budget:.2f}) no cubre ni el Batch completo (${batch_cost:.2f}).")
+        return 0
+
+    n_realtime = 0
+    for cost in costs:
+        extra -= cost * (1 - BATCH_DISCOUNT)
+        if extra < 0:
+            break
+        n_realtime += 1
+    return n_realtime
+
+
+def split_file(input_file: str, n_realtime: int, realtime_file: str, batch_file: str):
+    with open_text(input_file) as f_in, \
+            open(realtime_file, 'w', encoding='utf-8') as f_rt, \
+            open(batch_file, 'w', encoding='utf-8') as f_batch:
+        n = 0
+        for line in f_in:
+            if not line.strip():
+                continue
+            (f_rt if n < n_realtime else f_batch).write(line if line.endswith('\n') else line + '\n')
+            n += 1
+
+
+def completed_ids(results_file: str) -> set:
+    """`custom_id` con respuesta correcta en un archivo de resultados."""
+    done = set()
+    if not results_file or not os.path.exists(results_file):
+        return done
+    for result in iter_jsonl(results_file):
+        response = result.get("response") or {}
+        if not result.get("error") and response.get("status_code") == 200:
+            done.add(str(result.get("custom_id")))
+    return done
+
+
+def merge_by_custom_id(input_file: str, results_files: list, output_file: str) -> int:
+    """
+    Une varios archivos de resultados en uno solo, con una línea por
+    `custom_id` en el orden del archivo de entrada. Si un `custom_id` aparece
+    en varios archivos, prevalece la respuesta correcta. Solo se guardan en
+    memoria los offsets de cada resultado.
+    """
+    best = {}
+    for idx, path in enumerate(results_files):
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                custom_id = str(result.get("custom_id"))
+                ok = not result.get("error") and (result.get("response") or {}).get("status_code") == 200
+                if custom_id not in best or (ok and not best[custom_id][2]):
+                    best[custom_id] = (idx, offset, ok)
+
+    handles = {idx: open(path, 'rb') for idx, path in enumerate(results_files) if path and os.path.exists(path)}
+    written = 0
+    try:
+        with open_binary(output_file, 'wb') as f_out:
+            for line in iter_jsonl(input_file):
+                entry = best.get(str(line.get("custom_id")))
+                if entry is None:
+                    continue
+                f = handles[entry[0]]
+                f.seek(entry[1])
+                result = f.readline()
+                f_out.write(result if result.endswith(b'\n') else result + b'\n')
+                written += 1
+    finally:
+        for f in handles.values():
+            f.close()
+    return written
+
+
+class HybridScheduler:
+    """
+    Reparte un archivo entre tiempo real y Batch API para cumplir un plazo al
+    menor coste: las primeras líneas (las que se necesitan antes) van por el
+    runner asíncrono y el resto por un Batch Job. Si el batch no ha terminado
+    cuando el tiempo restante hasta el plazo solo alcanza para procesar lo
+    pendiente en tiempo real, se cancela, se descargan los resultados
+    parciales y lo que falte se envía por tiempo real.
+    """
+
+    def __init__(
+            self,
+            batch_client: OpenAI,
+            realtime_client,
+            state: HybridState,
+            work_dir: str,
+            concurrency: int = 10,
+            poll_interval: float = 60.0,
+            min_margin: float = 1800.0,
+            realtime_rps: float = None,
+            retry_policy: RetryPolicy = None,
+            validator: ResponseValidator = None
+    ):
+        self.batch_client = batch_client
+        self.realtime_client = realtime_client
+        self.state = state
+        self.work_dir = work_dir
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.min_margin = min_margin
+        self.realtime_rps = realtime_rps
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.validator = validator
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.work_dir, name)
+
+    async def run_realtime(self, input_file: str, output_file: str):
+        """Runner asíncrono en streaming con reanudación; mide el throughput real."""
+        if os.path.getsize(input_file) == 0:
+            return
+        n_lines = sum(1 for _ in iter_jsonl(input_file))
+        started = time.monotonic()
+        await process_file_stream(
+            input_file=input_file,
+            output_file=output_file,
+            client=self.realtime_client,
+            concurrency=self.concurrency,
+            resume=os.path.exists(output_file + ".ckpt"),
+            retry_policy=self.retry_policy,
+            validator=self.validator
+        )
+        elapsed = time.monotonic() - started
+        if n_lines and elapsed > 0 and self.realtime_rps is None:
+            self.realtime_rps = n_lines / elapsed
+
+    async def run_batch(self, batch_file: str, deadline: float) -> str:
+        """Sigue el batch hasta que termine o haya que cortarlo. Devuelve el estado final."""
+        data = self.state.data
+        if os.path.getsize(batch_file) == 0:
+            return "completed"
+        if not data.get("batch_id"):
+            data["batch_id"] = await asyncio.to_thread(create_batch_job, self.batch_client, batch_file, "Etiquetado híbrido")
+            self.state.save()
+
+        cancelled = False
+        while True:
+            batch = await asyncio.to_thread(self.batch_client.batches.retrieve, data["batch_id"])
+            if batch.status in BATCH_DONE:
+                break
+
+            counts = batch.request_counts
+            pending = (counts.total - counts.completed - counts.failed) if counts and counts.total else data["batch_lines"]
+            rps = self.realtime_rps or self.concurrency
+            margin = max(self.min_margin, pending / rps)
+
+            if cancelled:
+                print(f"⏳ Esperando a que el batch termine de cancelarse ('{batch.status}').")
+            elif time.time() >= deadline - margin:
+                print(f"⏰ El batch no terminará a tiempo ({pending} pendientes). Cancelando y pasando el resto a tiempo real...")
+                await asyncio.to_thread(self.batch_client.batches.cancel, data["batch_id"])
+                cancelled = True
+            else:
+                print(f"⏳ Batch en '{batch.status}'. Corte a tiempo real en {max(0, deadline - margin - time.time()) / 60:.0f} min.")
+
+            await asyncio.sleep(self.poll_interval)
+
+        # Los batches cancelados o expirados también publican la salida de lo ya procesado
+        if batch.output_file_id:
+            await asyncio.to_thread(stream_file_to_disk, self.batch_client, batch.output_file_id, self.path("batch_output.jsonl"))
+        data["batch_status"] = batch.status
+        self.state.save()
+        return batch.status
+
+    async def run(self, input_file: str, output_file: str, deadline: float, n_realtime: int):
+        data = self.state.data
+        realtime_file, batch_file = self.path("realtime_input.jsonl"), self.path("batch_input.jsonl")
+
+        if "n_realtime" not in data:
+            split_file(input_file, n_realtime, realtime_file, batch_file)
+            data.update({"n_realtime": n_realtime, "deadline": deadline, "batch_lines": sum(1 for _ in iter_jsonl(batch_file))})
+            self.state.save()
+        print(f"🔀 {data['n_realtime']} peticiones en tiempo real / {data['batch_lines']} por Batch API.")
+
+        realtime_output = self.path("realtime_output.jsonl")
+        await asyncio.gather(
+            self.run_realtime(realtime_file, realtime_output),
+            self.run_batch(batch_file, data["deadline"]) if data.get("batch_status") is None else asyncio.sleep(0)
+        )
+
+        # Lo que el batch no resolvió (cancelado, expirado o con errores) va por tiempo real
+        batch_output = self.path("batch_output.jsonl")
+        done = completed_ids(batch_output)
+        fallback_file, fallback_output = self.path("fallback_input.jsonl"), self.path("fallback_output.jsonl")
+        with open(fallback_file, 'w', encoding='utf-8') as f:
+            n_fallback = 0
+            for line in iter_jsonl(batch_file):
+                if str(line.get("custom_id")) not in done:
+                    f.write(json.dumps(line, ensure_ascii=False) + '\n')
+                    n_fallback += 1
+        if n_fallback:
+            print(f"🚑 {n_fallback} peticiones del batch pasan a tiempo real.")
+            await self.run_realtime(fallback_file, fallback_output)
+
+        written = merge_by_custom_id(input_file, [batch_output, realtime_output, fallback_output], output_file)
+        status = "✅ dentro de plazo" if time.time() <= data["deadline"] else "⚠️ fuera de plazo"
+        print(f"{status}: {written} resultados guardados en '{output_file}'.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reparte un JSONL entre tiempo real y Batch API para cumplir un plazo con el menor coste."
+    )
+    parser.add_argument("-i", "--input_file", type=str, required=True, help="Archivo `.jsonl` generado con `generate_file` (orden = prioridad).")
+    parser.add_argument("-o", "--output_file", type=str, required=True, help="Archivo `.jsonl` con todos los resultados, uno por `custom_id`.")
+    parser.add_argument("--deadline_hours", type=float, required=True, help="Plazo (horas desde el primer lanzamiento) para tener todos los resultados.")
+    parser.add_argument("--budget", type=float, default=None, help="Presupuesto en USD; lo que sobre respecto al Batch completo se usa para adelantar líneas a tiempo real.")
+    parser.add_argument("--realtime_fraction", type=float, default=None, help="Fracción inicial del archivo que va por tiempo real (alternativa a --budget).")
+    parser.add_argument("--input_price", type=float, default=None, help="Precio en tiempo real por 1M de tokens de entrada.")
+    parser.add_argument("--output_price", type=float, default=None, help="Precio en tiempo real por 1M de tokens de salida.")
+    parser.add_argument("--avg_output_tokens", type=int, default=150, help="Tokens de salida estimados por petición (para el presupuesto).")
+    parser.add_argument("--work_dir", type=str, default=None, help="Directorio de trabajo y estado (por defecto `<output_file>.hybrid/`).")
+    parser.add_argument("--concurrency", type=int, default=10, help="Peticiones simultáneas en tiempo real.")
+    parser.add_argument("--endpoints_file", type=str, default=None, help="Pool de endpoints para la parte en tiempo real (ver `process_async`).")
+    parser.add_argument("--poll_interval", type=float, default=60.0, help="Segundos entre consultas de estado del batch.")
+    parser.add_argument("--min_margin_minutes", type=float, default=30.0, help="Margen mínimo antes del plazo para pasar lo pendiente a tiempo real.")
+    parser.add_argument("--validate", action="store_true", help="Valida (y repara) las respuestas en tiempo real y vuelve a pedir las inválidas.")
+
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or args.output_file + ".hybrid"
+    os.makedirs(work_dir, exist_ok=True)
+    state = HybridState(os.path.join(work_dir, "state.json"))
+
+    n_realtime = 0
+    if "n_realtime" not in state.data:
+        if args.budget is not None and args.input_price is None:
+            raise ValueError("❌ --budget necesita --input_price (y --output_price).")
+        planned = args.budget is not None or args.realtime_fraction is not None
+        costs = request_costs(args.input_file, args.input_price, args.output_price, args.avg_output_tokens) if planned else []
+        n_realtime = plan_split(costs, args.budget, args.realtime_fraction)
+        if costs and args.input_price is not None:
+            projected = sum(costs[:n_realtime]) + sum(costs[n_realtime:]) * BATCH_DISCOUNT
+            print(f"💰 Coste previsto: ${projected:.2f} (todo Batch: ${sum(costs) * BATCH_DISCOUNT:.2f}, todo tiempo real: ${sum(costs):.2f})")
+
+    scheduler = HybridScheduler(
+        batch_client=OpenAI(),
+        realtime_client=ClientPool.from_file(args.endpoints_file) if args.endpoints_file else AsyncOpenAI(max_retries=0),
+        state=state,
+        work_dir=work_dir,
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        min_margin=args.min_margin_minutes * 60,
+        validator=ResponseValidator() if args.validate else None
+    )
+
+    try:
+        asyncio.run(scheduler.run(
+            input_file=args.input_file,
+            output_file=args.output_file,
+            deadline=state.data.get("deadline") or time.time() + args.deadline_hours * 3600,
+            n_realtime=n_realtime
+        ))
+    except KeyboardInterrupt:
+        print("\n🛑 Detenido por el usuario. Relanza el mismo comando para continuar.")
@@ -0,0 +1,166 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Extensión → formato de compresión (se detecta por el nombre del archivo)
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+READ_BUFFER_SIZE = 1 << 20
+
+
+def compression_of(path: str):
+    """`"gzip"`, `"zstd"` o None según la extensión de `path`."""
+    return COMPRESSIONS.get(os.path.splitext(str(path))[1].lower())
+
+
+def split_ext(path: str) -> tuple:
+    """Como `os.path.splitext`, pero conservando la extensión de compresión: `a.jsonl.zst` → (`a`, `.jsonl.zst`)."""
+    base, ext = os.path.splitext(path)
+    if ext.lower() in COMPRESSIONS:
+        base, inner = os.path.splitext(base)
+        ext = inner + ext
+    return base, ext
+
+
+def strip_compression(path: str) -> str:
+    """Nombre del archivo sin la extensión de compresión (`a.jsonl.zst` → `a.jsonl`)."""
+    return os.path.splitext(path)[0] if compression_of(path) else path
+
+
+def _require(compression: str):
+    if compression == "zstd" and zstandard is None:
+        raise ImportError("❌ Para archivos .zst instala `zstandard` (pip install zstandard).")
+
+
+class CompressedWriter(io.RawIOBase):
+    """
+    Escritura comprimida en streaming sobre un archivo binario ya abierto,
+    organizada en bloques independientes (frames zstd o miembros gzip). Al
+    cerrar un bloque con `end_block()` el archivo es válido hasta ese punto,
+    de modo que puede truncarse al offset devuelto (p. ej. al reanudar) sin
+    corromper lo anterior. Los lectores de `open_binary` leen todos los bloques.
+    """
+
+    def __init__(self, raw, compression: str, level: int = None):
+        _require(compression)
+        self.raw = raw
+        self.compression = compression
+        self.level = level or DEFAULT_LEVELS[compression]
+        self._block = None
+
+    def writable(self) -> bool:
+        return True
+
+    def _open_block(self):
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).stream_writer(self.raw, closefd=False)
+        return gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=self.level)
+
+    def write(self, data) -> int:
+        if self._block is None:
+            self._block = self._open_block()
+        self._block.write(data)
+        return len(data)
+
+    def end_block(self) -> int:
+        """Cierra el bloque en curso y devuelve el offset (comprimido) del archivo tras él."""
+        if self._block is not None:
+            self._block.close()
+            self._block = None
+        self.raw.flush()
+        return self.raw.tell()
+
+    def flush(self):
+        if self._block is not None:
+            self._block.flush()
+        self.raw.flush()
+
+    def fileno(self) -> int:
+        return self.raw.fileno()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.end_block()
+            super().close()
+        finally:
+            self.raw.close()
+
+
+def open_binary(path: str, mode: str = "rb", compression: str = None, level: int = None):
+    """
+    Abre `path` en binario. Si la extensión es `.gz` o `.zst` (o se indica
+    `compression`) el contenido se comprime/descomprime en streaming, sin
+    cargar el archivo en memoria. En escritura devuelve un `CompressedWriter`.
+    """
+    compression = compression or compression_of(path)
+    if compression is None:
+        return open(path, mode)
+    _require(compression)
+
+    if "r" in mode:
+        if compression == "gzip":
+            return gzip.open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader, READ_BUFFER_SIZE)
+
+    return CompressedWriter(open(path, mode), compression, level)
+
+
+def open_text(path: str, mode: str = "r", compression: str = None, level: int = None):
+    """Equivalente de `open(path, mode, encoding='utf-8')` con (des)compresión transparente."""
+    compression = compression or compression_of(path)
+    if compression is None:
+        return open(path, mode, encoding="utf-8")
+    binary = open_binary(path, mode.replace("t", "") + "b", compression, level)
+    if "r" not in mode:
+        binary = io.BufferedWriter(binary, READ_BUFFER_SIZE)
+    return io.TextIOWrapper(binary, encoding="utf-8")
+
+
+class _ReadOnlyStream:
+    """Solo expone `read`: así el cliente HTTP no toma el tamaño del archivo comprimido (vía `fileno`) como el del cuerpo."""
+
+    def __init__(self, f):
+        self._f = f
+
+    def read(self, size: int = -1) -> bytes:
+        return self._f.read(size)
+
+    def close(self):
+        self._f.close()
+
+
+@contextlib.contextmanager
+def upload_source(path: str):
+    """
+    Argumento `file` para `client.files.create`. Los archivos comprimidos se
+    suben descomprimidos en streaming (la Batch API solo acepta JSONL plano)
+    con el nombre sin la extensión de compresión; el resto se sube tal cual.
+    """
+    if compression_of(path) is None:
+        with open(path, "rb") as f:
+            yield f
+        return
+    stream = _ReadOnlyStream(open_binary(path))
+    try:
+        yield (os.path.basename(strip_compression(path)), stream)
+    finally:
+        stream.close()
+
+
+def iter_jsonl(input_file: str):
+    """Lee el JSONL (plano, `.gz` o `.zst`) de forma perezosa, una línea cada vez."""
+    with open_text(input_file) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,194 @@
+import json
+
+import numpy as np
+import pandas as pd
+import tiktoken
+
+TOKEN_RE = r"\w+|[^\w\s]"
+BIGRAM_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def hashed_ngrams(texts: list, n_features: int, max_tokens: int = 256) -> tuple:
+    """
+    Rasgos de unigramas y bigramas de palabras (y signos de puntuación, que en
+    titulares son una señal: `¿`, `!`, `:`) hasheados en `n_features` cubos.
+    Todo se calcula de forma vectorizada sobre el lote: devuelve los arrays
+    planos `(doc, feature)`, uno por n-grama, más el número de documentos.
+    Solo se usan los primeros `max_tokens` tokens de cada texto.
+    """
+    tokens = pd.Series(texts, dtype=object).fillna("").astype(str).str.lower().str.findall(TOKEN_RE).explode().dropna()
+    tokens = tokens[tokens.groupby(level=0).cumcount() < max_tokens]
+
+    doc = tokens.index.to_numpy(dtype=np.int64)
+    unigrams = pd.util.hash_array(tokens.to_numpy(dtype=object))
+
+    # Bigramas: hash de cada token combinado con el siguiente del mismo documento
+    same_doc = doc[1:] == doc[:-1]
+    bigrams = (unigrams[:-1] * BIGRAM_MIX + unigrams[1:])[same_doc]
+
+    docs = np.concatenate((doc, doc[1:][same_doc]))
+    features = (np.concatenate((unigrams, bigrams)) % np.uint64(n_features)).astype(np.int64)
+    return docs, features, len(texts)
+
+
+class LocalClassifier:
+    """
+    Regresión logística sobre n-gramas hasheados, una salida por cada campo
+    booleano de la tarea (`is_clickbait`, `is_sensationalist`). Cada documento
+    se normaliza por la raíz de su número de n-gramas, de modo que los logits
+    y el gradiente son sumas dispersas que se calculan con `np.bincount`.
+    El artefacto guarda la tarea (`task`) con la que se entrenó.
+    """
+
+    def __init__(self, fields: list, reasoning_fields: list = (), n_features: int = 1 << 20, max_tokens: int = 256, task: str = None):
+        self.task = task
+        self.fields = list(fields)
+        self.reasoning_fields = list(reasoning_fields)
+        self.n_features = n_features
+        self.max_tokens = max_tokens
+        self.weights = np.zeros((len(self.fields), n_features))
+        self.bias = np.zeros(len(self.fields))
+
+    def features(self, texts: list) -> tuple:
+        docs, features, n = hashed_ngrams(texts, self.n_features, self.max_tokens)
+        scale = 1.0 / np.sqrt(np.maximum(np.bincount(docs, minlength=n), 1))
+        return docs, features, scale[docs], n
+
+    def _logits(self, featurized: tuple) -> np.ndarray:
+        docs, features, values, n = featurized
+        return np.stack([
+            np.bincount(docs, weights=w[features] * values, minlength=n) + b
+            for w, b in zip(self.weights, self.bias)
+        ], axis=1)
+
+    def fit(self, texts: list, labels: np.ndarray, epochs: int = 100, learning_rate: float = 0.5, l2: float = 1e-6):
+        """Descenso por gradiente a lote completo con Adagrad. `labels`: matriz `(n, campos)` de 0/1."""
+        featurized = self.features(texts)
+        docs, features, values, n = featurized
+        labels = np.asarray(labels, dtype=np.float64).reshape(n, len(self.fields))
+        grad_sq_w = np.full_like(self.weights, 1e-8)
+        grad_sq_b = np.full_like(self.bias, 1e-8)
+
+        for _ in range(epochs):
+            residual = (1.0 / (1.0 + np.exp(-self._logits(featurized))) - labels) / n
+            for k in range(len(self.fields)):
+                grad_w = np.bincount(features, weights=residual[docs, k] * values, minlength=self.n_features) + l2 * self.weights[k]
+                grad_b = residual[:, k].sum()
+                grad_sq_w[k] += grad_w ** 2
+                grad_sq_b[k] += grad_b ** 2
+                self.weights[k] -= learning_rate * grad_w / np.sqrt(grad_sq_w[k])
+                self.bias[k] -= learning_rate * grad_b / np.sqrt(grad_sq_b[k])
+        return self
+
+    def predict_proba(self, texts: list) -> np.ndarray:
+        """Probabilidad de `True` de cada campo, matriz `(n, campos)`."""
+        if len(texts) == 0:
+            return np.zeros((0, len(self.fields)))
+        return 1.0 / (1.0 + np.exp(-self._logits(self.features(texts))))
+
+    @staticmethod
+    def confidence(proba: np.ndarray) -> np.ndarray:
+        """Confianza de cada fila: la del campo menos seguro."""
+        return np.abs(proba - 0.5).min(axis=1) + 0.5
+
+    def save(self, path: str):
+        meta = {
+            "task": self.task,
+            "fields": self.fields,
+            "reasoning_fields": self.reasoning_fields,
+            "n_features": self.n_features,
+            "max_tokens": self.max_tokens
+        }
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, weights=self.weights.astype(np.float32), bias=self.bias, meta=json.dumps(meta))
+
+    @classmethod
+    def load(cls, path: str, task: str = None) -> "LocalClassifier":
+        """Con `task`, comprueba que el modelo se entrenó para esa tarea."""
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            model = cls(meta["fields"], meta["reasoning_fields"], meta["n_features"], meta["max_tokens"], meta.get("task"))
+            model.weights = data["weights"].astype(np.float64)
+            model.bias = data["bias"]
+
+        if task is not None:
+            if model.task is None:
+                print(f"⚠️ '{path}' no indica su tarea (campos: {model.fields}); se asume '{task}'.")
+            elif model.task != task:
+                raise ValueError(f"❌ El modelo local '{path}' se entrenó para '{model.task}', no para '{task}'.")
+        return model
+
+
+class LocalFilter:
+    """
+    Filtro de filas para `generate_file_from_parquet`: puntúa cada lote con el
+    clasificador local y solo deja pasar a la API las filas con confianza por
+    debajo de `threshold`. Las demás se escriben en `labels_file` con el mismo
+    formato que los resultados de la Batch API (`merge_results` y
+    `expand_results` las aceptan tal cual).
+
+    `constant_text` es la parte fija de cada petición (prompt de sistema y
+    schema), para estimar los tokens de entrada ahorrados.
+    """
+
+    def __init__(self, model: LocalClassifier, threshold: float, labels_file: str, constant_text: str = "", encoding_name: str = "o200k_base"):
+        self.model = model
+        self.threshold = threshold
+        self.labels_file = labels_file
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.constant_tokens = len(self.encoding.encode(constant_text, disallowed_special=()))
+        self.total = 0
+        self.skipped = 0
+        self.saved_tokens = 0
+        self.positives = np.zeros(len(model.fields), dtype=np.int64)
+        self._f = None
+
+    def __call__(self, ids: list, texts: list) -> list:
+        if self._f is None:
+            self._f = open(self.labels_file, 'w', encoding='utf-8')
+
+        proba = self.model.predict_proba(texts)
+        confidence = self.model.confidence(proba)
+        confident = confidence >= self.threshold
+        self.total += len(ids)
+
+        for pos in np.flatnonzero(confident):
+            content = {name: f"Clasificador local (confianza {confidence[pos]:.3f})" for name in self.model.reasoning_fields}
+            content.update({name: bool(p >= 0.5) for name, p in zip(self.model.fields, proba[pos])})
+            result = {
+                "id": f"local-{ids[pos]}",
+                "custom_id": ids[pos],
+                "response": {
+                    "status_code": 200,
+                    "request_id": "local",
+                    "body": {"choices": [{"message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)}}]}
+                },
+                "error": None
+            }
+            self._f.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+        skipped_texts = [texts[pos] or "" for pos in np.flatnonzero(confident)]
+        self.skipped += len(skipped_texts)
+        self.positives += (proba[confident] >= 0.5).sum(axis=0)
+        self.saved_tokens += len(skipped_texts) * self.constant_tokens + sum(
+            len(tokens) for tokens in self.encoding.encode_batch(skipped_texts, disallowed_special=())
+        )
+        return (~confident).tolist()
+
+    def close(self):
+        if self._f is None:
+            self._f = open(self.labels_file, 'w', encoding='utf-8')
+        self._f.close()
+
+        separator = "─" * 40
+        print("🤖 CLASIFICADOR LOCAL")
+        print(separator)
+        print(f"{'Umbral de confianza':<22} : {self.threshold}")
+        print(f"{'Filas puntuadas':<22} : {self.total}")
+        print(f"{'Etiquetadas en local':<22} : {self.skipped} ({self.skipped / max(self.total, 1):.1%})")
+        for name, positives in zip(self.model.fields, self.positives):
+            print(f"{'  ' + name:<22} : {positives} True / {self.skipped - positives} False")
+        print(f"{'Llamadas API ahorradas':<22} : {self.skipped}")
+        print(f"{'Tokens entrada ahorr.':<22} : ~{self.saved_tokens}")
+        print(separator)
+        print(f"Etiquetas locales guardadas en '{self.labels_file}'.\n")
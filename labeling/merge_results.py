@@ -0,0 +1,375 @@
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pydantic import TypeAdapter, ValidationError
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+try:
+    from .generate_file import TASKS
+    from .validation import repair_json
+    from .io_utils import open_binary
+except ImportError:
+    from generate_file import TASKS
+    from validation import repair_json
+    from io_utils import open_binary
+
+PA_TYPES = {bool: pa.bool_(), str: pa.string(), int: pa.int64(), float: pa.float64()}
+
+
+def label_schema(model) -> pa.Schema:
+    """Columnas tipadas de las etiquetas (campos del modelo Pydantic) más `request_id` y `error`."""
+    fields = [pa.field(name, PA_TYPES[info.annotation]) for name, info in model.model_fields.items()]
+    return pa.schema(fields + [pa.field("request_id", pa.string()), pa.field("error", pa.string())])
+
+
+def parse_result(line: bytes) -> tuple:
+    """
+    Extrae `(custom_id, request_id, content, error)` de una línea de resultados
+    (Batch API o `process_async`). `content` es el JSON anidado sin parsear.
+    """
+    result = loads(line)
+    custom_id = str(result.get("custom_id"))
+    response = result.get("response") or {}
+    request_id = response.get("request_id")
+
+    error = result.get("error")
+    if error:
+        return custom_id, request_id, None, error.get("message") or error.get("code") or str(error)
+
+    status = response.get("status_code")
+    body = response.get("body") or {}
+    if status != 200:
+        message = (body.get("error") or {}).get("message")
+        return custom_id, request_id, None, message or f"status_code {status}"
+
+    try:
+        content = body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return custom_id, request_id, None, "respuesta sin contenido"
+    if content is None:
+        return custom_id, request_id, None, "respuesta sin contenido"
+    return custom_id, request_id, content, None
+
+
+class LabelValidator:
+    """
+    Valida los `content` de un lote en una sola llamada: el lote se une en un
+    único array JSON que pydantic-core parsea y valida de una vez. Si alguna
+    respuesta no es válida, ese lote se valida elemento a elemento y las que
+    fallan se intentan reparar con `repair_json` (JSON truncado o con texto extra).
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.fields = list(model.model_fields)
+        self.list_adapter = TypeAdapter(list[model])
+
+    def validate(self, contents: list) -> list:
+        """Devuelve, por cada `content`, `(modelo validado, None)` o `(None, error)`."""
+        try:
+            items = self.list_adapter.validate_json("[" + ",".join(contents) + "]")
+            # Un `content` con varios objetos (`{..},{..}`) desplazaría las filas siguientes
+            if len(items) == len(contents):
+                return [(item, None) for item in items]
+        except ValidationError:
+            pass
+
+        validated = []
+        for content in contents:
+            try:
+                validated.append((self.model.model_validate_json(content), None))
+            except ValidationError as e:
+                error = e
+                repaired = repair_json(content)
+                if repaired is not None:
+                    try:
+                        validated.append((self.model.model_validate_json(repaired), None))
+                        continue
+                    except ValidationError as repair_error:
+                        error = repair_error
+                validated.append((None, f"validación: {error.errors()[0]['msg']}"))
+        return validated
+
+
+class LabelTable:
+    """
+    Etiquetas validadas, escritas en lotes de `batch_size` a un archivo Arrow
+    temporal (`path`) en lugar de acumularse en memoria. Al terminar
+    (`finish`) se elige la fila de cada `custom_id` —si aparece varias veces
+    (p. ej. un shard reenviado), prevalece el último resultado correcto— y
+    solo se guarda un índice compacto: el hash de 64 bits de cada id, ordenado,
+    y su fila (`lookup` busca con `np.searchsorted`). Las etiquetas se leen
+    después del archivo mapeado en memoria, lote a lote.
+    """
+
+    def __init__(self, model, path: str, batch_size: int = 10_000):
+        self.schema = label_schema(model)
+        self.file_schema = pa.schema([pa.field("custom_id", pa.string())] + list(self.schema))
+        self.validator = LabelValidator(model)
+        self.path = path
+        self.batch_size = batch_size
+        self.rows = 0
+        self.unique = 0
+        self.errors = 0
+        self.labels = None
+        self._writer = pa.ipc.new_file(path, self.file_schema)
+        self._source = None
+        self._pending = []
+
+    def add(self, custom_id: str, request_id: str, content: str, error: str):
+        self._pending.append((custom_id, request_id, content, error))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+
+        to_validate = [content for _, _, content, error in pending if error is None]
+        validated = iter(self.validator.validate(to_validate)) if to_validate else iter(())
+
+        columns = {name: [] for name in self.file_schema.names}
+        for custom_id, request_id, content, error in pending:
+            item = None
+            if error is None:
+                item, error = next(validated)
+            columns["custom_id"].append(custom_id)
+            for name in self.validator.fields:
+                columns[name].append(getattr(item, name) if item is not None else None)
+            columns["request_id"].append(request_id)
+            columns["error"].append(error)
+
+        self._writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=self.file_schema))
+        self.rows += len(pending)
+
+    def finish(self):
+        """Cierra el archivo temporal y construye el índice `hash(custom_id)` → fila."""
+        self.flush()
+        self._writer.close()
+        self._source = pa.memory_map(self.path)
+        self.labels = pa.ipc.open_file(self._source).read_all()
+        ids = self.labels.column("custom_id")
+        if not self.rows:
+            self.keys = self.positions = np.empty(0, dtype=np.int64)
+            self.unique = self.errors = 0
+            return
+
+        hashes = np.empty(self.rows, dtype=np.int64)
+        for start in range(0, self.rows, self.batch_size):
+            hashes[start:start + self.batch_size] = _hashes(ids.slice(start, self.batch_size))
+        ok = pc.is_null(self.labels.column("error")).to_numpy(zero_copy_only=False)
+
+        # Fila ganadora por id: ordenadas por (hash, correcta, fila), la última de
+        # cada hash es la última correcta o, si ninguna lo es, la última
+        order = np.lexsort((ok, hashes))
+        sorted_hashes = hashes[order]
+        del hashes
+        boundary = np.append(sorted_hashes[1:] != sorted_hashes[:-1], True)
+        last = np.flatnonzero(boundary)
+        first = np.append(0, last[:-1] + 1)
+        keys, positions = sorted_hashes[last], order[last]
+
+        # Un hash repetido suele ser el mismo id (reenvíos), pero puede ser otro
+        # id con el mismo hash: esos grupos se resuelven por el id real
+        run = np.cumsum(np.append(False, boundary[:-1]))
+        repeated = (last - first)[run] > 0
+        rows = order[repeated]
+        same = pc.equal(ids.take(pa.array(rows)), ids.take(pa.array(positions[run[repeated]])))
+        collisions = np.unique(run[repeated][~same.to_numpy(zero_copy_only=False)])
+        if len(collisions):
+            extra_keys, extra_positions = [], []
+            for r in collisions:
+                winners = {}
+                for row in order[first[r]:last[r] + 1]:
+                    winners[ids[int(row)].as_py()] = row
+                extra_keys.extend([keys[r]] * len(winners))
+                extra_positions.extend(winners.values())
+            keep = np.ones(len(keys), dtype=bool)
+            keep[collisions] = False
+            keys = np.concatenate([keys[keep], np.array(extra_keys, dtype=np.int64)])
+            positions = np.concatenate([positions[keep], np.array(extra_positions, dtype=np.int64)])
+            resort = np.argsort(keys, kind="stable")
+            keys, positions = keys[resort], positions[resort]
+
+        self.keys = keys
+        self.positions = positions.astype(np.int64)
+        self.unique = len(keys)
+        self.errors = int((~ok[positions]).sum())
+
+    def lookup(self, ids: pa.Array) -> pa.Array:
+        """Fila de etiquetas de cada id (nula si no tiene resultado)."""
+        if not self.unique:
+            return pa.nulls(len(ids), pa.int64())
+        hashes = _hashes(ids)
+        slots = np.minimum(np.searchsorted(self.keys, hashes), self.unique - 1)
+        found = self.keys[slots] == hashes
+        positions = np.where(found, self.positions[slots], 0)
+
+        # El hash puede coincidir entre ids distintos: se comprueba el id real
+        # y, si no es el mismo, se recorren las demás entradas con ese hash
+        stored = self.labels.column("custom_id").take(pa.array(positions))
+        same = pc.fill_null(pc.equal(stored, ids), False).to_numpy(zero_copy_only=False)
+        for i in np.flatnonzero(found & ~same):
+            found[i] = False
+            slot = slots[i]
+            while slot < self.unique and self.keys[slot] == hashes[i]:
+                if self.labels.column("custom_id")[int(self.positions[slot])].as_py() == ids[i].as_py():
+                    positions[i], found[i] = self.positions[slot], True
+                    break
+                slot += 1
+        return pa.array(positions, mask=~found)
+
+    def close(self):
+        self._writer.close()
+        self.labels = None
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+
+def _hashes(ids: pa.Array) -> np.ndarray:
+    """Hash de 64 bits de cada id (el de Python: estable dentro del proceso)."""
+    return np.fromiter((hash(x) for x in ids.to_pylist()), dtype=np.int64, count=len(ids))
+
+
+def _write_merged(labels: LabelTable, source_file: str, output_file: str, columns: list, row_group_size: int) -> tuple:
+    """Recorre el Parquet de origen por lotes y escribe cada uno con sus etiquetas. Devuelve `(con resultado, total)`."""
+    # Sin `pre_buffer`, pyarrow no retiene los column chunks ya leídos
+    parquet = pq.ParquetFile(source_file, pre_buffer=False)
+    if columns and "id" not in columns:
+        columns = ["id"] + list(columns)
+
+    merged = 0
+    total = 0
+    writer = None
+    try:
+        for batch in parquet.iter_batches(batch_size=row_group_size, columns=columns):
+            take = labels.lookup(pc.cast(batch.column("id"), pa.string()))
+            matched = labels.labels.take(take)
+
+            table = pa.Table.from_batches([batch])
+            for name in labels.schema.names:
+                table = table.append_column(name, matched.column(name))
+
+            if writer is None:
+                writer = pq.ParquetWriter(output_file, table.schema)
+            writer.write_table(table, row_group_size=row_group_size)
+
+            total += batch.num_rows
+            merged += batch.num_rows - take.null_count
+    finally:
+        if writer is not None:
+            writer.close()
+    return merged, total
+
+
+def merge_results(
+        results_files : list,
+        source_file : str,
+        output_file : str,
+        task : str = "clickbait",
+        columns : list = None,
+        row_group_size : int = 65_536,
+        validate_batch_size : int = 10_000
+) -> dict:
+    """
+    Une los resultados (JSONL de `download_output` o `process_async`) con el
+    Parquet de origen por `custom_id` = `id` y escribe un Parquet tipado con
+    las columnas de origen más las etiquetas, `request_id` y `error`.
+    Con `task="both"` la respuesta combinada se separa en las columnas de
+    ambas tareas (las mismas que producen `clickbait` y `sensacionalism`).
+
+    Los resultados se leen en streaming y se escriben a un archivo Arrow
+    temporal (ver `LabelTable`); el Parquet de origen se recorre con
+    `iter_batches` y cada lote se escribe como un row group, de modo que en
+    memoria solo quedan un lote y el índice compacto de ids.
+    Las filas sin resultado quedan con etiquetas nulas.
+    """
+    # Las etiquetas van a un archivo Arrow temporal junto a la salida
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file))) as tmp:
+        labels = LabelTable(TASKS[task][1], os.path.join(tmp, "labels.arrow"), batch_size=validate_batch_size)
+        try:
+            for results_file in results_files:
+                with open_binary(results_file) as f:
+                    for line in f:
+                        if line.strip():
+                            labels.add(*parse_result(line))
+            labels.finish()
+            merged, total = _write_merged(labels, source_file, output_file, columns, row_group_size)
+        finally:
+            labels.close()
+
+    unmatched = labels.unique - merged
+    print(f"✅ {total} filas escritas en '{output_file}' ({merged} con resultado, {labels.errors} resultados con error).")
+    if unmatched > 0:
+        print(f"⚠️ {unmatched} resultados no tienen fila en '{source_file}'.")
+
+    return {"rows": total, "merged": merged, "errors": labels.errors, "unmatched": unmatched}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Une los resultados del etiquetado con el Parquet de origen y guarda un Parquet tipado."
+    )
+    parser.add_argument(
+        "-r", "--results_files",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Archivos `.jsonl` de resultados (Batch API o process_async)."
+    )
+    parser.add_argument(
+        "-i", "--input_file",
+        type=str,
+        required=True,
+        help="Parquet de origen (columna `id` = `custom_id`)."
+    )
+    parser.add_argument(
+        "-o", "--output_file",
+        type=str,
+        required=True,
+        help="Ruta del `.parquet` de salida."
+    )
+    parser.add_argument(
+        "-t", "--type",
+        type=str,
+        required=True,
+        choices=list(TASKS),
+        help="Tipo de análisis de los resultados: 'clickbait', 'sensacionalism' o 'both'."
+    )
+    parser.add_argument(
+        "--columns",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Columnas del Parquet de origen a conservar (por defecto, todas)."
+    )
+    parser.add_argument(
+        "--row_group_size",
+        type=int,
+        default=65_536,
+        help="Filas por row group del Parquet de salida."
+    )
+
+    args = parser.parse_args()
+
+    merge_results(
+        results_files=args.results_files,
+        source_file=args.input_file,
+        output_file=args.output_file,
+        task=args.type,
+        columns=args.columns,
+        row_group_size=args.row_group_size
+    )
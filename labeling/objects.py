@@ -26,4 +26,11 @@ class SensationalismAnalysis(BaseModel):
     is_sensationalist: bool = Field(
         ..., 
         description="True si el artículo es sensacionalista (manipula emociones/exagera), False si es periodismo neutral/riguroso."
-    )
\ No newline at end of file
+    )
+
+class CombinedAnalysis(SensationalismAnalysis, ClickbaitAnalysis):
+    # ---------------------------------------------------------
+    # Ambos análisis en una sola respuesta: hereda los campos de
+    # ClickbaitAnalysis y SensationalismAnalysis (en ese orden).
+    # ---------------------------------------------------------
+    pass
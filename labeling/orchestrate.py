@@ -0,0 +1,364 @@
+import asyncio
+import json
+import os
+import argparse
+
+import openai
+from openai import AsyncOpenAI
+
+try:
+    from .download_output import CHUNK_SIZE, PartialDownload
+    from .io_utils import open_binary, split_ext, upload_source
+    from .retry import classify_error
+except ImportError:
+    from download_output import CHUNK_SIZE, PartialDownload
+    from io_utils import open_binary, split_ext, upload_source
+    from retry import classify_error
+
+TERMINAL_OK = {"completed"}
+TERMINAL_RETRY = {"failed", "expired", "cancelled"}
+
+
+class OrchestratorState:
+    """
+    Estado persistente del orquestador (JSON). Por cada shard guarda el
+    `file_id`, el `batch_id`, el último estado conocido, el número de envíos
+    y la ruta de salida descargada. Si un batch expira con parte del trabajo
+    hecho, guarda también las salidas parciales y el archivo con las
+    peticiones que faltan (`input_file`), que es el que se reenvía. Se
+    reescribe de forma atómica tras cada cambio, de modo que un reinicio
+    continúa donde se quedó.
+    """
+
+    def __init__(self, path : str):
+        self.path = path
+        self.shards = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.shards = json.load(f)["shards"]
+
+    def get(self, shard_file : str) -> dict:
+        return self.shards.setdefault(shard_file, {
+            "file_id": None,
+            "batch_id": None,
+            "status": "pending",
+            "submissions": 0,
+            "output_file": None,
+            "error_file": None,
+            "input_file": None,
+            "partial_outputs": []
+        })
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"shards": self.shards}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+def load_shard_files(manifest_file : str = None, files : list = None) -> list:
+    """Rutas de los shards: las del manifiesto de `generate_file --shard` o una lista explícita."""
+    if manifest_file:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(manifest_file))
+        return [os.path.join(base_dir, shard["file"]) for shard in manifest["shards"]]
+    return list(files or [])
+
+
+class BatchOrchestrator:
+    """
+    Sube varios shards en paralelo, crea un batch por shard, consulta el
+    estado de todos desde un único bucle asíncrono con backoff adaptativo,
+    descarga cada salida en cuanto termina y reenvía los shards fallidos o
+    expirados (hasta `max_submissions` veces). De un batch expirado o
+    cancelado se descarga antes la salida parcial y solo se reenvían los
+    `custom_id` que faltan.
+    """
+
+    def __init__(
+            self,
+            client : AsyncOpenAI,
+            state : OrchestratorState,
+            output_dir : str,
+            batch_job_name : str = "Etiquetado de noticias",
+            max_submissions : int = 3,
+            min_poll_interval : float = 30.0,
+            max_poll_interval : float = 600.0,
+            upload_concurrency : int = 4
+    ):
+        self.client = client
+        self.state = state
+        self.output_dir = output_dir
+        self.batch_job_name = batch_job_name
+        self.max_submissions = max_submissions
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.upload_semaphore = asyncio.Semaphore(upload_concurrency)
+        self.state_lock = asyncio.Lock()
+
+    def _is_active(self, shard_file : str) -> bool:
+        status = self.state.get(shard_file)["status"]
+        return status != "downloaded" and not status.startswith("gave_up")
+
+    async def _save(self):
+        async with self.state_lock:
+            self.state.save()
+
+    async def submit(self, shard_file : str):
+        entry = self.state.get(shard_file)
+
+        async with self.upload_semaphore:
+            if entry["file_id"] is None:
+                with upload_source(entry.get("input_file") or shard_file) as file:
+                    uploaded = await self.client.files.create(file=file, purpose="batch")
+                entry["file_id"] = uploaded.id
+                await self._save()
+                print(f"📤 {os.path.basename(shard_file)} subido. ID: {uploaded.id}")
+
+        batch = await self.client.batches.create(
+            input_file_id=entry["file_id"],
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"description": f"{self.batch_job_name} ({os.path.basename(shard_file)})"}
+        )
+        entry["batch_id"] = batch.id
+        entry["status"] = batch.status
+        entry["submissions"] += 1
+        await self._save()
+        print(f"🚀 Batch creado para {os.path.basename(shard_file)}. Batch ID: {batch.id}")
+
+    async def download(self, file_id : str, path : str) -> str:
+        """Descarga en streaming con reanudación y SHA-256 (ver `download_output.PartialDownload`)."""
+        download = PartialDownload(path)
+        async with self.client.files.with_streaming_response.content(file_id, extra_headers=download.headers) as response:
+            with download.writer(response.status_code, file_id) as write:
+                async for chunk in response.iter_bytes(CHUNK_SIZE):
+                    write(chunk)
+        return download.finish()
+
+    async def keep_partial(self, shard_file : str, batch):
+        """
+        Descarga la salida parcial (`output_file_id`) de un batch que no se
+        completó y escribe en `output_dir` las líneas de la entrada cuyo
+        `custom_id` no está en ella, que pasan a ser lo que se reenvía.
+        Devuelve cuántas peticiones faltan, o None si no hay salida parcial
+        (se reenvía la misma entrada, sin volver a subirla).
+        """
+        if not batch.output_file_id:
+            return None
+        entry = self.state.get(shard_file)
+        base = split_ext(os.path.basename(shard_file))[0]
+
+        partial_path = os.path.join(self.output_dir, f"{base}.output.part{entry['submissions']}.jsonl")
+        await self.download(batch.output_file_id, partial_path)
+        partial_outputs = entry.setdefault("partial_outputs", [])
+        if partial_path not in partial_outputs:
+            partial_outputs.append(partial_path)
+
+        with open(partial_path, 'rb') as f:
+            done = {json.loads(line)["custom_id"] for line in f if line.strip()}
+
+        # Se escribe aparte y se renombra: si se repite tras un corte, la
+        # entrada puede ser este mismo archivo
+        remaining_path = os.path.join(self.output_dir, f"{base}.remaining{entry['submissions']}.jsonl")
+        remaining = 0
+        with open_binary(entry.get("input_file") or shard_file) as source, open(remaining_path + ".tmp", 'wb') as out:
+            for line in source:
+                if not line.strip() or json.loads(line)["custom_id"] in done:
+                    continue
+                out.write(line if line.endswith(b"\n") else line + b"\n")
+                remaining += 1
+        os.replace(remaining_path + ".tmp", remaining_path)
+
+        entry["input_file"] = remaining_path
+        entry["file_id"] = None
+        await self._save()
+        print(f"📥 {os.path.basename(shard_file)}: {len(done)} resultados parciales en '{partial_path}'; faltan {remaining} peticiones.")
+        return remaining
+
+    def _warn(self, shard_file : str, action : str, e : Exception):
+        """
+        Un fallo al subir, consultar o descargar un shard no detiene a los
+        demás: se avisa y el shard se reintenta en la siguiente consulta.
+        Los errores de la API no reintentables (credenciales, batch
+        inexistente...) sí se propagan, porque repetirlos no los arregla.
+        """
+        error_class, retryable = classify_error(e)
+        if isinstance(e, openai.APIStatusError) and not retryable:
+            raise e
+        print(f"⚠️  Error al {action} {os.path.basename(shard_file)} ({error_class}): {e}. Se reintentará en la próxima consulta.")
+
+    async def handle_terminal(self, shard_file : str, batch):
+        entry = self.state.get(shard_file)
+        base = split_ext(os.path.basename(shard_file))[0]
+
+        if batch.status in TERMINAL_OK:
+            output_path = os.path.join(self.output_dir, f"{base}.output.jsonl")
+            if batch.output_file_id:
+                await self.download(batch.output_file_id, output_path)
+                entry["output_file"] = output_path
+            if batch.error_file_id:
+                error_path = os.path.join(self.output_dir, f"{base}.errors.jsonl")
+                await self.download(batch.error_file_id, error_path)
+                entry["error_file"] = error_path
+            entry["status"] = "downloaded"
+            partials = entry.get("partial_outputs") or []
+            extra = f" (más {len(partials)} salidas parciales de envíos anteriores)" if partials else ""
+            print(f"✅ {os.path.basename(shard_file)} completado y descargado{extra}.")
+
+        else:
+            remaining = await self.keep_partial(shard_file, batch)
+            if remaining == 0:
+                entry["status"] = "downloaded"
+                print(f"✅ {os.path.basename(shard_file)} no tiene peticiones pendientes: la salida parcial está completa.")
+            elif entry["submissions"] < self.max_submissions:
+                pending = "la entrada completa" if remaining is None else f"{remaining} peticiones"
+                print(f"🔁 {os.path.basename(shard_file)} terminó en '{batch.status}'. Reenviando {pending}...")
+                entry["status"] = "resubmitting"
+                await self._save()
+                await self.submit(shard_file)
+                return
+            else:
+                entry["status"] = f"gave_up:{batch.status}"
+                print(f"❌ {os.path.basename(shard_file)} terminó en '{batch.status}' tras {entry['submissions']} envíos.")
+
+        await self._save()
+
+    async def run(self, shard_files : list):
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        interval = self.min_poll_interval
+        while True:
+            active = [f for f in shard_files if self._is_active(f)]
+            if not active:
+                break
+
+            # 1. Subidas y creación de batches en paralelo (solo lo que falte,
+            #    incluidos los envíos que fallaron en una vuelta anterior)
+            to_submit = [f for f in active if self.state.get(f)["batch_id"] is None]
+            results = await asyncio.gather(*(self.submit(f) for f in to_submit), return_exceptions=True)
+            for shard_file, result in zip(to_submit, results):
+                if isinstance(result, Exception):
+                    self._warn(shard_file, "enviar", result)
+
+            # 2. Consulta del estado de todos los batches creados
+            polled = [f for f in active if self.state.get(f)["batch_id"] is not None]
+            batches = await asyncio.gather(*(self.client.batches.retrieve(self.state.get(f)["batch_id"]) for f in polled), return_exceptions=True)
+
+            changed = False
+            finished = []
+            tasks = []
+            for shard_file, batch in zip(polled, batches):
+                if isinstance(batch, Exception):
+                    self._warn(shard_file, "consultar", batch)
+                    continue
+                entry = self.state.get(shard_file)
+                if batch.status != entry["status"]:
+                    changed = True
+                    entry["status"] = batch.status
+                if batch.status in TERMINAL_OK | TERMINAL_RETRY:
+                    finished.append(shard_file)
+                    tasks.append(self.handle_terminal(shard_file, batch))
+
+            # Las descargas y reenvíos de los batches terminados van en paralelo;
+            # si uno falla, el shard sigue activo y se repite en la próxima consulta
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for shard_file, result in zip(finished, results):
+                if isinstance(result, Exception):
+                    self._warn(shard_file, "descargar o reenviar", result)
+            await self._save()
+
+            pending = len([f for f in active if self._is_active(f)])
+            if not pending:
+                break
+
+            # Si algo cambió se vuelve a consultar pronto; si no, se espacian las consultas
+            interval = self.min_poll_interval if changed else min(interval * 2, self.max_poll_interval)
+            print(f"⏳ {pending} batches en curso. Próxima consulta en {interval:.0f}s.")
+            await asyncio.sleep(interval)
+
+        summary = {}
+        for f in shard_files:
+            status = self.state.get(f)["status"]
+            summary[status] = summary.get(status, 0) + 1
+        print(f"🏁 Orquestación terminada: {summary}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sube varios shards, crea sus Batch Jobs, monitoriza el estado y descarga los resultados."
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="Manifiesto `.manifest.json` generado por `generate_file --shard`."
+    )
+    parser.add_argument(
+        "--files",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Lista explícita de archivos `.jsonl` (alternativa a --manifest)."
+    )
+    parser.add_argument(
+        "-o", "--output_dir",
+        type=str,
+        required=True,
+        help="Directorio donde se descargan las salidas de cada shard."
+    )
+    parser.add_argument(
+        "--state_file",
+        type=str,
+        default=None,
+        help="Archivo de estado para reanudar (por defecto `<output_dir>/orchestrator_state.json`)."
+    )
+    parser.add_argument(
+        "--job_name",
+        type=str,
+        default="Etiquetado de noticias",
+        help="Descripción (metadata) para identificar los Batch Jobs."
+    )
+    parser.add_argument(
+        "--max_submissions",
+        type=int,
+        default=3,
+        help="Número máximo de envíos por shard (reenvíos incluidos)."
+    )
+    parser.add_argument(
+        "--min_poll_interval",
+        type=float,
+        default=30.0,
+        help="Intervalo mínimo entre consultas de estado (segundos)."
+    )
+    parser.add_argument(
+        "--max_poll_interval",
+        type=float,
+        default=600.0,
+        help="Intervalo máximo entre consultas de estado (segundos)."
+    )
+
+    args = parser.parse_args()
+
+    shard_files = load_shard_files(args.manifest, args.files)
+    if not shard_files:
+        raise ValueError("❌ Indica --manifest o --files.")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    state = OrchestratorState(args.state_file or os.path.join(args.output_dir, "orchestrator_state.json"))
+
+    orchestrator = BatchOrchestrator(
+        client=AsyncOpenAI(),
+        state=state,
+        output_dir=args.output_dir,
+        batch_job_name=args.job_name,
+        max_submissions=args.max_submissions,
+        min_poll_interval=args.min_poll_interval,
+        max_poll_interval=args.max_poll_interval
+    )
+
+    try:
+        asyncio.run(orchestrator.run(shard_files))
+    except KeyboardInterrupt:
+        print("\n🛑 Detenido por el usuario. Relanza el mismo comando para continuar.")
@@ -1,85 +1,14 @@
-import asyncio
-import json
 import argparse
 import os
-from openai import AsyncOpenAI
-from tqdm.asyncio import tqdm
-async def process_single_request(client: AsyncOpenAI, semaphore: asyncio.Semaphore, line_data: dict):
-    """
-    Procesa una única línea del archivo JSONL de entrada.
-    Extrae el 'body' preparado para Batch y lo envía directamente a la API.
-    """
-    async with semaphore:
-        custom_id = line_data.get("custom_id")
-        body = line_data.get("body", {})
-        
-        try:
-            model = body.get("model")
-            messages = body.get("messages")
-            response_format = body.get("response_format")
-            temperature = body.get("temperature", 1.0)
 
-            response = await client.chat.completions.create(
-                model=model,
-                messages=messages,
-                response_format=response_format,
-                temperature=temperature
-            )
-            
-            output_content = response.choices[0].message.content
-            
-            return {
-                "id": f"batch_req_{custom_id}",
-                "custom_id": custom_id,
-                "response": {
-                    "status_code": 200,
-                    "request_id": response.id,
-                    "body": {
-                        "choices": [
-                            {
-                                "message": {
-                                    "content": output_content,
-                                    "role": "assistant"
-                                }
-                            }
-                        ]
-                    }
-                },
-                "error": None
-            }
+try:
+    from .rate_limit import RateLimiter
+    from .runner import add_runner_arguments, build_client, run_from_args
+except ImportError:
+    from rate_limit import RateLimiter
+    from runner import add_runner_arguments, build_client, run_from_args
 
-        except Exception as e:
-            return {
-                "id": f"batch_req_{custom_id}",
-                "custom_id": custom_id,
-                "response": None,
-                "error": {
-                    "message": str(e),
-                    "code": "exception"
-                }
-            }
-
-async def process_file(input_file: str, output_file: str, client: AsyncOpenAI, concurrency: int):
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = [json.loads(line) for line in f if line.strip()]
-
-    print(f"🚀 Iniciando procesamiento asíncrono de {len(lines)} registros.")
-    print(f"⚡ Concurrencia máxima: {concurrency} peticiones simultáneas.")
-
-    semaphore = asyncio.Semaphore(concurrency)
-    tasks = []
-
-    for line in lines:
-        task = process_single_request(client, semaphore, line)
-        tasks.append(task)
-
-    results = await tqdm.gather(*tasks, desc="Procesando")
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for res in results:
-            f.write(json.dumps(res, ensure_ascii=False) + '\n')
-            
-    print(f"✅ Procesamiento completado. Resultados guardados en: {output_file}")
+# La lógica de ejecución vive en `runner.py`; este script es la variante mínima para la API de OpenAI.
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -90,7 +19,8 @@ if __name__ == "__main__":
     parser.add_argument("-o", "--output_file", type=str, required=True, help="Ruta para guardar los resultados.")
     parser.add_argument("--base_url", type=str, default=None, help="Base URL personalizada (opcional).")
     parser.add_argument("--api_key", type=str, default=None, help="API Key (opcional, por defecto usa env var).")
-    parser.add_argument("--concurrency", type=int, default=10, help="Número máximo de peticiones simultáneas (default: 10).")
+    parser.add_argument("--resume", action="store_true", help="Procesa en streaming y reanuda desde el diario `<output_file>.ckpt` si existe una ejecución previa.")
+    add_runner_arguments(parser)
 
     args = parser.parse_args()
 
@@ -100,17 +30,7 @@ if __name__ == "__main__":
     if not api_key:
         raise ValueError("No se encontró OPENAI_API_KEY. Configúrala en .env o pásala como argumento.")
 
-    client = AsyncOpenAI(
-        api_key=api_key,
-        base_url=args.base_url
-    )
+    client = build_client("openai", api_key, base_url=args.base_url)
+    rate_limiter = RateLimiter(rpm=args.rpm, tpm=args.tpm) if (args.rpm or args.tpm) else None
 
-    try:
-        asyncio.run(process_file(
-            input_file=args.input_file, 
-            output_file=args.output_file, 
-            client=client, 
-            concurrency=args.concurrency
-        ))
-    except KeyboardInterrupt:
-        print("\n🛑 Proceso interrumpido por el usuario.")
\ No newline at end of file
+    run_from_args(args, client, rate_limiter=rate_limiter)
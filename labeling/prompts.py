@@ -38,4 +38,36 @@ Marca `is_sensationalist: True` si detectas patrones claros de manipulación emo
 Si el artículo mantiene un tono neutro, descriptivo y los hechos presentados justifican el tono del titular, marca `is_sensationalist: False`.
 
 Analiza el texto completo y devuelve el JSON requerido.
-""".strip()
\ No newline at end of file
+""".strip()
+
+COMBINED_PROMPT = """
+Eres un experto analista de medios y desinformación. Tu tarea es analizar una noticia (Titular + Cuerpo) y realizar DOS clasificaciones independientes en una sola respuesta.
+
+INPUT:
+Recibirás el texto de la noticia con el formato:
+TITULAR: [Texto]
+CUERPO: [Texto]
+
+TAREA 1 - CLICKBAIT (evalúa SOLO el TITULAR):
+"Contenido que utiliza titulares sensacionalistas, exagerados o engañosos diseñados exclusivamente para despertar curiosidad y provocar un clic, priorizando visitas rápidas sobre la calidad."
+
+Marca `is_clickbait: True` si el titular presenta alguno de estos patrones:
+1. **Ocultación de información (Curiosity Gap):** El título plantea una pregunta o escenario pero obliga a entrar para saber el sujeto o el resultado (ej. "...y no creerás lo que pasó", "El motivo por el que...").
+2. **Sensacionalismo/Hipérbole:** Uso de adjetivos extremos que no parecen objetivos (ej. "Brutal", "Increíble", "Destrozó").
+3. **Apelación directa:** Uso de imperativos o segunda persona (ej. "Tienes que ver...", "Lo que estás haciendo mal").
+
+Si el titular es informativo, resume la noticia y permite entender el contexto sin necesidad de hacer clic obligatoriamente, marca `is_clickbait: False`. No uses el cuerpo para esta decisión.
+
+TAREA 2 - SENSACIONALISMO (evalúa el TITULAR y el CUERPO):
+"Estilo editorial que busca provocar una reacción emocional inmediata e intensa (miedo, sorpresa, indignación, morbo) en lugar de ofrecer información neutral. Prioriza el impacto sobre la precisión, usando exageración, dramatización o manipulación de hechos."
+
+Marca `is_sensationalist: True` si detectas patrones claros de manipulación emocional o falta de rigor, tales como:
+1. **Lenguaje Emotivo/Cargado:** Uso excesivo de adjetivos o adverbios que juzgan los hechos en lugar de describirlos (ej. "Horroroso", "Vergonzoso", "Milagroso").
+2. **Dramatización/Catastrofismo:** Presentar hechos menores como crisis existenciales o narrativas de "héroes y villanos" sin matices.
+3. **Discrepancia Título-Cuerpo:** El titular promete algo impactante que el cuerpo de la noticia no sustenta o desmiente (exageración no justificada).
+4. **Enfoque en el Morbo/Conflicto:** Se centra en detalles escabrosos, dolorosos o polémicos irrelevantes para la comprensión del hecho noticioso.
+
+Si el artículo mantiene un tono neutro, descriptivo y los hechos presentados justifican el tono del titular, marca `is_sensationalist: False`.
+
+Las dos decisiones son independientes: un titular puede ser clickbait en una noticia neutral y viceversa. Analiza el texto y devuelve el JSON requerido con ambos análisis.
+""".strip()
@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import openai
+import tiktoken
+
+try:
+    from .tokens import contar_tokens_request
+except ImportError:
+    from tokens import contar_tokens_request
+
+
+class TokenBucket:
+    """Cubo de tokens que se rellena de forma continua hasta `capacity` por minuto."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """
+    Planificador que presupuesta peticiones por minuto (RPM) y tokens por
+    minuto (TPM). El coste de cada petición se estima con el mismo conteo de
+    tiktoken que usa `count_tokens.py`, y los cubos se corrigen en vivo con las
+    cabeceras `x-ratelimit-*` que devuelve el proveedor.
+    """
+
+    def __init__(self, rpm: float = None, tpm: float = None, encoding_name: str = "o200k_base"):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.encoding = tiktoken.get_encoding(encoding_name) if tpm else None
+        self._lock = asyncio.Lock()
+
+    def estimate(self, body: dict) -> int:
+        """Tokens que consumirá la petición: entrada estimada + `max_tokens` si existe."""
+        if self.encoding is None:
+            return 0
+        return contar_tokens_request(body, self.encoding) + (body.get("max_tokens") or 0)
+
+    async def acquire(self, tokens: int = 0):
+        # El lock hace que las peticiones esperen en orden de llegada
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = 0.0
+                if self.requests:
+                    self.requests.refill(now)
+                    wait = max(wait, self.requests.wait_time(1))
+                if self.tokens:
+                    self.tokens.refill(now)
+                    wait = max(wait, self.tokens.wait_time(tokens))
+
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            if self.requests:
+                self.requests.level -= 1
+            if self.tokens:
+                self.tokens.level -= min(tokens, self.tokens.capacity)
+
+    def adjust(self, estimated: int, actual: int):
+        """Corrige el cubo de tokens con el consumo real (`usage.total_tokens`)."""
+        if self.tokens and actual:
+            self.tokens.level -= actual - estimated
+
+    def update_from_headers(self, headers):
+        """
+        Ajusta los cubos con `x-ratelimit-limit-*` y `x-ratelimit-remaining-*`.
+        El proveedor es la fuente de verdad: nunca se permite más de lo que
+        indica como restante.
+        """
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            if bucket is None:
+                continue
+            limit = _parse_header(headers, f"x-ratelimit-limit-{kind}")
+            remaining = _parse_header(headers, f"x-ratelimit-remaining-{kind}")
+
+            bucket.refill(now)
+            if limit is not None:
+                bucket.capacity = limit
+                bucket.level = min(bucket.level, limit)
+            if remaining is not None:
+                bucket.level = min(bucket.level, remaining)
+
+
+def _parse_header(headers, name: str):
+    value = headers.get(name) if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+async def create_with_rate_limit(client, rate_limiter: RateLimiter, body: dict, **kwargs):
+    """
+    Llama a `chat.completions.create` respetando el `rate_limiter`. Usa la
+    respuesta en crudo para leer las cabeceras de límite del proveedor, también
+    las de un 429, que indican el presupuesto real justo cuando se ha agotado.
+    """
+    if rate_limiter is None:
+        return await client.chat.completions.create(**kwargs)
+
+    estimated = rate_limiter.estimate(body)
+    await rate_limiter.acquire(estimated)
+
+    try:
+        raw = await client.chat.completions.with_raw_response.create(**kwargs)
+    except openai.RateLimitError as e:
+        rate_limiter.update_from_headers(e.response.headers)
+        raise
+    rate_limiter.update_from_headers(raw.headers)
+    response = raw.parse()
+
+    if getattr(response, "usage", None) is not None:
+        rate_limiter.adjust(estimated, response.usage.total_tokens)
+
+    return response
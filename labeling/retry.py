@@ -0,0 +1,168 @@
+import asyncio
+import email.utils
+import json
+import random
+import time
+from collections import Counter
+
+import openai
+
+try:
+    from .io_utils import open_text
+except ImportError:
+    from io_utils import open_text
+
+
+class RetryExhausted(Exception):
+    """Error transitorio que sigue fallando tras agotar los reintentos."""
+
+    def __init__(self, error_class: str, last_exception: Exception):
+        super().__init__(str(last_exception))
+        self.error_class = error_class
+        self.last_exception = last_exception
+
+
+def classify_error(e: Exception) -> tuple:
+    """Devuelve `(clase, reintentable)` para una excepción del cliente de OpenAI."""
+    if isinstance(e, openai.RateLimitError):
+        return "rate_limit", True
+    if isinstance(e, openai.APITimeoutError):
+        return "timeout", True
+    if isinstance(e, openai.APIConnectionError):
+        return "connection", True
+    if isinstance(e, openai.APIStatusError):
+        if e.status_code >= 500:
+            return "server_error", True
+        if e.status_code in (408, 409):
+            return f"http_{e.status_code}", True
+        return f"http_{e.status_code}", False
+    return type(e).__name__, False
+
+
+def retry_after_seconds(e: Exception):
+    """Lee `retry-after-ms` / `Retry-After` (segundos o fecha HTTP) de la respuesta."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Reintenta errores transitorios (429, 5xx, timeouts, conexión) con backoff
+    exponencial con jitter, respetando `Retry-After`. Los errores no
+    reintentables se propagan de inmediato. Con un `ClientPool`, los errores
+    que ya enfriaron su endpoint se reintentan al momento en otro.
+    """
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = Counter()
+        self.exhausted = Counter()
+        self.fatal = Counter()
+
+    def delay(self, attempt: int, e: Exception) -> float:
+        # `ClientPool` ya sacó de la rotación el endpoint que falló: se reintenta en otro sin esperar
+        if getattr(e, "endpoint_cooldown", False):
+            return 0.0
+        retry_after = retry_after_seconds(e)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # "Full jitter": evita que todas las peticiones reintenten a la vez
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def run(self, make_call):
+        """Ejecuta `make_call()` (que devuelve una corrutina) con reintentos."""
+        attempt = 0
+        while True:
+            try:
+                return await make_call()
+            except Exception as e:
+                error_class, retryable = classify_error(e)
+                if not retryable:
+                    self.fatal[error_class] += 1
+                    raise
+                if attempt >= self.max_retries:
+                    self.exhausted[error_class] += 1
+                    raise RetryExhausted(error_class, e) from e
+
+                self.retries[error_class] += 1
+                await asyncio.sleep(self.delay(attempt, e))
+                attempt += 1
+
+    def print_summary(self):
+        if not (self.retries or self.exhausted or self.fatal):
+            return
+        separator = "─" * 40
+        print("🔁 REINTENTOS POR CLASE DE ERROR")
+        print(separator)
+        print(f"{'CLASE':<15} | {'REINTENTOS':<10} | {'AGOTADOS':<8} | {'FATALES'}")
+        print(separator)
+        for error_class in sorted(set(self.retries) | set(self.exhausted) | set(self.fatal)):
+            print(f"{error_class:<15} | {self.retries[error_class]:<10} | {self.exhausted[error_class]:<8} | {self.fatal[error_class]}")
+        print(separator + "\n")
+
+
+# Códigos de error cuyas peticiones se desvían al archivo dead-letter
+DEAD_LETTER_CODES = ("retry_exhausted", "invalid_response")
+
+
+class DeadLetter:
+    """
+    Archivo JSONL con las líneas de entrada originales cuyos reintentos se
+    agotaron o cuya respuesta siguió sin validar tras reencolarla. Puede
+    volver a usarse directamente como `--input_file`.
+    Sin `dead_letter_file`, los resultados se escriben como errores normales.
+    Con `resume=True` se añade al archivo existente en lugar de truncarlo,
+    para no perder las peticiones fallidas de ejecuciones anteriores.
+    """
+
+    def __init__(self, dead_letter_file: str = None, resume: bool = False):
+        self.dead_letter_file = dead_letter_file
+        self.resume = resume
+        self.count = 0
+        self._f = None
+
+    def __enter__(self):
+        if self.dead_letter_file:
+            self._f = open_text(self.dead_letter_file, 'a' if self.resume else 'w')
+        return self
+
+    def __exit__(self, *exc):
+        if self._f:
+            self._f.close()
+            self._f = None
+
+    def handle(self, line_data: dict, result: dict) -> bool:
+        """Devuelve True si el resultado se ha desviado al archivo dead-letter."""
+        error = result.get("error")
+        if self._f is None or not error or error.get("code") not in DEAD_LETTER_CODES:
+            return False
+        self._f.write(json.dumps(line_data, ensure_ascii=False) + '\n')
+        self.count += 1
+        return True
+
+    def print_summary(self):
+        if self.count:
+            print(f"☠️  {self.count} peticiones agotaron los reintentos o no validaron. Guardadas en: {self.dead_letter_file}")
@@ -0,0 +1,431 @@
+import asyncio
+import json
+import time
+from openai import AsyncOpenAI, AsyncAzureOpenAI
+from pydantic import ValidationError
+from tqdm.asyncio import tqdm
+
+try:
+    from .cache import ResponseCache, request_key
+    from .checkpoint import Checkpoint
+    from .io_utils import iter_jsonl, open_text
+    from .rate_limit import RateLimiter, create_with_rate_limit
+    from .retry import DeadLetter, RetryExhausted, RetryPolicy
+    from .telemetry import Telemetry, error_status, usage_dict
+    from .validation import ResponseValidator
+    from .voting import VotingPolicy
+except ImportError:
+    from cache import ResponseCache, request_key
+    from checkpoint import Checkpoint
+    from io_utils import iter_jsonl, open_text
+    from rate_limit import RateLimiter, create_with_rate_limit
+    from retry import DeadLetter, RetryExhausted, RetryPolicy
+    from telemetry import Telemetry, error_status, usage_dict
+    from validation import ResponseValidator
+    from voting import VotingPolicy
+
+# Parámetros opcionales del body que se reenvían tal cual si están presentes
+FORWARDED_PARAMS = ("max_tokens", "prompt_cache_key")
+
+_DONE = object()
+
+
+def success_result(custom_id, request_id: str, output_content: str, usage: dict = None) -> dict:
+    """Registro de salida con el mismo formato que la Batch API."""
+    result = {
+        "id": f"batch_req_{custom_id}",
+        "custom_id": custom_id,
+        "response": {
+            "status_code": 200,
+            "request_id": request_id,
+            "body": {
+                "choices": [
+                    {
+                        "message": {
+                            "content": output_content,
+                            "role": "assistant"
+                        }
+                    }
+                ]
+            }
+        },
+        "error": None
+    }
+    if usage:
+        result["response"]["body"]["usage"] = usage
+    return result
+
+
+def error_result(custom_id, message: str, code: str, error_type: str = None) -> dict:
+    error = {"message": message, "code": code}
+    if error_type:
+        error["type"] = error_type
+    return {
+        "id": f"batch_req_{custom_id}",
+        "custom_id": custom_id,
+        "response": None,
+        "error": error
+    }
+
+
+def build_client(provider: str = "openai", api_key: str = None, azure_endpoint: str = None, api_version: str = "2024-02-15-preview", base_url: str = None):
+    """Cliente asíncrono de OpenAI o Azure OpenAI (sin reintentos propios: los gestiona `RetryPolicy`)."""
+    if provider == "azure":
+        return AsyncAzureOpenAI(
+            api_key=api_key,
+            api_version=api_version,
+            azure_endpoint=azure_endpoint,
+            max_retries=0
+        )
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=0
+    )
+
+
+async def _aiter(requests):
+    if hasattr(requests, "__aiter__"):
+        async for item in requests:
+            yield item
+    else:
+        for item in requests:
+            yield item
+
+
+class Runner:
+    """
+    Motor de ejecución asíncrono compartido por `process_async` y
+    `process_realtime`, utilizable también como librería:
+
+        runner = Runner(AsyncOpenAI(max_retries=0), concurrency=20, retry_policy=RetryPolicy())
+        async for line, result in runner.run(peticiones):
+            ...
+
+    `client` es cualquier objeto con `chat.completions.create` asíncrono
+    (`AsyncOpenAI`, `AsyncAzureOpenAI`, `ClientPool`...). Cada petición es una
+    línea en formato Batch API (`custom_id` + `body`) y cada resultado tiene
+    el mismo formato que la salida de la Batch API.
+    """
+
+    def __init__(self, client, concurrency: int = 10, override_model: str = None, rate_limiter: RateLimiter = None, retry_policy: RetryPolicy = None, cache: ResponseCache = None, telemetry: Telemetry = None, voting: VotingPolicy = None, validator: ResponseValidator = None):
+        self.client = client
+        self.concurrency = concurrency
+        self.override_model = override_model
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.cache = cache
+        self.telemetry = telemetry
+        self.voting = voting
+        self.validator = validator
+        # Schemas contra los que se comprueba una respuesta antes de guardarla en caché
+        self._schemas = validator or (ResponseValidator() if cache is not None else None)
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(self, line_data: dict) -> dict:
+        """
+        Procesa una línea. Si `override_model` está definido (común en Azure),
+        ignora el modelo del JSONL y usa el nombre del despliegue. Con
+        `voting`, la línea se resuelve por votación entre varias muestras y no
+        se usa la caché.
+        """
+        custom_id = line_data.get("custom_id")
+        body = line_data.get("body", {})
+
+        if self.voting is not None:
+            return await self.voting.run(custom_id, lambda: self._request(custom_id, body))
+
+        if self.cache is None:
+            return await self._request(custom_id, body)
+
+        # Los aciertos de caché se sirven sin esperar al semáforo, y las
+        # repeticiones de una petición en vuelo esperan a su respuesta
+        started = time.perf_counter()
+        cache_key = request_key(body, self.override_model or body.get("model"))
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            waiting = self.cache.claim(cache_key)
+            if waiting is None:
+                try:
+                    return await self._request(custom_id, body, cache_key)
+                finally:
+                    self.cache.release(cache_key)
+            cached = await asyncio.shield(waiting)
+            if cached is None:
+                # La petición en vuelo no dejó respuesta válida: se pide de nuevo
+                self.cache.misses += 1
+                return await self._request(custom_id, body, cache_key)
+            self.cache.coalesced += 1
+
+        if self.telemetry:
+            self.telemetry.record(custom_id, time.perf_counter() - started, "cache")
+        return success_result(custom_id, cached["request_id"], cached["content"])
+
+    async def _request(self, custom_id, body: dict, cache_key: str = None) -> dict:
+        """
+        Una llamada a la API (con reintentos) bajo el semáforo de concurrencia.
+        Con `validator`, la respuesta se valida (y repara) al llegar y, si no es
+        válida, se vuelve a pedir hasta `validator.max_requeues` veces.
+        """
+        telemetry = self.telemetry
+        adapter = self.validator.adapter(body) if self.validator else None
+
+        async with self.semaphore:
+            attempts = 0
+            started = time.perf_counter()
+            try:
+                model = self.override_model or body.get("model")
+                messages = body.get("messages")
+                response_format = body.get("response_format")
+                temperature = body.get("temperature", 1.0)
+                extra_params = {key: body[key] for key in FORWARDED_PARAMS if key in body}
+
+                def make_call():
+                    nonlocal attempts
+                    attempts += 1
+                    return create_with_rate_limit(
+                        self.client, self.rate_limiter, body,
+                        model=model,
+                        messages=messages,
+                        response_format=response_format,
+                        temperature=temperature,
+                        **extra_params
+                    )
+
+                requeues = 0
+                while True:
+                    if self.retry_policy:
+                        response = await self.retry_policy.run(make_call)
+                    else:
+                        response = await make_call()
+
+                    output_content = response.choices[0].message.content
+                    usage = usage_dict(response)
+                    if telemetry:
+                        telemetry.record(custom_id, time.perf_counter() - started, 200, usage, attempts - 1, response.choices[0].finish_reason)
+
+                    if adapter is None:
+                        break
+                    output_content, invalid = self.validator.check(adapter, output_content)
+                    if invalid is None:
+                        break
+                    if requeues >= self.validator.max_requeues:
+                        self.validator.failed += 1
+                        return error_result(custom_id, invalid, "invalid_response")
+                    requeues += 1
+                    self.validator.requeued += 1
+                    attempts = 0
+                    started = time.perf_counter()
+
+                if cache_key is not None and self._cacheable(body, adapter, output_content):
+                    self.cache.put(cache_key, output_content, response.id)
+
+                return success_result(custom_id, response.id, output_content, usage)
+
+            except RetryExhausted as e:
+                if telemetry:
+                    telemetry.record(custom_id, time.perf_counter() - started, error_status(e) or e.error_class, retries=attempts - 1)
+                return error_result(custom_id, str(e), "retry_exhausted", e.error_class)
+
+            except Exception as e:
+                if telemetry:
+                    telemetry.record(custom_id, time.perf_counter() - started, error_status(e) or type(e).__name__, retries=max(attempts - 1, 0))
+                return error_result(custom_id, str(e), "exception")
+
+    def _cacheable(self, body: dict, adapter, content: str) -> bool:
+        """
+        Solo se guardan en caché respuestas que validan contra el schema de su
+        tarea: con `adapter` ya se validaron (y repararon) al llegar; sin
+        `validator` se comprueban aquí sin modificarlas. Las de un schema
+        desconocido se guardan tal cual, igual que las deja pasar `validator`.
+        """
+        if content is None:
+            return False
+        if adapter is not None:
+            return True
+        adapter = self._schemas.adapter(body)
+        if adapter is None:
+            return True
+        try:
+            adapter.validate_json(content)
+            return True
+        except ValidationError:
+            return False
+
+    async def run(self, requests, buffer_size: int = None):
+        """
+        Procesa un iterable (síncrono o asíncrono) de líneas y genera
+        `(línea, resultado)` según van terminando. Solo hay `concurrency`
+        peticiones en vuelo más `buffer_size` en cola, de modo que la memoria
+        no depende del tamaño de la entrada. Si el consumidor deja de iterar,
+        las peticiones pendientes se cancelan.
+        """
+        buffer_size = buffer_size or self.concurrency * 2
+        inbox = asyncio.Queue(maxsize=buffer_size)
+        outbox = asyncio.Queue(maxsize=buffer_size)
+
+        async def producer():
+            async for line in _aiter(requests):
+                await inbox.put(line)
+            for _ in range(self.concurrency):
+                await inbox.put(None)
+
+        async def worker():
+            while True:
+                line = await inbox.get()
+                if line is None:
+                    return
+                await outbox.put((line, await self.process(line)))
+
+        async def supervisor():
+            try:
+                await asyncio.gather(producer(), *(worker() for _ in range(self.concurrency)))
+                await outbox.put(_DONE)
+            except Exception as e:
+                await outbox.put(e)
+
+        task = asyncio.create_task(supervisor())
+        try:
+            while True:
+                item = await outbox.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+def print_summaries(output_file: str, dead_letter: DeadLetter, telemetry: Telemetry, retry_policy: RetryPolicy = None, cache: ResponseCache = None, voting: VotingPolicy = None, validator: ResponseValidator = None):
+    print(f"✅ Completado. Guardado en: {output_file}")
+    dead_letter.print_summary()
+    telemetry.print_summary()
+    if retry_policy:
+        retry_policy.print_summary()
+    if cache:
+        cache.print_summary()
+    if voting:
+        voting.print_summary()
+    if validator:
+        validator.print_summary()
+
+
+async def process_file(input_file: str, output_file: str, client, concurrency: int, override_model: str = None, rate_limiter: RateLimiter = None, retry_policy: RetryPolicy = None, dead_letter_file: str = None, cache: ResponseCache = None, metrics_file: str = None, prometheus_file: str = None, voting: VotingPolicy = None, validator: ResponseValidator = None):
+    """Procesa el archivo completo en memoria y escribe los resultados en el orden de entrada."""
+    lines = list(iter_jsonl(input_file))
+
+    print(f"🚀 Iniciando procesamiento ({type(client).__name__})")
+    print(f"📄 Registros: {len(lines)} | ⚡ Concurrencia: {concurrency}")
+    if override_model:
+        print(f"⚠️  Forzando modelo/deployment: '{override_model}'")
+    if voting:
+        print(f"🗳️  Votación: hasta {voting.max_samples} muestras, parada con {voting.min_agree} coincidentes")
+
+    telemetry = Telemetry(metrics_file, prometheus_file)
+    runner = Runner(client, concurrency, override_model, rate_limiter, retry_policy, cache, telemetry, voting, validator)
+
+    with telemetry:
+        results = await tqdm.gather(*(runner.process(line) for line in lines), desc="Procesando")
+
+    dead_letter = DeadLetter(dead_letter_file)
+
+    with open_text(output_file, 'w') as f, dead_letter:
+        for line, res in zip(lines, results):
+            if dead_letter.handle(line, res):
+                continue
+            f.write(json.dumps(res, ensure_ascii=False) + '\n')
+
+    print_summaries(output_file, dead_letter, telemetry, retry_policy, cache, voting, validator)
+
+
+async def process_file_stream(input_file: str, output_file: str, client, concurrency: int, override_model: str = None, buffer_size: int = None, resume: bool = False, rate_limiter: RateLimiter = None, retry_policy: RetryPolicy = None, dead_letter_file: str = None, cache: ResponseCache = None, metrics_file: str = None, prometheus_file: str = None, voting: VotingPolicy = None, validator: ResponseValidator = None):
+    """
+    Variante en streaming de `process_file` sobre `Runner.run`: la entrada se
+    lee de forma perezosa y cada resultado se escribe en disco en cuanto
+    termina (orden de llegada). La memoria se mantiene constante con
+    independencia del tamaño del archivo.
+
+    Cada resultado queda registrado en un diario (`<output_file>.ckpt`); con
+    `resume=True` se saltan los `custom_id` ya completados y los nuevos
+    resultados se añaden al mismo archivo de salida.
+    """
+    buffer_size = buffer_size or concurrency * 2
+    checkpoint = Checkpoint(output_file)
+    done = checkpoint.load() if resume else set()
+
+    print(f"🚀 Iniciando procesamiento en streaming ({type(client).__name__})")
+    print(f"⚡ Concurrencia: {concurrency} | 📦 Buffer: {buffer_size}")
+    if done:
+        print(f"♻️  Reanudando: {len(done)} registros ya completados")
+    if override_model:
+        print(f"⚠️  Forzando modelo/deployment: '{override_model}'")
+    if voting:
+        print(f"🗳️  Votación: hasta {voting.max_samples} muestras, parada con {voting.min_agree} coincidentes")
+
+    dead_letter = DeadLetter(dead_letter_file, resume=resume)
+    telemetry = Telemetry(metrics_file, prometheus_file)
+    runner = Runner(client, concurrency, override_model, rate_limiter, retry_policy, cache, telemetry, voting, validator)
+    pending = (line for line in iter_jsonl(input_file) if str(line.get("custom_id")) not in done)
+
+    with checkpoint.open(resume=resume), dead_letter, telemetry:
+        with tqdm(desc="Procesando", unit="req") as progress:
+            async for line, res in runner.run(pending, buffer_size):
+                if not dead_letter.handle(line, res):
+                    checkpoint.write(res)
+                    progress.update(1)
+
+    print_summaries(output_file, dead_letter, telemetry, retry_policy, cache, voting, validator)
+
+
+def add_runner_arguments(parser):
+    """Opciones comunes de ejecución (concurrencia, límites, reintentos, caché y métricas)."""
+    parser.add_argument("--concurrency", type=int, default=10, help="Peticiones simultáneas")
+    parser.add_argument("--rpm", type=float, default=None, help="Límite de peticiones por minuto (se ajusta con las cabeceras x-ratelimit-*).")
+    parser.add_argument("--tpm", type=float, default=None, help="Límite de tokens por minuto (coste estimado con tiktoken, se ajusta con las cabeceras x-ratelimit-*).")
+    parser.add_argument("--max_retries", type=int, default=5, help="Reintentos (backoff exponencial con jitter) para errores transitorios: 429, 5xx, timeouts.")
+    parser.add_argument("--dead_letter_file", type=str, default=None, help="JSONL donde guardar las peticiones que agotan los reintentos (reutilizable como entrada).")
+    parser.add_argument("--cache_file", type=str, default=None, help="Base de datos SQLite de caché de respuestas (model + prompt + schema + texto).")
+    parser.add_argument("--cache_max_entries", type=int, default=None, help="Máximo de entradas en caché (se expulsan las menos usadas).")
+    parser.add_argument("--cache_max_age_days", type=float, default=None, help="Antigüedad máxima (días) de las entradas en caché.")
+    parser.add_argument("--metrics_file", type=str, default=None, help="JSONL con las métricas de cada petición (latencia, tokens, estado, reintentos).")
+    parser.add_argument("--prometheus_file", type=str, default=None, help="Archivo de texto con el resumen en formato Prometheus.")
+    parser.add_argument("--votes", type=int, default=None, help="Votación por autoconsistencia: máximo de muestras por noticia (desactivada por defecto; no usa la caché).")
+    parser.add_argument("--validate", action="store_true", help="Valida (y repara) las respuestas contra el modelo Pydantic de la tarea y vuelve a pedir las inválidas.")
+    parser.add_argument("--max_requeues", type=int, default=1, help="Con --validate, veces que se vuelve a pedir una respuesta que no valida ni se puede reparar.")
+    parser.add_argument("--min_agree", type=int, default=3, help="Con --votes, muestras iniciales que, si coinciden, deciden la noticia sin pedir más.")
+
+
+def run_from_args(args, client, override_model: str = None, stream: bool = False, rate_limiter: RateLimiter = None):
+    """Ejecuta `process_file` o `process_file_stream` con las opciones de `add_runner_arguments`."""
+    retry_policy = RetryPolicy(max_retries=args.max_retries)
+    cache = ResponseCache(args.cache_file, args.cache_max_entries, args.cache_max_age_days) if args.cache_file else None
+    validator = ResponseValidator(max_requeues=args.max_requeues) if args.validate else None
+    voting = VotingPolicy(max_samples=args.votes, min_agree=min(args.min_agree, args.votes)) if args.votes else None
+    options = dict(
+        input_file=args.input_file,
+        output_file=args.output_file,
+        client=client,
+        concurrency=args.concurrency,
+        override_model=override_model,
+        rate_limiter=rate_limiter,
+        retry_policy=retry_policy,
+        dead_letter_file=args.dead_letter_file,
+        cache=cache,
+        metrics_file=args.metrics_file,
+        prometheus_file=args.prometheus_file,
+        voting=voting,
+        validator=validator
+    )
+
+    try:
+        if stream or args.resume:
+            asyncio.run(process_file_stream(resume=args.resume, **options))
+        else:
+            asyncio.run(process_file(**options))
+    except KeyboardInterrupt:
+        print("\n🛑 Detenido por el usuario.")
+    finally:
+        if cache:
+            cache.close()
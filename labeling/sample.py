@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import tiktoken
+from numpy.lib.format import open_memmap
+
+try:
+    from .generate_file import TASKS, RequestWriter, ShardedOutput, build_envelope, prefix_cache_key, response_format
+    from .local_model import LocalClassifier, hashed_ngrams
+    from .merge_results import LabelTable, parse_result
+    from .io_utils import open_binary
+except ImportError:
+    from generate_file import TASKS, RequestWriter, ShardedOutput, build_envelope, prefix_cache_key, response_format
+    from local_model import LocalClassifier, hashed_ngrams
+    from merge_results import LabelTable, parse_result
+    from io_utils import open_binary
+
+SEED = 42
+
+
+def embed_texts(texts: list, dim: int = 128, max_tokens: int = 256) -> np.ndarray:
+    """
+    Embedding local y barato: los n-gramas hasheados de `hashed_ngrams` se
+    proyectan a `dim` dimensiones con signo (hashing trick) y se normalizan,
+    de modo que el producto escalar es una similitud coseno aproximada.
+    """
+    docs, features, n = hashed_ngrams(texts, 2 * dim, max_tokens)
+    signs = np.where(features >= dim, -1.0, 1.0)
+    embeddings = np.bincount(docs * dim + features % dim, weights=signs, minlength=n * dim).reshape(n, dim).astype(np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-9)
+
+
+def assign(embeddings: np.ndarray, centroids: np.ndarray, batch_size: int = 65_536) -> tuple:
+    """Centroide más cercano (máximo coseno) de cada fila, por lotes: `(cluster, similitud)`."""
+    n = len(embeddings)
+    clusters = np.empty(n, dtype=np.int64)
+    similarity = np.empty(n, dtype=np.float32)
+    for start in range(0, n, batch_size):
+        scores = np.asarray(embeddings[start:start + batch_size]) @ centroids.T
+        clusters[start:start + len(scores)] = scores.argmax(axis=1)
+        similarity[start:start + len(scores)] = scores.max(axis=1)
+    return clusters, similarity
+
+
+def kmeans(embeddings: np.ndarray, k: int, iterations: int = 20, sample_size: int = 100_000, seed: int = SEED) -> np.ndarray:
+    """
+    K-means esférico sobre una muestra de como mucho `sample_size` filas.
+    Los centroides hacen de cuantizador grueso: asignar una fila es buscar su
+    vecino aproximado entre `k` centroides, nunca entre todas las filas.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(embeddings)
+    sample = np.asarray(embeddings[np.sort(rng.choice(n, size=min(n, sample_size), replace=False))])
+    k = min(k, len(sample))
+    centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+
+    for _ in range(iterations):
+        clusters, _ = assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, clusters, sample)
+        counts = np.bincount(clusters, minlength=k)
+        # Los centroides vacíos se reinician en puntos al azar de la muestra
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-9)
+    return centroids.astype(np.float32)
+
+
+def binary_entropy(p: np.ndarray) -> np.ndarray:
+    p = np.clip(p, 1e-9, 1 - 1e-9)
+    return -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+
+
+def priority_order(clusters: np.ndarray, row_score: np.ndarray, cluster_priority: np.ndarray) -> np.ndarray:
+    """
+    Orden de etiquetado: primero la mejor fila de cada cluster, luego la
+    segunda de cada uno, etc. (diversidad), y dentro de cada ronda los
+    clusters más prioritarios primero. Todo con ordenaciones de NumPy.
+    """
+    by_cluster = np.lexsort((-row_score, clusters))
+    sorted_clusters = clusters[by_cluster]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_clusters[1:] != sorted_clusters[:-1])))
+    rank = np.arange(len(by_cluster)) - np.repeat(starts, np.diff(np.append(starts, len(by_cluster))))
+
+    order = np.lexsort((-row_score[by_cluster], -cluster_priority[sorted_clusters], rank))
+    return by_cluster[order]
+
+
+def load_labels(results_files: list, ids: list, task: str) -> tuple:
+    """
+    Etiquetas existentes alineadas con `ids`: `(etiquetada, etiquetas)`, con
+    una columna 0/1 por cada campo booleano de la tarea (NaN si no hay).
+    """
+    model = TASKS[task][1]
+    fields = [name for name, info in model.model_fields.items() if info.annotation is bool]
+    labels = LabelTable(model)
+    for results_file in results_files:
+        with open_binary(results_file) as f:
+            for line in f:
+                if line.strip():
+                    labels.add(*parse_result(line))
+    table = labels.table()
+
+    positions = [labels.index.get(custom_id) for custom_id in ids]
+    labeled = np.fromiter((p is not None and p[1] for p in positions), dtype=bool, count=len(ids))
+    take = pa.array([p[0] if p is not None and p[1] else None for p in positions], type=pa.int64())
+    matched = table.take(take)
+    values = np.stack([
+        np.asarray(matched.column(name).cast(pa.float64()).fill_null(np.nan).to_numpy(zero_copy_only=False))
+        for name in fields
+    ], axis=1)
+    return labeled, values
+
+
+def select_sample(
+        input_file : str,
+        text_column : str = "texto",
+        n_clusters : int = 1024,
+        dim : int = 128,
+        results_files : list = None,
+        task : str = "clickbait",
+        local_model : str = None,
+        index_dir : str = "sample_index",
+        encoding_name : str = "o200k_base",
+        batch_size : int = 65_536
+) -> tuple:
+    """
+    Devuelve `(orden, tokens)`: las posiciones de las filas sin etiquetar en
+    orden de prioridad y los tokens del texto de cada fila. Los embeddings se
+    guardan en `index_dir/embeddings.npy` (memmap en disco) para acotar la
+    memoria.
+
+    La incertidumbre de cada fila sale del clasificador local si se indica
+    (`distill.py`); si no, de la entropía de las etiquetas existentes en su
+    cluster (los clusters sin ninguna etiqueta cuentan como máxima
+    incertidumbre). Los clusters ya muy etiquetados pierden prioridad.
+    """
+    # Sin `pre_buffer`, pyarrow no retiene los column chunks ya leídos
+    parquet = pq.ParquetFile(input_file, pre_buffer=False)
+    n = parquet.metadata.num_rows
+    os.makedirs(index_dir, exist_ok=True)
+    embeddings = open_memmap(os.path.join(index_dir, "embeddings.npy"), mode="w+", dtype=np.float32, shape=(n, dim))
+    classifier = LocalClassifier.load(local_model, task=task) if local_model else None
+    model_uncertainty = np.zeros(n, dtype=np.float32)
+    encoding = tiktoken.get_encoding(encoding_name)
+    lengths = np.empty(n, dtype=np.int64)
+
+    ids = []
+    start = 0
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=["id", text_column]):
+        texts = batch.column(text_column).to_pylist()
+        embeddings[start:start + len(texts)] = embed_texts(texts, dim)
+        lengths[start:start + len(texts)] = [len(t) for t in encoding.encode_ordinary_batch([t or "" for t in texts])]
+        if classifier is not None:
+            model_uncertainty[start:start + len(texts)] = 1.0 - 2.0 * (classifier.confidence(classifier.predict_proba(texts)) - 0.5)
+        ids.extend(pc.cast(batch.column("id"), pa.string()).to_pylist())
+        start += len(texts)
+    embeddings.flush()
+
+    centroids = kmeans(embeddings, n_clusters)
+    clusters, similarity = assign(embeddings, centroids, batch_size)
+    k = len(centroids)
+
+    labeled = np.zeros(n, dtype=bool)
+    cluster_entropy = np.ones(k)
+    if results_files:
+        labeled, values = load_labels(results_files, ids, task)
+    labeled_per_cluster = np.bincount(clusters[labeled], minlength=k)
+    if labeled.any():
+        # Entropía de la proporción de positivos del cluster (la del campo más incierto)
+        positives = [np.bincount(clusters[labeled], weights=column, minlength=k) for column in values[labeled].T]
+        rates = [np.divide(p, labeled_per_cluster, out=np.full(k, 0.5), where=labeled_per_cluster > 0) for p in positives]
+        cluster_entropy = np.max([binary_entropy(rate) for rate in rates], axis=0)
+
+    if classifier is not None:
+        row_score = model_uncertainty
+        cluster_uncertainty = np.bincount(clusters, weights=model_uncertainty, minlength=k) / np.maximum(np.bincount(clusters, minlength=k), 1)
+    else:
+        # Sin modelo, dentro de cada cluster van primero las filas más representativas
+        row_score = similarity
+        cluster_uncertainty = cluster_entropy
+    cluster_priority = cluster_uncertainty / np.sqrt(1.0 + labeled_per_cluster)
+
+    candidates = np.flatnonzero(~labeled)
+    order = candidates[priority_order(clusters[candidates], row_score[candidates], cluster_priority)]
+    print(f"🧭 {n} filas → {k} clusters. {int(labeled.sum())} ya etiquetadas, {len(candidates)} candidatas.")
+    return order, lengths
+
+
+def read_rows(input_file: str, positions: np.ndarray, text_column: str = "texto", batch_size: int = 65_536) -> tuple:
+    """`(ids, textos)` de las filas en `positions`, en ese orden, leyendo el Parquet por lotes."""
+    wanted = np.zeros(pq.ParquetFile(input_file).metadata.num_rows, dtype=bool)
+    wanted[positions] = True
+    found_ids, found_texts, found_positions = [], [], []
+
+    start = 0
+    for batch in pq.ParquetFile(input_file, pre_buffer=False).iter_batches(batch_size=batch_size, columns=["id", text_column]):
+        local = np.flatnonzero(wanted[start:start + batch.num_rows])
+        if len(local):
+            rows = batch.take(pa.array(local))
+            found_ids.extend(rows.column("id").to_pylist())
+            found_texts.extend(rows.column(text_column).to_pylist())
+            found_positions.append(local + start)
+        start += batch.num_rows
+
+    # Del orden del archivo al orden de prioridad
+    found_positions = np.concatenate(found_positions) if found_positions else np.zeros(0, dtype=np.int64)
+    where = np.searchsorted(found_positions, positions)
+    return [found_ids[i] for i in where], [found_texts[i] for i in where]
+
+
+def write_sample(
+        filename : str,
+        model : str,
+        task : str,
+        input_file : str,
+        order : np.ndarray,
+        lengths : np.ndarray,
+        text_column : str = "texto",
+        token_budget : int = None,
+        max_rows : int = None,
+        prompt_cache_key : bool = False,
+        encoding_name : str = "o200k_base"
+) -> dict:
+    """
+    Escribe el JSONL de las filas de `order` (en ese orden) hasta agotar
+    `token_budget` tokens de entrada (texto + prompt y schema de cada
+    petición) o `max_rows` filas.
+    """
+    prompt, schema_model, nombre_schema = TASKS[task]
+    json_schema = schema_model.model_json_schema()
+    encoding = tiktoken.get_encoding(encoding_name)
+    constant = len(encoding.encode_ordinary(prompt)) + len(encoding.encode_ordinary(json.dumps(response_format(json_schema, nombre_schema))))
+
+    order = order[:max_rows] if max_rows else order
+    costs = np.cumsum(constant + lengths[order])
+    if token_budget is not None:
+        order = order[:int(np.searchsorted(costs, token_budget, side="right"))]
+    tokens = int(costs[len(order) - 1]) if len(order) else 0
+
+    ids, texts = read_rows(input_file, order, text_column)
+    envelope = build_envelope(model, prompt, json_schema, nombre_schema, prefix_cache_key(prompt, json_schema, nombre_schema) if prompt_cache_key else None)
+    with ShardedOutput(filename) as output:
+        RequestWriter(output, envelope).write_columns(ids, texts)
+
+    print(f"✅ {len(ids)} peticiones (~{tokens} tokens de entrada) escritas en '{filename}' por orden de prioridad.")
+    return {"requests": len(ids), "input_tokens": tokens}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Selecciona el subconjunto más informativo (diverso e incierto) bajo un presupuesto de tokens y genera su JSONL."
+    )
+    parser.add_argument("-i", "--input_file", type=str, required=True, help="Ruta al archivo `.parquet` de origen.")
+    parser.add_argument("-o", "--output_file", type=str, required=True, help="Ruta del `.jsonl` generado (en orden de prioridad).")
+    parser.add_argument("-m", "--model", type=str, default="gpt-5-mini", help="Modelo de OpenAI a utilizar (ej. `gpt-5-mini`).")
+    parser.add_argument("-t", "--type", type=str, required=True, choices=list(TASKS), help="Tipo de análisis: 'clickbait', 'sensacionalism' o 'both'.")
+    parser.add_argument("--text_column", type=str, default="texto", help="Nombre de la columna en el Parquet que contiene el texto.")
+    parser.add_argument("--token_budget", type=int, default=None, help="Tokens de entrada máximos del subconjunto.")
+    parser.add_argument("--max_rows", type=int, default=None, help="Número máximo de peticiones.")
+    parser.add_argument("--results_files", type=str, nargs="*", default=None, help="Resultados ya obtenidos: esas filas se excluyen y sus etiquetas guían la incertidumbre.")
+    parser.add_argument("--local_model", type=str, default=None, help="Clasificador local (`distill.py`) para estimar la incertidumbre de cada fila.")
+    parser.add_argument("--n_clusters", type=int, default=1024, help="Número de clusters (diversidad).")
+    parser.add_argument("--dim", type=int, default=128, help="Dimensiones del embedding hasheado.")
+    parser.add_argument("--index_dir", type=str, default="sample_index", help="Directorio donde se guardan los embeddings.")
+    parser.add_argument("--prompt_cache_key", action="store_true", help="Añade a cada petición un `prompt_cache_key` derivado del prompt y el schema.")
+
+    args = parser.parse_args()
+
+    if args.token_budget is None and args.max_rows is None:
+        raise ValueError("❌ Indica --token_budget y/o --max_rows.")
+
+    order, lengths = select_sample(
+        input_file=args.input_file,
+        text_column=args.text_column,
+        n_clusters=args.n_clusters,
+        dim=args.dim,
+        results_files=args.results_files,
+        task=args.type,
+        local_model=args.local_model,
+        index_dir=args.index_dir
+    )
+    write_sample(
+        filename=args.output_file,
+        model=args.model,
+        task=args.type,
+        input_file=args.input_file,
+        order=order,
+        lengths=lengths,
+        text_column=args.text_column,
+        token_budget=args.token_budget,
+        max_rows=args.max_rows,
+        prompt_cache_key=args.prompt_cache_key
+    )
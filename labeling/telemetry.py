@@ -0,0 +1,179 @@
+import json
+import math
+import os
+import time
+from array import array
+from collections import Counter
+
+
+def usage_dict(response) -> dict:
+    """`usage` de una respuesta de la API como dict (o None si no viene)."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    return usage.model_dump(exclude_none=True) if hasattr(usage, "model_dump") else dict(usage)
+
+
+def cached_tokens(usage: dict) -> int:
+    """Tokens de entrada servidos desde la caché de prefijos del proveedor."""
+    return ((usage or {}).get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+
+def error_status(e: Exception):
+    """Código HTTP de un error del cliente (o del último intento de un `RetryExhausted`)."""
+    e = getattr(e, "last_exception", e)
+    return getattr(e, "status_code", None)
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Percentil `q` (0-100) por el método del rango más cercano."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Telemetry:
+    """
+    Métricas por petición de una ejecución: latencia (tiempo hasta la
+    respuesta, reintentos incluidos), tokens de entrada/salida/cacheados,
+    estado HTTP, número de reintentos y `finish_reason`.
+
+    En el camino caliente solo se añaden valores a arrays y contadores (y,
+    con `metrics_file`, una línea JSON a un archivo con buffer). Los
+    percentiles se calculan una vez al final.
+    """
+
+    def __init__(self, metrics_file: str = None, prometheus_file: str = None):
+        self.metrics_file = metrics_file
+        self.prometheus_file = prometheus_file
+        self.latencies = array('d')
+        self.statuses = Counter()
+        self.finish_reasons = Counter()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.started_at = None
+        self.finished_at = None
+        self._f = None
+
+    def __enter__(self):
+        self.started_at = time.time()
+        if self.metrics_file:
+            self._f = open(self.metrics_file, 'w', encoding='utf-8', buffering=1 << 16)
+        return self
+
+    def __exit__(self, *exc):
+        self.finished_at = time.time()
+        if self._f:
+            self._f.close()
+            self._f = None
+        if self.prometheus_file:
+            self.write_prometheus()
+
+    def record(self, custom_id, latency: float, status, usage: dict = None, retries: int = 0, finish_reason: str = None):
+        """`status` es el código HTTP, o `"cache"` para los aciertos de la caché local."""
+        self.requests += 1
+        self.statuses[status] += 1
+        self.retries += retries
+        if finish_reason:
+            self.finish_reasons[finish_reason] += 1
+        if status != 200 and status != "cache":
+            self.errors += 1
+        if status != "cache":
+            self.latencies.append(latency)
+
+        prompt = completion = cached = 0
+        if usage:
+            prompt = usage.get("prompt_tokens") or 0
+            completion = usage.get("completion_tokens") or 0
+            cached = cached_tokens(usage)
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            self.cached_tokens += cached
+
+        if self._f:
+            self._f.write(json.dumps({
+                "custom_id": custom_id,
+                "ts": time.time(),
+                "latency": round(latency, 4),
+                "status": status,
+                "retries": retries,
+                "finish_reason": finish_reason,
+                "prompt_tokens": prompt,
+                "completion_tokens": completion,
+                "cached_tokens": cached
+            }) + '\n')
+
+    def summary(self) -> dict:
+        elapsed = max((self.finished_at or time.time()) - (self.started_at or time.time()), 1e-9)
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "retries": self.retries,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "requests_per_sec": self.requests / elapsed,
+            "tokens_per_sec": (self.prompt_tokens + self.completion_tokens) / elapsed,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "elapsed": elapsed
+        }
+
+    def print_summary(self):
+        if not self.requests:
+            return
+        s = self.summary()
+        separator = "─" * 40
+        print("📈 TELEMETRÍA")
+        print(separator)
+        print(f"{'Peticiones':<20} : {s['requests']} ({s['errors']} errores, {s['error_rate']:.1%}; {s['retries']} reintentos)")
+        print(f"{'Latencia p50/95/99':<20} : {s['latency_p50']:.2f}s / {s['latency_p95']:.2f}s / {s['latency_p99']:.2f}s")
+        print(f"{'Throughput':<20} : {s['requests_per_sec']:.1f} req/s | {s['tokens_per_sec']:.0f} tokens/s")
+        if s["prompt_tokens"]:
+            rate = s["cached_tokens"] / s["prompt_tokens"]
+            print(f"{'Tokens entrada':<20} : {s['prompt_tokens']} ({s['cached_tokens']} cacheados, {rate:.1%})")
+            print(f"{'Tokens salida':<20} : {s['completion_tokens']}")
+        if self.finish_reasons:
+            print(f"{'finish_reason':<20} : {dict(self.finish_reasons)}")
+        print(f"{'Estados':<20} : {dict(self.statuses)}")
+        print(separator + "\n")
+
+    def write_prometheus(self):
+        """Exporta el resumen en formato de texto de Prometheus (p. ej. para node_exporter)."""
+        s = self.summary()
+        lines = [
+            "# TYPE labeling_requests_total counter",
+            *(f'labeling_requests_total{{status="{status}"}} {n}' for status, n in self.statuses.items()),
+            "# TYPE labeling_retries_total counter",
+            f"labeling_retries_total {self.retries}",
+            "# TYPE labeling_tokens_total counter",
+            f'labeling_tokens_total{{type="prompt"}} {self.prompt_tokens}',
+            f'labeling_tokens_total{{type="completion"}} {self.completion_tokens}',
+            f'labeling_tokens_total{{type="cached"}} {self.cached_tokens}',
+            "# TYPE labeling_finish_reason_total counter",
+            *(f'labeling_finish_reason_total{{reason="{reason}"}} {n}' for reason, n in self.finish_reasons.items()),
+            "# TYPE labeling_request_latency_seconds summary",
+            f'labeling_request_latency_seconds{{quantile="0.5"}} {s["latency_p50"]}',
+            f'labeling_request_latency_seconds{{quantile="0.95"}} {s["latency_p95"]}',
+            f'labeling_request_latency_seconds{{quantile="0.99"}} {s["latency_p99"]}',
+            f"labeling_request_latency_seconds_sum {sum(self.latencies)}",
+            f"labeling_request_latency_seconds_count {len(self.latencies)}",
+            "# TYPE labeling_throughput_requests_per_second gauge",
+            f"labeling_throughput_requests_per_second {s['requests_per_sec']}",
+            "# TYPE labeling_throughput_tokens_per_second gauge",
+            f"labeling_throughput_tokens_per_second {s['tokens_per_sec']}",
+            "# TYPE labeling_error_rate gauge",
+            f"labeling_error_rate {s['error_rate']}",
+        ]
+        tmp = self.prometheus_file + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, self.prometheus_file)
@@ -0,0 +1,61 @@
+import json
+
+# Conteo de tokens de entrada de una petición, sin dependencias: lo usan
+# `count_tokens` y el limitador de `rate_limit`
+
+# Overhead fijo por mensaje y por petición
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REQUEST = 3
+
+
+def normalizar_mensaje(msg: dict) -> tuple:
+    """Devuelve `(content, role)` como strings, igual que los cuenta la API."""
+    # Obtenemos el contenido. Si es None o no es string, lo manejamos.
+    content = msg.get("content", "")
+    role = msg.get("role", "")
+    
+    # 1. Si es None, lo convertimos a string vacío
+    if content is None:
+        content = ""
+    # 2. Si es una lista (multimodal/imágenes), extraemos solo el texto
+    elif isinstance(content, list):
+        text_parts = []
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "text":
+                text_parts.append(part.get("text", ""))
+        content = " ".join(text_parts)
+    # 3. Si es cualquier otra cosa (números, etc), forzamos string
+    elif not isinstance(content, str):
+        content = str(content)
+
+    # Validamos role también por seguridad
+    if not isinstance(role, str):
+        role = str(role) if role is not None else ""
+
+    return content, role
+
+def contar_tokens_request(body: dict, encoding) -> int:
+    """
+    Cuenta los tokens de entrada de un único `body` de petición
+    (mensajes + overhead por mensaje/petición + `response_format`).
+    """
+    input_tokens = 0
+
+    # --- 1. Calcular Input Tokens (Messages) ---
+    messages = body.get("messages", [])
+    for msg in messages:
+        content, role = normalizar_mensaje(msg)
+
+        input_tokens += len(encoding.encode(content))
+        input_tokens += len(encoding.encode(role))
+        input_tokens += TOKENS_PER_MESSAGE
+
+    input_tokens += TOKENS_PER_REQUEST
+
+    # --- 2. Calcular Input Tokens (Structured Outputs) ---
+    if "response_format" in body:
+        rsp_fmt = body["response_format"]
+        fmt_str = json.dumps(rsp_fmt) 
+        input_tokens += len(encoding.encode(fmt_str))
+
+    return input_tokens
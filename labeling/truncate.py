@@ -0,0 +1,436 @@
+import argparse
+import json
+import re
+
+import numpy as np
+import tiktoken
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+try:
+    from .io_utils import open_binary, open_text
+except ImportError:
+    from io_utils import open_binary, open_text
+
+# Formato de `texto` en la tarea de sensacionalismo (ver SENSACIONALISM_PROMPT)
+BODY_MARKER = "CUERPO:"
+OMITTED_MARKER = "[…]"
+
+# Fin de frase: el cuerpo sin saltos de línea se recorta por frases
+SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+
+# `custom_id` de los fragmentos: "<id>::chunk<i>-<n>"
+CHUNK_SEP = "::chunk"
+
+
+def split_article(text: str) -> tuple:
+    """
+    Separa `(cabecera, párrafos)`. La cabecera es todo lo anterior al cuerpo
+    (`TITULAR: ...` + `CUERPO:`) o, si el texto no sigue ese formato, la
+    primera línea. Los párrafos son las líneas no vacías del cuerpo.
+    """
+    marker = text.find(BODY_MARKER)
+    if marker >= 0:
+        head_end = marker + len(BODY_MARKER)
+    else:
+        head_end = text.find("\n")
+        head_end = len(text) if head_end < 0 else head_end
+    paragraphs = [p.strip() for p in text[head_end:].split("\n")]
+    return text[:head_end].strip(), [p for p in paragraphs if p]
+
+
+def chunk_id(custom_id, i: int, n: int) -> str:
+    return f"{custom_id}{CHUNK_SEP}{i}-{n}"
+
+
+def parse_chunk_id(custom_id: str) -> tuple:
+    """`(id original, índice, total)`, o `None` si el `custom_id` no es de un fragmento."""
+    base, sep, suffix = str(custom_id).rpartition(CHUNK_SEP)
+    if not sep:
+        return None
+    i, _, n = suffix.partition("-")
+    return base, int(i), int(n)
+
+
+def _join(units: list, starts: list) -> str:
+    """Une unidades consecutivas: salto de línea entre párrafos y espacio entre frases del mismo párrafo."""
+    parts = []
+    for i, (unit, start) in enumerate(zip(units, starts)):
+        if i:
+            parts.append("\n" if start else " ")
+        parts.append(unit)
+    return "".join(parts)
+
+
+class TextBudget:
+    """
+    Preprocesado de textos largos para `generate_file` (`preprocessor`):
+    limita el texto de cada petición a `max_tokens` tokens de tiktoken.
+
+    * Por defecto recorta: conserva la cabecera (titular), los primeros
+      párrafos (entradilla, `lead_ratio` del presupuesto) y los últimos
+      párrafos (cierre, el resto del presupuesto), con `[…]` en lugar de lo
+      omitido. Los párrafos demasiado largos (p. ej. un cuerpo sin saltos de
+      línea) se dividen en frases, y lo que sobre del presupuesto se llena
+      con el final de la última parte omitida.
+    * Con `chunk=True` divide el cuerpo en fragmentos de hasta `max_tokens`
+      tokens, cada uno con el titular, y cada fragmento es una petición
+      (`<id>::chunk<i>-<n>`). `combine_chunks` junta después los veredictos.
+
+    El conteo se hace por lotes completos con `encode_ordinary_batch`; solo los
+    textos que superan el límite se trocean por párrafos.
+    """
+
+    def __init__(self, max_tokens: int, lead_ratio: float = 0.6, chunk: bool = False, encoding_name: str = "o200k_base", num_threads: int = 8):
+        self.max_tokens = max_tokens
+        self.lead_ratio = lead_ratio
+        self.chunk = chunk
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.num_threads = num_threads
+        self.marker_tokens = len(self.encoding.encode_ordinary("\n" + OMITTED_MARKER + "\n"))
+        self.stats = {
+            "max_tokens": max_tokens,
+            "mode": "chunk" if chunk else "truncate",
+            "texts": 0,
+            "original_tokens": 0,
+            "kept_tokens": 0,
+            "truncated": 0,
+            "chunked": 0,
+            "chunks": 0
+        }
+
+    def _lengths(self, texts: list) -> np.ndarray:
+        encoded = self.encoding.encode_ordinary_batch(texts, num_threads=self.num_threads)
+        return np.fromiter((len(tokens) for tokens in encoded), dtype=np.int64, count=len(texts))
+
+    def _cut(self, text: str, n_tokens: int) -> str:
+        """Los primeros `n_tokens` tokens de `text`, cortando por caracteres."""
+        return text[:self._fit(text, n_tokens)]
+
+    def _cut_end(self, text: str, n_tokens: int) -> str:
+        """Los últimos `n_tokens` tokens de `text`, cortando por caracteres."""
+        return text[len(text) - self._fit(text, n_tokens, from_end=True):]
+
+    def _units(self, paragraphs: list, limit: int) -> tuple:
+        """
+        `(unidades, empieza_párrafo, longitudes)`: los párrafos, salvo los que
+        superan `limit` tokens, que se dividen en frases.
+        """
+        lengths = self._lengths(paragraphs) + 1  # +1 por el salto de línea
+        if (lengths <= limit).all():
+            return paragraphs, [True] * len(paragraphs), lengths
+        units, starts = [], []
+        for paragraph, length in zip(paragraphs, lengths):
+            sentences = [paragraph] if length <= limit else [s for s in SENTENCE_END_RE.split(paragraph) if s]
+            units.extend(sentences)
+            starts.extend([True] + [False] * (len(sentences) - 1))
+        return units, starts, self._lengths(units) + 1
+
+    def _fit(self, text: str, n_tokens: int, prefix: str = "", from_end: bool = False, at_space: bool = False) -> int:
+        """
+        Cuántos caracteres del principio de `text` (o del final, con
+        `from_end`) caben tras `prefix` en `n_tokens` tokens. Se busca sobre
+        caracteres y no sobre tokens, así el corte nunca parte un carácter
+        multibyte y el resultado, contado de nuevo, no pasa del límite. Con
+        `at_space`, el corte retrocede hasta un espacio si lo hay.
+        """
+        if n_tokens <= 0:
+            return 0
+        window = text[-n_tokens * 32:] if from_end else text[:n_tokens * 32]
+        piece = (lambda k: window[len(window) - k:]) if from_end else (lambda k: window[:k])
+        fits = lambda k: len(self.encoding.encode_ordinary(prefix + piece(k))) <= n_tokens
+        lo, hi = 0, len(window)
+        if fits(hi):
+            lo = hi
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if fits(mid):
+                lo = mid
+            else:
+                hi = mid - 1
+        if not at_space or lo == len(text):
+            return lo
+        if from_end:
+            space = window.find(" ", len(window) - lo)
+            k = len(window) - space - 1 if space >= 0 else 0
+        else:
+            k = window.rfind(" ", 0, lo + 1)
+        return k if k > 0 and fits(k) else lo
+
+    def truncate(self, text: str) -> str:
+        head, paragraphs = split_article(text)
+        if not paragraphs:
+            return self._cut(text, self.max_tokens)
+
+        head_tokens = len(self.encoding.encode_ordinary(head + "\n"))
+        budget = self.max_tokens - head_tokens - self.marker_tokens
+        if budget <= 0:
+            return self._cut(text, self.max_tokens)
+        lead_budget = int(budget * self.lead_ratio)
+        units, starts, lengths = self._units(paragraphs, max(min(lead_budget, budget - lead_budget), 1))
+
+        # Entradilla: unidades iniciales hasta `lead_ratio` del presupuesto
+        # (si ni la primera cabe, se corta por tokens)
+        n_lead = int(np.searchsorted(np.cumsum(lengths), lead_budget, side="right"))
+        lead = units[:n_lead] if n_lead else [self._cut(units[0], lead_budget)]
+        used = int(lengths[:n_lead].sum()) if n_lead else lead_budget
+
+        # Cierre: unidades finales con lo que queda del presupuesto
+        first_omitted = max(n_lead, 1)
+        rest = lengths[first_omitted:][::-1]
+        n_tail = int(np.searchsorted(np.cumsum(rest), budget - used, side="right"))
+        tail_start = len(units) - n_tail
+        tail = units[tail_start:]
+        tail_starts = starts[tail_start:]
+        used += int(rest[:n_tail].sum())
+
+        omitted = tail_start > first_omitted or not n_lead
+        start = head + "\n" + _join(lead, starts) + ("\n" + OMITTED_MARKER if omitted else "")
+
+        def assemble(tail: list, tail_starts: list) -> str:
+            return start + ("\n" + _join(tail, [True] + tail_starts[1:]) if tail else "")
+
+        # Lo que sobra se llena con el final de la última unidad omitida (las
+        # uniones entre trozos pueden tokenizarse distinto: se ajusta al final)
+        last_omitted = tail_start - 1
+        spare = budget - used - 1
+        while spare > 0 and (last_omitted >= first_omitted or not n_lead):
+            partial = self._cut_end(units[last_omitted], spare)
+            result = assemble([partial] + tail, [False] + tail_starts)
+            excess = len(self.encoding.encode_ordinary(result)) - self.max_tokens
+            if excess <= 0:
+                return result
+            spare -= excess
+
+        # Sin relleno, las uniones aún pueden pasarse por unos tokens: se suelta
+        # el principio del cierre y, en último caso, se corta el resultado
+        result = assemble(tail, tail_starts)
+        while len(self.encoding.encode_ordinary(result)) > self.max_tokens:
+            if not tail:
+                return self._cut(result, self.max_tokens)
+            tail, tail_starts = tail[1:], tail_starts[1:]
+            result = assemble(tail, tail_starts)
+        return result
+
+    def split(self, text: str) -> list:
+        head, paragraphs = split_article(text)
+        head_tokens = len(self.encoding.encode_ordinary(head + "\n"))
+        limit = self.max_tokens - head_tokens
+        if not paragraphs or limit <= 0:
+            return [self._cut(text, self.max_tokens)]
+
+        # Párrafos (o frases, o palabras, si no caben) empaquetados por su longitud
+        # estimada; cada fragmento se vuelve a contar ya unido y, si las uniones
+        # lo pasan del límite, suelta unidades del final hasta que cabe
+        units, starts, lengths = self._units(paragraphs, limit)
+        if (lengths > limit).any():
+            words, word_starts = [], []
+            for unit, start, length in zip(units, starts, lengths):
+                pieces = unit.split() if length > limit else [unit]
+                words.extend(pieces)
+                word_starts.extend([start] + [False] * (len(pieces) - 1))
+            units, starts, lengths = words, word_starts, self._lengths(words) + 1
+        else:
+            units, starts = list(units), list(starts)
+        chunks = []
+        i = 0
+        while i < len(units):
+            n = max(int(np.searchsorted(np.cumsum(lengths[i:i + limit]), limit, side="right")), 1)
+            while True:
+                chunk = head + "\n" + _join(units[i:i + n], [True] + starts[i + 1:i + n])
+                if len(self.encoding.encode_ordinary(chunk)) <= self.max_tokens:
+                    break
+                if n == 1:
+                    # Una sola palabra que no cabe (p. ej. una URL): se corta por caracteres y el resto sigue
+                    prefix = head + "\n"
+                    cut = self._fit(units[i], self.max_tokens, prefix=prefix, at_space=True)
+                    if not cut:
+                        # Ni un carácter cabe tras el titular: este trozo va sin él
+                        prefix, cut = "", max(self._fit(units[i], self.max_tokens), 1)
+                    chunk = prefix + units[i][:cut].rstrip()
+                    units[i] = units[i][cut:].lstrip()
+                    starts[i] = False
+                    lengths[i] = len(self.encoding.encode_ordinary(units[i])) + 1
+                    n = 0 if units[i] else 1
+                    break
+                n -= 1
+            chunks.append(chunk)
+            i += n
+        return chunks
+
+    def __call__(self, ids: list, texts: list) -> tuple:
+        lengths = self._lengths([t or "" for t in texts])
+        self.stats["texts"] += len(texts)
+        self.stats["original_tokens"] += int(lengths.sum())
+
+        long_rows = np.flatnonzero(lengths > self.max_tokens)
+        if len(long_rows) == 0:
+            self.stats["kept_tokens"] += int(lengths.sum())
+            return ids, texts
+
+        replacements = {pos: self.split(texts[pos]) if self.chunk else [self.truncate(texts[pos])] for pos in long_rows}
+        new_texts = [part for parts in replacements.values() for part in parts]
+        self.stats["kept_tokens"] += int(lengths.sum() - lengths[long_rows].sum() + self._lengths(new_texts).sum())
+
+        if not self.chunk:
+            self.stats["truncated"] += len(long_rows)
+            out_texts = list(texts)
+            for pos, (text,) in replacements.items():
+                out_texts[pos] = text
+            return ids, out_texts
+
+        # Los fragmentos sustituyen a su texto original en la misma posición
+        self.stats["chunked"] += len(long_rows)
+        self.stats["chunks"] += len(new_texts)
+        out_ids, out_texts = [], []
+        for pos, (custom_id, text) in enumerate(zip(ids, texts)):
+            parts = replacements.get(pos)
+            if parts is None:
+                out_ids.append(custom_id)
+                out_texts.append(text)
+            else:
+                out_ids.extend(chunk_id(custom_id, i, len(parts)) for i in range(len(parts)))
+                out_texts.extend(parts)
+        return out_ids, out_texts
+
+    def save_stats(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.stats, f, indent=2)
+
+    def print_summary(self):
+        s = self.stats
+        if s["mode"] == "chunk":
+            detail = f"{s['chunked']} textos troceados en {s['chunks']} fragmentos"
+        else:
+            detail = f"{s['truncated']} textos recortados"
+        print(f"✂️  Límite de {s['max_tokens']} tokens por texto: {detail} "
+              f"({s['original_tokens']} → {s['kept_tokens']} tokens de texto).")
+
+
+def stats_path(jsonl_file: str) -> str:
+    """Archivo de estadísticas de recorte que acompaña a un JSONL generado."""
+    return f"{jsonl_file}.truncation.json"
+
+
+def _vote(values: list, rule: str) -> bool:
+    if rule == "any":
+        return any(values)
+    if rule == "all":
+        return all(values)
+    return sum(values) * 2 > len(values)
+
+
+def combine_group(custom_id: str, parts: list, rule: str) -> dict:
+    """
+    Une los resultados de los fragmentos de un artículo en un único resultado
+    (formato Batch API). Cada campo booleano se decide por `rule` (`any`,
+    `majority` o `all`); los campos de texto se toman del primer fragmento
+    cuyo veredicto coincide con el final.
+    """
+    parts = sorted(parts, key=lambda p: p[0])
+    contents = []
+    for _, result in parts:
+        try:
+            body = (result.get("response") or {}).get("body") or {}
+            contents.append(loads(body["choices"][0]["message"]["content"]))
+        except Exception:
+            contents.append(None)
+
+    valid = [c for c in contents if isinstance(c, dict)]
+    flags = [k for k, v in (valid[0].items() if valid else ()) if isinstance(v, bool)]
+    # `any` puede decidir con fragmentos fallidos si algún fragmento ya es positivo
+    complete = len(valid) == len(parts)
+    if not valid or (not complete and not (rule == "any" and any(c.get(k) for c in valid for k in flags))):
+        return {
+            "id": f"batch_req_{custom_id}",
+            "custom_id": custom_id,
+            "response": None,
+            "error": {"message": f"{len(parts) - len(valid)} de {len(parts)} fragmentos sin respuesta válida", "code": "chunk_failed"}
+        }
+
+    combined = {k: _vote([bool(c.get(k)) for c in valid], rule) for k in flags}
+    representative = next((c for c in valid if all(c.get(k) == v for k, v in combined.items())), valid[0])
+    content = dict(representative)
+    content.update(combined)
+    for key, value in content.items():
+        if isinstance(value, str):
+            content[key] = f"[{len(parts)} fragmentos] {value}"
+
+    usage = {}
+    for _, result in parts:
+        for key, value in (((result.get("response") or {}).get("body") or {}).get("usage") or {}).items():
+            if isinstance(value, int):
+                usage[key] = usage.get(key, 0) + value
+
+    body = {"choices": [{"message": {"content": json.dumps(content, ensure_ascii=False), "role": "assistant"}}]}
+    if usage:
+        body["usage"] = usage
+    request_ids = [(result.get("response") or {}).get("request_id") for _, result in parts]
+    return {
+        "id": f"batch_req_{custom_id}",
+        "custom_id": custom_id,
+        "response": {"status_code": 200, "request_id": ",".join(r for r in request_ids if r), "body": body},
+        "error": None
+    }
+
+
+def combine_chunks(results_files: list, output_file: str, rule: str = "any") -> dict:
+    """
+    Copia los resultados y sustituye los de cada grupo de fragmentos por un
+    único resultado combinado (`combine_group`). Un grupo se escribe en cuanto
+    llegan todos sus fragmentos, así que solo se retienen los incompletos.
+    """
+    groups = {}
+    stats = {"results": 0, "articles": 0, "chunks": 0, "incomplete": 0}
+
+    with open_text(output_file, 'w') as f_out:
+        for results_file in results_files:
+            with open_binary(results_file) as f_in:
+                for line in f_in:
+                    if not line.strip():
+                        continue
+                    result = loads(line)
+                    parsed = parse_chunk_id(result.get("custom_id"))
+                    if parsed is None:
+                        f_out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                        stats["results"] += 1
+                        continue
+
+                    base, i, n = parsed
+                    parts = groups.setdefault(base, {})
+                    parts[i] = result
+                    stats["chunks"] += 1
+                    if len(parts) == n:
+                        f_out.write(json.dumps(combine_group(base, list(groups.pop(base).items()), rule), ensure_ascii=False) + '\n')
+                        stats["articles"] += 1
+                        stats["results"] += 1
+
+        # Grupos a los que les falta algún fragmento: se combinan con lo que haya
+        for base, parts in groups.items():
+            n = parse_chunk_id(next(iter(parts.values()))["custom_id"])[2]
+            missing = [(i, {"response": None, "error": {"code": "missing"}}) for i in range(n) if i not in parts]
+            f_out.write(json.dumps(combine_group(base, list(parts.items()) + missing, rule), ensure_ascii=False) + '\n')
+            stats["incomplete"] += 1
+            stats["results"] += 1
+
+    print(f"✅ {stats['articles']} artículos combinados a partir de {stats['chunks']} fragmentos ({stats['results']} resultados en '{output_file}').")
+    if stats["incomplete"]:
+        print(f"⚠️ {stats['incomplete']} artículos con fragmentos sin resultado.")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Combina los resultados de los fragmentos de artículos largos (generate_file --chunk) en un resultado por artículo."
+    )
+    parser.add_argument("-r", "--results_files", type=str, nargs="+", required=True, help="Archivos `.jsonl` de resultados (Batch API o process_async).")
+    parser.add_argument("-o", "--output_file", type=str, required=True, help="Archivo `.jsonl` con un resultado por artículo.")
+    parser.add_argument("--rule", type=str, choices=["any", "majority", "all"], default="any", help="Cómo combinar los veredictos de los fragmentos (por defecto: sensacionalista si lo es algún fragmento).")
+
+    args = parser.parse_args()
+
+    combine_chunks(args.results_files, args.output_file, args.rule)
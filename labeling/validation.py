@@ -0,0 +1,143 @@
+import json
+from collections import Counter
+
+from pydantic import TypeAdapter, ValidationError
+
+try:
+    from .generate_file import TASKS
+except ImportError:
+    from generate_file import TASKS
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _close(text: str, stack: list) -> str:
+    return text + "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def repair_json(content: str):
+    """
+    Reparación local y barata de las respuestas más habituales que no son JSON
+    válido: texto antes o después del objeto (o bloques ```json), y JSON
+    truncado (p. ej. `finish_reason="length"`), que se cierra descartando el
+    último miembro incompleto. Devuelve el JSON candidato o None; el llamador
+    debe validarlo, porque un objeto truncado puede seguir sin campos obligatorios.
+    """
+    if not content:
+        return None
+    start = content.find("{")
+    if start < 0:
+        return None
+
+    stack = []
+    in_string = escape = False
+    last_comma = None
+    for i in range(start, len(content)):
+        c = content[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in _CLOSERS:
+            stack.append(c)
+        elif c in "}]":
+            if not stack or _CLOSERS[stack[-1]] != c:
+                return None
+            stack.pop()
+            if not stack:
+                # Objeto completo: se descarta el texto posterior
+                return content[start:i + 1]
+        elif c == ",":
+            last_comma = (i, list(stack))
+
+    # Truncado: primero se cierra tal cual y, si no basta, se corta en la última coma
+    text = content[start:].rstrip()
+    if in_string:
+        text = (text[:-1] if escape else text) + '"'
+    candidates = [_close(text, stack)]
+    if last_comma is not None:
+        candidates.append(_close(content[start:last_comma[0]], last_comma[1]))
+
+    for candidate in candidates:
+        try:
+            json.loads(candidate)
+            return candidate
+        except ValueError:
+            continue
+    return None
+
+
+def _first_error(e: ValidationError) -> str:
+    error = e.errors()[0]
+    location = ".".join(str(part) for part in error.get("loc", ()))
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+class ResponseValidator:
+    """
+    Valida cada respuesta contra el modelo Pydantic de su tarea en cuanto
+    llega, con `TypeAdapter` precompilados por nombre de schema (el de
+    `response_format` en el body). Lo que no valida se intenta reparar con
+    `repair_json`; solo las respuestas que siguen sin validar se vuelven a
+    pedir, hasta `max_requeues` veces. Las peticiones con un schema
+    desconocido pasan sin validar.
+    """
+
+    def __init__(self, max_requeues: int = 1):
+        self.max_requeues = max_requeues
+        self.adapters = {schema_name: TypeAdapter(model) for _, model, schema_name in TASKS.values()}
+        self.valid = 0
+        self.repaired = 0
+        self.requeued = 0
+        self.failed = 0
+        self.errors = Counter()
+
+    def adapter(self, body: dict):
+        """`TypeAdapter` de la tarea de la petición, o None si el schema no es de este proyecto."""
+        json_schema = (body.get("response_format") or {}).get("json_schema") or {}
+        return self.adapters.get(json_schema.get("name"))
+
+    def check(self, adapter: TypeAdapter, content: str) -> tuple:
+        """Devuelve `(content, None)` si es válido (reparado si hizo falta) o `(None, error)`."""
+        if content is None:
+            self.errors["sin contenido"] += 1
+            return None, "respuesta sin contenido"
+        try:
+            adapter.validate_json(content)
+            self.valid += 1
+            return content, None
+        except ValidationError as e:
+            error = _first_error(e)
+
+        repaired = repair_json(content)
+        if repaired is not None:
+            try:
+                adapter.validate_json(repaired)
+                self.repaired += 1
+                return repaired, None
+            except ValidationError as e:
+                error = _first_error(e)
+
+        self.errors[error.split(":")[0]] += 1
+        return None, f"validación: {error}"
+
+    def print_summary(self):
+        checked = self.valid + self.repaired + sum(self.errors.values())
+        if not checked:
+            return
+        separator = "─" * 40
+        print("🧪 VALIDACIÓN DE RESPUESTAS")
+        print(separator)
+        print(f"{'Válidas':<20} : {self.valid} ({self.valid / checked:.1%})")
+        print(f"{'Reparadas':<20} : {self.repaired}")
+        print(f"{'Reencoladas':<20} : {self.requeued}")
+        print(f"{'Fallidas':<20} : {self.failed}")
+        for error, count in self.errors.most_common(5):
+            print(f"  {error:<18} : {count}")
+        print(separator + "\n")
+
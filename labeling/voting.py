@@ -0,0 +1,116 @@
+import asyncio
+import copy
+import json
+
+
+def sample_content(result: dict):
+    """Respuesta (dict) de un resultado correcto, o None si la muestra falló o no es JSON."""
+    if result.get("error") or not result.get("response"):
+        return None
+    try:
+        content = json.loads(result["response"]["body"]["choices"][0]["message"]["content"])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+    return content if isinstance(content, dict) else None
+
+
+class VotingPolicy:
+    """
+    Votación por autoconsistencia adaptativa: en lugar de pedir siempre
+    `max_samples` respuestas por noticia, se piden primero `min_agree` en
+    paralelo y, si coinciden en todos los campos booleanos (`is_clickbait`,
+    `is_sensationalist`), se para ahí. Solo los casos disputados reciben más
+    muestras, y únicamente las que aún pueden decidir la mayoría estricta de
+    `max_samples`.
+
+    Con `min_agree > max_samples / 2` (p. ej. 3 de 5) el veredicto es siempre
+    el mismo que el de la votación fija a `max_samples`: en cuanto una opción
+    alcanza la mayoría estricta, las muestras restantes ya no pueden cambiarlo.
+
+    Cada resultado lleva un campo `voting` con las muestras usadas, los votos
+    y el grado de acuerdo (fracción de votos del veredicto) de cada campo.
+    """
+
+    def __init__(self, max_samples: int = 5, min_agree: int = 3):
+        if not 1 <= min_agree <= max_samples:
+            raise ValueError("❌ Se necesita 1 <= min_agree <= max_samples.")
+        self.max_samples = max_samples
+        self.min_agree = min_agree
+        self.items = 0
+        self.samples = 0
+        self.contested = 0
+        self.failed = 0
+
+    def _missing(self, votes: dict, n_valid: int) -> int:
+        """Muestras adicionales mínimas para que todos los campos alcancen la mayoría estricta."""
+        majority = self.max_samples // 2 + 1
+        return max(majority - max(sum(v), n_valid - sum(v)) for v in votes.values())
+
+    async def run(self, custom_id, request) -> dict:
+        """`request()` devuelve una corrutina que produce un resultado en formato Batch API."""
+        results = list(await asyncio.gather(*(request() for _ in range(self.min_agree))))
+
+        while True:
+            contents = [c for c in map(sample_content, results) if c is not None]
+            fields = [k for k, v in contents[0].items() if isinstance(v, bool)] if contents else []
+            votes = {k: [bool(c.get(k)) for c in contents] for k in fields}
+            remaining = self.max_samples - len(results)
+            unanimous = len(contents) >= self.min_agree and all(len(set(v)) == 1 for v in votes.values())
+
+            if not fields or unanimous or remaining <= 0:
+                break
+            missing = self._missing(votes, len(contents))
+            if missing <= 0:
+                break
+            results.extend(await asyncio.gather(*(request() for _ in range(min(missing, remaining)))))
+
+        self.items += 1
+        self.samples += len(results)
+        if len(results) > self.min_agree:
+            self.contested += 1
+        if not contents:
+            self.failed += 1
+            return results[0]
+
+        # Veredicto por mayoría en cada campo; en caso de empate, el de la primera muestra
+        verdict = {}
+        for k, v in votes.items():
+            trues = sum(v)
+            verdict[k] = v[0] if trues * 2 == len(v) else trues * 2 > len(v)
+
+        # La respuesta que se guarda es la de la primera muestra que coincide con el veredicto
+        position = next((i for i, c in enumerate(contents) if all(c.get(k) == verdict[k] for k in fields)), 0)
+        valid_results = [r for r in results if sample_content(r) is not None]
+        result = copy.deepcopy(valid_results[position])
+        content = dict(contents[position])
+        content.update(verdict)
+        result["response"]["body"]["choices"][0]["message"]["content"] = json.dumps(content, ensure_ascii=False)
+
+        usage = {}
+        for r in results:
+            for key, value in ((((r.get("response") or {}).get("body") or {}).get("usage")) or {}).items():
+                if isinstance(value, int):
+                    usage[key] = usage.get(key, 0) + value
+        if usage:
+            result["response"]["body"]["usage"] = usage
+
+        result["voting"] = {
+            "samples": len(results),
+            "valid_samples": len(contents),
+            "votes": {k: {"true": sum(v), "false": len(v) - sum(v)} for k, v in votes.items()},
+            "agreement": {k: round(max(sum(v), len(v) - sum(v)) / len(v), 4) for k, v in votes.items()}
+        }
+        return result
+
+    def print_summary(self):
+        if not self.items:
+            return
+        fixed = self.items * self.max_samples
+        separator = "─" * 40
+        print("🗳️  VOTACIÓN ADAPTATIVA")
+        print(separator)
+        print(f"{'Noticias':<20} : {self.items} ({self.contested} disputadas, {self.failed} sin respuesta válida)")
+        print(f"{'Muestras':<20} : {self.samples} ({self.samples / self.items:.2f} por noticia)")
+        print(f"{'Votación fija':<20} : {fixed} ({self.max_samples} por noticia)")
+        print(f"{'Ahorro':<20} : {fixed - self.samples} llamadas ({(fixed - self.samples) / fixed:.1%})")
+        print(separator + "\n")
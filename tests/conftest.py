@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Los tests importan el paquete `labeling` desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def encoding():
+    """Encoding `o200k_base` de tiktoken (se descarga la primera vez; sin red, se omiten los tests que lo usan)."""
+    import tiktoken
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        pytest.skip(f"encoding de tiktoken no disponible: {e}")
@@ -0,0 +1,66 @@
+import json
+import os
+
+from labeling.checkpoint import Checkpoint
+
+
+def write_results(output_file, ids, resume=False):
+    checkpoint = Checkpoint(output_file, sync_every=2)
+    with checkpoint.open(resume=resume):
+        for custom_id in ids:
+            checkpoint.write({"custom_id": custom_id, "response": {"body": "x" * 20}})
+
+
+def read_ids(output_file):
+    with open(output_file, encoding="utf-8") as f:
+        return [json.loads(line)["custom_id"] for line in f]
+
+
+def test_load_truncates_a_partial_output_line(tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    write_results(output, ["a", "b", "c"])
+    with open(output, "ab") as f:
+        f.write(b'{"custom_id": "d", "resp')
+
+    assert Checkpoint(output).load() == {"a", "b", "c"}
+    assert read_ids(output) == ["a", "b", "c"]
+
+
+def test_load_ignores_journal_entries_beyond_the_output(tmp_path):
+    # Corte de luz: el diario llegó a disco, pero las dos últimas líneas de la salida no
+    output = str(tmp_path / "out.jsonl")
+    write_results(output, ["a", "b", "c", "d", "e"])
+    with open(output, "rb") as f:
+        lines = f.readlines()
+    with open(output, "wb") as f:
+        f.write(b"".join(lines[:3]) + lines[3][:10])
+
+    assert Checkpoint(output).load() == {"a", "b", "c"}
+    assert read_ids(output) == ["a", "b", "c"]
+    with open(output + ".ckpt", encoding="utf-8") as f:
+        assert [json.loads(line)[1] for line in f] == ["a", "b", "c"]
+
+    # Al reanudar, las entradas descartadas no reaparecen aunque la salida vuelva a crecer
+    write_results(output, ["d", "e", "f", "g"], resume=True)
+    assert Checkpoint(output).load() == {"a", "b", "c", "d", "e", "f", "g"}
+    assert read_ids(output) == ["a", "b", "c", "d", "e", "f", "g"]
+
+
+def test_load_ignores_an_unterminated_journal_entry(tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    write_results(output, ["a", "b"])
+    journal = output + ".ckpt"
+    with open(journal, "rb+") as f:
+        f.truncate(os.path.getsize(journal) - 1)
+
+    assert Checkpoint(output).load() == {"a"}
+    assert read_ids(output) == ["a"]
+
+
+def test_load_without_output_discards_the_journal(tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    write_results(output, ["a", "b"])
+    os.remove(output)
+
+    assert Checkpoint(output).load() == set()
+    assert os.path.getsize(output + ".ckpt") == 0
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+from openai import AsyncOpenAI
+
+from labeling.client_pool import ClientPool, Endpoint
+from labeling.retry import RetryPolicy
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # Cola de conexiones suficiente para las peticiones concurrentes de los tests
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Los clientes cancelados cierran la conexión antes de la respuesta
+        pass
+
+
+REQUEST = {"model": "gpt-5-mini", "messages": [{"role": "user", "content": "Titular"}]}
+
+
+class StubServer:
+    """
+    Endpoint de chat completions local. Cada petición consume la siguiente
+    respuesta de `script` (`(status, cabeceras)`); sin guion responde 200 con
+    el nombre del servidor como contenido.
+    """
+
+    def __init__(self, name: str, delay: float = 0.0):
+        self.name = name
+        self.delay = delay
+        self.script = []
+        self.hits = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("content-length", 0)))
+                server.hits += 1
+                time.sleep(server.delay)
+                status, headers = server.script.pop(0) if server.script else (200, {})
+                if status == 200:
+                    body = {
+                        "id": f"{server.name}-{server.hits}",
+                        "object": "chat.completion",
+                        "created": 0,
+                        "model": REQUEST["model"],
+                        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": server.name}}],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11}
+                    }
+                else:
+                    body = {"error": {"message": f"HTTP {status}", "type": "error"}}
+                out = json.dumps(body).encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.httpd = StubHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def endpoint(self, weight: float = 1.0) -> Endpoint:
+        return Endpoint(self.name, AsyncOpenAI(api_key="test", base_url=self.url, max_retries=0), weight=weight)
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(name, delay=0.0):
+        server = StubServer(name, delay)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.httpd.shutdown()
+        server.httpd.server_close()
+
+
+def test_rotation_follows_weights(servers):
+    a, b = servers("a", delay=0.05), servers("b", delay=0.05)
+
+    async def main():
+        pool = ClientPool([a.endpoint(weight=3), b.endpoint(weight=1)])
+        responses = await asyncio.gather(*(pool.chat.completions.create(**REQUEST) for _ in range(40)))
+        return pool, [r.choices[0].message.content for r in responses]
+
+    pool, served_by = asyncio.run(main())
+    assert served_by.count("a") + served_by.count("b") == 40
+    assert served_by.count("a") > 2 * served_by.count("b") > 0
+    assert [e.requests for e in pool.endpoints] == [a.hits, b.hits]
+    assert all(e.outstanding == 0 for e in pool.endpoints)
+
+
+def test_rate_limited_endpoint_cools_down_and_fails_over(servers):
+    a, b = servers("a"), servers("b")
+    a.script = [(429, {"retry-after": "30"})]
+
+    async def main():
+        pool = ClientPool([a.endpoint(), b.endpoint()])
+        policy = RetryPolicy(max_retries=2)
+        started = time.monotonic()
+        first = await policy.run(lambda: pool.chat.completions.create(**REQUEST))
+        elapsed = time.monotonic() - started
+        rest = [await pool.chat.completions.create(**REQUEST) for _ in range(5)]
+        return pool, policy, first, rest, elapsed
+
+    pool, policy, first, rest, elapsed = asyncio.run(main())
+    endpoint_a = pool.endpoints[0]
+    # El reintento va a `b` al momento: el `Retry-After` solo enfría `a`
+    assert first.choices[0].message.content == "b"
+    assert elapsed < 5
+    assert policy.retries["rate_limit"] == 1
+    assert endpoint_a.errors == 1
+    assert endpoint_a.cooldown_until - time.monotonic() > 20
+    assert all(r.choices[0].message.content == "b" for r in rest)
+    assert a.hits == 1
+
+
+def test_server_errors_use_exponential_cooldown(servers):
+    a = servers("a")
+    a.script = [(500, {}), (503, {})]
+
+    async def main():
+        pool = ClientPool([a.endpoint()], base_cooldown=0.1)
+        endpoint = pool.endpoints[0]
+        cooldowns = []
+        for _ in range(2):
+            with pytest.raises(openai.InternalServerError):
+                await pool.chat.completions.create(**REQUEST)
+            cooldowns.append(endpoint.cooldown_until - time.monotonic())
+            endpoint.cooldown_until = 0.0
+        response = await pool.chat.completions.create(**REQUEST)
+        return endpoint, cooldowns, response
+
+    endpoint, cooldowns, response = asyncio.run(main())
+    assert cooldowns[0] == pytest.approx(0.1, abs=0.05)
+    assert cooldowns[1] == pytest.approx(0.2, abs=0.05)
+    assert response.choices[0].message.content == "a"
+    assert endpoint.consecutive_failures == 0
+
+
+def test_all_endpoints_cooling_waits_for_first_cooldown_once(servers):
+    a = servers("a")
+    a.script = [(429, {"retry-after-ms": "300"})]
+
+    async def main():
+        pool = ClientPool([a.endpoint()])
+        policy = RetryPolicy(max_retries=2)
+        started = time.monotonic()
+        response = await policy.run(lambda: pool.chat.completions.create(**REQUEST))
+        return response, time.monotonic() - started
+
+    response, elapsed = asyncio.run(main())
+    # Se espera el enfriamiento del endpoint, sin sumarle la espera de `RetryPolicy`
+    assert response.choices[0].message.content == "a"
+    assert 0.25 < elapsed < 0.55
+
+
+def test_cancelled_call_is_not_counted(servers):
+    a = servers("a", delay=1.0)
+
+    async def main():
+        pool = ClientPool([a.endpoint()])
+        endpoint = pool.endpoints[0]
+        endpoint.consecutive_failures = 2
+        task = asyncio.create_task(pool.chat.completions.create(**REQUEST))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return endpoint
+
+    endpoint = asyncio.run(main())
+    assert endpoint.outstanding == 0
+    assert endpoint.requests == 0
+    assert endpoint.errors == 0
+    assert endpoint.consecutive_failures == 2
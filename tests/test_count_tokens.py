@@ -0,0 +1,106 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from labeling.count_tokens import ContadorTokens, analizar_costos_jsonl
+from labeling.generate_file import TASKS, build_envelope
+
+
+def contar_original(lines, encoding) -> tuple:
+    """Bucle de `analizar_costos_jsonl` antes de `ContadorTokens`: `(tokens, líneas, líneas con error)`."""
+    total = 0
+    line_count = 0
+    errores = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        line_count += 1
+        try:
+            body = json.loads(line).get("body", {})
+            for msg in body.get("messages", []):
+                content = msg.get("content", "")
+                role = msg.get("role", "")
+                if content is None:
+                    content = ""
+                elif isinstance(content, list):
+                    content = " ".join(p.get("text", "") for p in content if isinstance(p, dict) and p.get("type") == "text")
+                elif not isinstance(content, str):
+                    content = str(content)
+                if not isinstance(role, str):
+                    role = str(role) if role is not None else ""
+                total += len(encoding.encode(content))
+                total += len(encoding.encode(role))
+                total += 3
+            total += 3
+            if "response_format" in body:
+                total += len(encoding.encode(json.dumps(body["response_format"])))
+        except Exception:
+            errores += 1
+    return total, line_count, errores
+
+
+def request_lines() -> list:
+    prompt, model, schema_name = TASKS["clickbait"]
+    head, middle, tail = build_envelope("gpt-5-mini", prompt, model.model_json_schema(), schema_name)
+    texts = [
+        "Titular normal sobre la economía",
+        "No vas a creer lo que pasó <|endoftext|> después",
+        "Texto con <|fim_prefix|> en medio",
+        "Café, niño y 東京 🚀",
+        "<|endoftext|>",
+        "<| no es un token especial |>"
+    ] * 3
+    lines = [head + json.dumps(f"id-{i}") + middle + json.dumps(text, ensure_ascii=False) + tail for i, text in enumerate(texts)]
+
+    body = {"model": "gpt-5-mini", "messages": [{"role": "system", "content": prompt}]}
+    lines += [
+        json.dumps({"custom_id": "rol", "body": {**body, "messages": body["messages"] + [{"role": "<|endoftext|>", "content": "hola"}]}}) + "\n",
+        json.dumps({"custom_id": "lista", "body": {**body, "messages": body["messages"] + [{"role": "user", "content": [{"type": "text", "text": "a <|endoftext|>"}]}]}}) + "\n",
+        json.dumps({"custom_id": "none", "body": {**body, "messages": body["messages"] + [{"role": "user", "content": None}, 7]}}) + "\n",
+        json.dumps({"custom_id": "sin_formato", "body": {**body, "messages": body["messages"] + [{"role": "user", "content": 12345}]}}) + "\n",
+        "{no es json\n",
+        "\n"
+    ]
+    return lines
+
+
+@pytest.mark.parametrize("batch_size,threads", [(1, 1), (4, 1), (4096, 2)])
+def test_contar_lineas_matches_original_counter(encoding, batch_size, threads):
+    lines = request_lines()
+    total, line_count, errores = contar_original(lines, encoding)
+
+    contador = ContadorTokens(encoding, batch_size=batch_size, threads=threads)
+    result = contador.contar_lineas(line.encode("utf-8") for line in lines)
+
+    assert result[0] == total
+    assert result[1] == line_count
+    assert len(result[2]) == errores
+
+
+def test_analizar_costos_matches_original_counter(encoding, tmp_path, capsys):
+    lines = request_lines() * 50
+    path = tmp_path / "requests.jsonl"
+    path.write_text("".join(lines), encoding="utf-8")
+    total, _, _ = contar_original(lines, encoding)
+
+    for workers in (1, 3):
+        assert analizar_costos_jsonl(str(path), workers=workers)["input_tokens"] == total
+
+
+def modulos_cargados(module: str) -> set:
+    """Módulos pesados que arrastra importar `module` en un intérprete limpio."""
+    code = f"import sys, {module}; print(' '.join(sorted(sys.modules)))"
+    loaded = set(subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parents[1], check=True, capture_output=True, text=True).stdout.split())
+    return loaded & {"pyarrow", "pandas", "labeling.count_tokens", "labeling.generate_file", "labeling.local_model", "labeling.truncate"}
+
+
+def test_rate_limit_does_not_import_report_dependencies():
+    assert modulos_cargados("labeling.rate_limit") == set()
+
+
+def test_count_tokens_imports_report_dependencies_lazily():
+    assert modulos_cargados("labeling.count_tokens") == {"labeling.count_tokens"}
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from labeling.dedup import dedup_parquet, find_near_duplicates, lsh_clusters
+
+
+def test_lsh_clusters_does_not_chain_through_intermediate_rows():
+    # A~B y B~C (0.85) pero A≁C (0.70): C no puede acabar en el grupo de A
+    a = np.arange(100, dtype=np.uint64)
+    b = a.copy()
+    b[:15] += 1000
+    c = b.copy()
+    c[15:30] += 1000
+    d = a.copy()
+    d[90:] += 1000
+    signatures = np.stack([a, b, c, d])
+
+    assert lsh_clusters(signatures, bands=20, threshold=0.8).tolist() == [0, 0, 2, 0]
+
+
+def test_find_near_duplicates_groups_suffix_and_punctuation_variants(tmp_path):
+    df = pd.DataFrame({"texto": [
+        "El Gobierno aprueba la reforma de las pensiones - EFE",
+        "Un terremoto sacude el sur de Chile",
+        "el gobierno aprueba la reforma de las pensiones | Europa Press",
+        "¡El Gobierno aprueba la reforma de las pensiones!",
+    ]})
+    representatives = find_near_duplicates(df, index_dir=str(tmp_path / "index"), batch_size=3)
+    assert representatives.tolist() == [0, 1, 0, 0]
+
+
+def test_dedup_parquet_streams_representatives_and_mapping(tmp_path):
+    rng = np.random.default_rng(0)
+    words = "gobierno crisis fútbol mercado elecciones tormenta festival ciencia hospital juicio tren museo".split()
+    texts = [" ".join(rng.choice(words, size=12)) for _ in range(50)]
+    texts[10] = texts[3] + " - EFE"
+    texts[45] = texts[3].upper()
+    texts[30] = texts[20] + " | Europa Press"
+    source = tmp_path / "news.parquet"
+    pq.write_table(pa.table({"id": [f"n-{i}" for i in range(50)], "texto": texts, "n": list(range(50))}), source, row_group_size=16)
+
+    output, mapping = tmp_path / "reps.parquet", tmp_path / "map.jsonl"
+    rows, representatives = dedup_parquet(str(source), str(output), str(mapping), index_dir=str(tmp_path / "index"), batch_size=8)
+
+    assert (rows, representatives) == (50, 47)
+    written = pq.read_table(output)
+    assert written.schema.equals(pq.read_schema(source))
+    assert written.column("n").to_pylist() == [i for i in range(50) if i not in (10, 30, 45)]
+    with open(mapping, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert entries == [
+        {"custom_id": "n-10", "representative_id": "n-3"},
+        {"custom_id": "n-30", "representative_id": "n-20"},
+        {"custom_id": "n-45", "representative_id": "n-3"},
+    ]
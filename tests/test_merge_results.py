@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from labeling import merge_results as merge_module
+from labeling.merge_results import merge_results
+
+
+def result_line(custom_id, content=None, error=None) -> str:
+    if error:
+        return json.dumps({"custom_id": custom_id, "response": None, "error": {"message": error}}) + "\n"
+    body = {"choices": [{"message": {"content": content, "role": "assistant"}}]}
+    return json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "request_id": f"req-{custom_id}", "body": body}, "error": None}) + "\n"
+
+
+def label(is_clickbait: bool) -> str:
+    return json.dumps({"clickbait_reasoning": "motivo", "is_clickbait": is_clickbait})
+
+
+@pytest.fixture
+def files(tmp_path):
+    n = 1000
+    source = tmp_path / "news.parquet"
+    pq.write_table(pa.table({"id": [f"n-{i}" for i in range(n)], "texto": [f"texto {i}" for i in range(n)]}), source, row_group_size=128)
+
+    lines = [result_line(f"n-{i}", label(i % 4 == 0)) for i in range(0, n, 2)]
+    lines += [
+        # Error y después correcto: gana el correcto
+        result_line("n-1", error="timeout"),
+        result_line("n-1", label(True)),
+        # Correcto y después error: se conserva el correcto
+        result_line("n-3", label(True)),
+        result_line("n-3", error="server_error"),
+        # Dos correctos: gana el último
+        result_line("n-5", label(False)),
+        result_line("n-5", label(True)),
+        # Solo errores: queda el último error
+        result_line("n-7", error="primero"),
+        result_line("n-7", error="segundo"),
+        # JSON truncado que se repara y contenido inválido
+        result_line("n-9", label(True)[:-1]),
+        result_line("n-11", "no es json"),
+        # Resultados sin fila en el origen
+        result_line("fuera-1", label(True)),
+        result_line("fuera-2", label(False))
+    ]
+    results = tmp_path / "results.jsonl"
+    results.write_text("".join(lines), encoding="utf-8")
+    return str(results), str(source), str(tmp_path / "merged.parquet")
+
+
+def check(output_file, stats):
+    rows = {row["id"]: row for row in pq.read_table(output_file).to_pylist()}
+    assert len(rows) == 1000
+    assert rows["n-0"]["is_clickbait"] is True and rows["n-0"]["request_id"] == "req-n-0"
+    assert rows["n-2"]["is_clickbait"] is False
+    assert rows["n-1"]["is_clickbait"] is True and rows["n-1"]["error"] is None
+    assert rows["n-3"]["is_clickbait"] is True and rows["n-3"]["error"] is None
+    assert rows["n-5"]["is_clickbait"] is True
+    assert rows["n-7"]["is_clickbait"] is None and rows["n-7"]["error"] == "segundo"
+    assert rows["n-9"]["is_clickbait"] is True
+    assert rows["n-11"]["is_clickbait"] is None and rows["n-11"]["error"].startswith("validación")
+    assert rows["n-13"]["is_clickbait"] is None and rows["n-13"]["error"] is None
+    assert stats == {"rows": 1000, "merged": 506, "errors": 2, "unmatched": 2}
+
+
+def test_merge_results_joins_streamed_labels(files, capsys):
+    results, source, output = files
+    check(output, merge_results([results], source, output, validate_batch_size=64, row_group_size=100))
+
+
+def test_merge_results_with_hash_collisions(files, monkeypatch, capsys):
+    # Un hash de 3 valores fuerza colisiones entre ids distintos
+    monkeypatch.setattr(merge_module, "_hashes", lambda ids: np.array([hash(x) % 3 for x in ids.to_pylist()], dtype=np.int64))
+    results, source, output = files
+    check(output, merge_results([results], source, output, validate_batch_size=64, row_group_size=100))
+
+
+def test_merge_results_without_results(files, tmp_path, capsys):
+    _, source, output = files
+    empty = tmp_path / "empty.jsonl"
+    empty.write_text("", encoding="utf-8")
+    stats = merge_results([str(empty)], source, output)
+    assert stats == {"rows": 1000, "merged": 0, "errors": 0, "unmatched": 0}
+    assert pq.read_table(output).column("is_clickbait").null_count == 1000
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import json
+import os
+import types
+
+import openai
+import pytest
+
+from labeling.orchestrate import BatchOrchestrator, OrchestratorState
+
+
+def connection_error():
+    return openai.APIConnectionError(request=None)
+
+
+def status_error(status_code: int):
+    response = types.SimpleNamespace(status_code=status_code, headers={}, request=None)
+    return openai.APIStatusError(f"HTTP {status_code}", response=response, body=None)
+
+
+class FakeStreamResponse:
+    def __init__(self, data: bytes, status_code: int, drop_at: int = None):
+        self.data = data
+        self.status_code = status_code
+        self.drop_at = drop_at
+
+    async def iter_bytes(self, chunk_size: int):
+        for start in range(0, len(self.data), 7):
+            if self.drop_at is not None and start >= self.drop_at:
+                raise connection_error()
+            yield self.data[start:start + 7]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeAsyncOpenAI:
+    """
+    `files` y `batches` de `AsyncOpenAI` en memoria. Cada batch pasa por
+    `in_progress` y termina con el siguiente estado de `outcomes[shard]`
+    (uno por envío; `completed` si no quedan). `hold=True` deja todos los
+    batches en curso, para simular un proceso interrumpido. Con
+    `partials[shard] = n`, un batch de ese shard que no se completa devuelve
+    la salida de sus `n` primeras peticiones.
+    """
+
+    def __init__(self, outcomes: dict = None, hold: bool = False, partials: dict = None):
+        self.outcomes = {name: list(statuses) for name, statuses in (outcomes or {}).items()}
+        self.hold = hold
+        self.partials = partials or {}
+        self.uploads = {}
+        self.contents = {}
+        self.batch_list = {}
+        self.calls = {"files.create": 0, "batches.create": 0}
+        self.retrieve_errors = []
+        self.drops = {}
+        self.ranges = []
+        self.files = types.SimpleNamespace(
+            create=self._create_file,
+            with_streaming_response=types.SimpleNamespace(content=self._content)
+        )
+        self.batches = types.SimpleNamespace(create=self._create_batch, retrieve=self._retrieve)
+
+    async def _create_file(self, file, purpose):
+        self.calls["files.create"] += 1
+        file_id = f"file-{len(self.uploads)}"
+        self.uploads[file_id] = (os.path.basename(file.name), file.read())
+        return types.SimpleNamespace(id=file_id)
+
+    async def _create_batch(self, input_file_id, endpoint, completion_window, metadata):
+        self.calls["batches.create"] += 1
+        batch_id = f"batch-{len(self.batch_list)}"
+        shard, _ = self.uploads[input_file_id]
+        self.batch_list[batch_id] = {"shard": shard, "input_file_id": input_file_id, "polls": 0}
+        return types.SimpleNamespace(id=batch_id, status="validating")
+
+    async def _retrieve(self, batch_id):
+        if self.retrieve_errors:
+            raise self.retrieve_errors.pop(0)
+        batch = self.batch_list[batch_id]
+        batch["polls"] += 1
+        if self.hold or batch["polls"] < 2:
+            return types.SimpleNamespace(status="in_progress", output_file_id=None, error_file_id=None)
+        if "status" not in batch:
+            pending = self.outcomes.get(batch["shard"], [])
+            batch["status"] = pending.pop(0) if pending else "completed"
+        output_id, error_id = f"{batch_id}-output", f"{batch_id}-errors"
+        _, lines = self.uploads[batch["input_file_id"]]
+        if batch["status"] != "completed":
+            if batch["shard"] not in self.partials:
+                return types.SimpleNamespace(status=batch["status"], output_file_id=None, error_file_id=None)
+            lines = b"".join(lines.splitlines(keepends=True)[:self.partials[batch["shard"]]])
+            self.contents[output_id] = lines.replace(b'"method"', b'"response": {"status_code": 200}, "method"')
+            return types.SimpleNamespace(status=batch["status"], output_file_id=output_id, error_file_id=None)
+
+        self.contents[output_id] = lines.replace(b'"method"', b'"response": {"status_code": 200}, "method"')
+        self.contents[error_id] = b'{"custom_id": "x", "error": {"code": "invalid"}}\n'
+        return types.SimpleNamespace(status="completed", output_file_id=output_id, error_file_id=error_id)
+
+    def _content(self, file_id, extra_headers=None):
+        data = self.contents[file_id]
+        offset = int(extra_headers["Range"][len("bytes="):-1]) if extra_headers else 0
+        self.ranges.append((file_id, offset))
+        return FakeStreamResponse(data[offset:], 206 if offset else 200, self.drops.pop(file_id, None))
+
+
+@pytest.fixture
+def shards(tmp_path):
+    paths = []
+    for name in ("shard_0", "shard_1"):
+        path = tmp_path / f"{name}.jsonl"
+        lines = [{"custom_id": f"{name}-{i}", "method": "POST", "url": "/v1/chat/completions", "body": {}} for i in range(20)]
+        path.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def orchestrator(client, tmp_path, max_submissions=3):
+    state = OrchestratorState(str(tmp_path / "out" / "orchestrator_state.json"))
+    return BatchOrchestrator(client, state, str(tmp_path / "out"), max_submissions=max_submissions, min_poll_interval=0, max_poll_interval=0)
+
+
+def read_state(tmp_path):
+    with open(tmp_path / "out" / "orchestrator_state.json", encoding="utf-8") as f:
+        return json.load(f)["shards"]
+
+
+def test_run_uploads_polls_and_downloads_with_checksum(tmp_path, shards):
+    client = FakeAsyncOpenAI()
+    asyncio.run(orchestrator(client, tmp_path).run(shards))
+
+    state = read_state(tmp_path)
+    assert client.calls == {"files.create": 2, "batches.create": 2}
+    for shard in shards:
+        entry = state[shard]
+        assert entry["status"] == "downloaded"
+        assert entry["submissions"] == 1
+        with open(entry["output_file"], "rb") as f:
+            content = f.read()
+        assert content.count(b"\n") == 20
+        with open(entry["output_file"] + ".sha256", encoding="utf-8") as f:
+            assert f.read().split()[0] == hashlib.sha256(content).hexdigest()
+        assert os.path.exists(entry["error_file"])
+        assert not os.path.exists(entry["output_file"] + ".part")
+
+
+@pytest.mark.parametrize("status", ["failed", "expired"])
+def test_run_resubmits_failed_or_expired_shard(tmp_path, shards, status):
+    client = FakeAsyncOpenAI(outcomes={"shard_1.jsonl": [status]})
+    asyncio.run(orchestrator(client, tmp_path).run(shards))
+
+    state = read_state(tmp_path)
+    assert state[shards[0]]["submissions"] == 1
+    assert state[shards[1]]["submissions"] == 2
+    assert state[shards[1]]["status"] == "downloaded"
+    # El reenvío reutiliza el archivo ya subido
+    assert client.calls == {"files.create": 2, "batches.create": 3}
+
+
+def read_ids(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["custom_id"] for line in f]
+
+
+@pytest.mark.parametrize("status", ["expired", "cancelled"])
+def test_run_resubmits_only_requests_missing_from_partial_output(tmp_path, shards, status):
+    client = FakeAsyncOpenAI(outcomes={"shard_1.jsonl": [status]}, partials={"shard_1.jsonl": 12})
+    asyncio.run(orchestrator(client, tmp_path).run(shards))
+
+    entry = read_state(tmp_path)[shards[1]]
+    assert entry["status"] == "downloaded"
+    assert entry["submissions"] == 2
+    assert len(entry["partial_outputs"]) == 1
+    partial, rest = read_ids(entry["partial_outputs"][0]), read_ids(entry["output_file"])
+    assert partial == [f"shard_1-{i}" for i in range(12)]
+    assert rest == [f"shard_1-{i}" for i in range(12, 20)]
+    # Se sube un archivo nuevo solo con las peticiones que faltaban
+    assert client.calls == {"files.create": 3, "batches.create": 3}
+    name, content = client.uploads["file-2"]
+    assert name == "shard_1.remaining1.jsonl" and content.count(b"\n") == 8
+
+
+def test_run_does_not_resubmit_when_partial_output_is_complete(tmp_path, shards):
+    client = FakeAsyncOpenAI(outcomes={"shard_0.jsonl": ["expired"]}, partials={"shard_0.jsonl": 20})
+    asyncio.run(orchestrator(client, tmp_path).run(shards))
+
+    entry = read_state(tmp_path)[shards[0]]
+    assert entry["status"] == "downloaded"
+    assert entry["submissions"] == 1
+    assert len(read_ids(entry["partial_outputs"][0])) == 20
+    assert client.calls == {"files.create": 2, "batches.create": 2}
+
+
+def test_run_gives_up_after_max_submissions(tmp_path, shards):
+    client = FakeAsyncOpenAI(outcomes={"shard_0.jsonl": ["failed", "failed"]})
+    asyncio.run(orchestrator(client, tmp_path, max_submissions=2).run(shards))
+
+    state = read_state(tmp_path)
+    assert state[shards[0]]["status"] == "gave_up:failed"
+    assert state[shards[0]]["submissions"] == 2
+    assert state[shards[1]]["status"] == "downloaded"
+
+
+def test_transient_errors_keep_polling_and_resume_download(tmp_path, shards):
+    client = FakeAsyncOpenAI()
+    client.retrieve_errors = [connection_error(), status_error(503)]
+    client.drops = {"batch-0-output": 50}
+    asyncio.run(orchestrator(client, tmp_path).run(shards))
+
+    state = read_state(tmp_path)
+    assert all(state[shard]["status"] == "downloaded" for shard in shards)
+    # La descarga cortada se reanuda con `Range` desde lo ya escrito
+    resumed = [offset for file_id, offset in client.ranges if file_id == "batch-0-output"]
+    assert resumed[0] == 0 and resumed[1] >= 49
+    with open(state[shards[0]]["output_file"], "rb") as f:
+        assert f.read() == client.contents["batch-0-output"]
+
+
+def test_non_retryable_error_is_raised(tmp_path, shards):
+    client = FakeAsyncOpenAI()
+    client.retrieve_errors = [status_error(401)]
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(orchestrator(client, tmp_path).run(shards))
+
+
+def test_run_resumes_from_state_file(tmp_path, shards):
+    client = FakeAsyncOpenAI(hold=True)
+
+    async def interrupted():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(orchestrator(client, tmp_path).run(shards), timeout=0.2)
+
+    asyncio.run(interrupted())
+    state = read_state(tmp_path)
+    assert all(state[shard]["batch_id"] is not None for shard in shards)
+
+    # Nuevo proceso: lee orchestrator_state.json y sigue consultando los mismos batches
+    client.hold = False
+    asyncio.run(orchestrator(client, tmp_path).run(shards))
+
+    state = read_state(tmp_path)
+    assert client.calls == {"files.create": 2, "batches.create": 2}
+    assert all(state[shard]["status"] == "downloaded" for shard in shards)
@@ -0,0 +1,98 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from labeling.cache import ResponseCache
+from labeling.generate_file import TASKS, response_format
+from labeling.runner import Runner
+from labeling.validation import ResponseValidator
+
+VALID = json.dumps({"clickbait_reasoning": "motivo", "is_clickbait": True})
+
+
+class FakeClient:
+    """Cliente con `chat.completions.create` que devuelve `contents` por orden y cuenta las llamadas."""
+
+    def __init__(self, contents, delay=0.0):
+        self.contents = list(contents)
+        self.delay = delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        content = self.contents[min(self.calls, len(self.contents)) - 1]
+        await asyncio.sleep(self.delay)
+        message = SimpleNamespace(content=content, role="assistant")
+        return SimpleNamespace(id=f"req-{self.calls}", choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None)
+
+
+def line(custom_id, text="Titular"):
+    prompt, model, schema_name = TASKS["clickbait"]
+    body = {
+        "model": "gpt-5-mini",
+        "messages": [{"role": "system", "content": prompt}, {"role": "user", "content": text}],
+        "response_format": response_format(model.model_json_schema(), schema_name)
+    }
+    return {"custom_id": custom_id, "body": body}
+
+
+def content_of(result):
+    return result["response"]["body"]["choices"][0]["message"]["content"]
+
+
+async def process_in_order(runner, lines):
+    return [await runner.process(item) for item in lines]
+
+
+def test_invalid_responses_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    client = FakeClient(["no es json", VALID])
+    results = asyncio.run(process_in_order(Runner(client, cache=cache), [line("a"), line("b"), line("c")]))
+
+    # Sin --validate la respuesta inválida se devuelve tal cual, pero no se guarda
+    assert [content_of(r) for r in results] == ["no es json", VALID, VALID]
+    assert client.calls == 2
+    assert (cache.hits, cache.misses, cache.coalesced) == (1, 2, 0)
+    cache.close()
+
+
+def test_repaired_response_is_cached_after_validation(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    client = FakeClient(["Respuesta: " + VALID[:-1]])
+    runner = Runner(client, cache=cache, validator=ResponseValidator(max_requeues=0))
+    results = asyncio.run(process_in_order(runner, [line("a"), line("b")]))
+
+    assert [content_of(r) for r in results] == [VALID, VALID]
+    assert client.calls == 1
+    cache.close()
+
+
+def test_coalesced_requests_are_not_counted_as_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    client = FakeClient([VALID], delay=0.05)
+    runner = Runner(client, cache=cache)
+
+    async def main():
+        return await asyncio.gather(*(runner.process(line(f"id-{i}")) for i in range(5)))
+
+    results = asyncio.run(main())
+    assert [content_of(r) for r in results] == [VALID] * 5
+    assert client.calls == 1
+    assert (cache.hits, cache.misses, cache.coalesced) == (0, 1, 4)
+    cache.close()
+
+
+def test_waiters_request_again_when_the_first_response_is_invalid(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"))
+    client = FakeClient(["no es json", VALID], delay=0.05)
+    runner = Runner(client, cache=cache, concurrency=1)
+
+    async def main():
+        return await asyncio.gather(runner.process(line("a")), runner.process(line("b")))
+
+    results = asyncio.run(main())
+    assert [content_of(r) for r in results] == ["no es json", VALID]
+    assert client.calls == 2
+    assert (cache.hits, cache.misses, cache.coalesced) == (0, 2, 0)
+    cache.close()
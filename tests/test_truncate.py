@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from labeling.truncate import TextBudget
+
+WORDS = "el gobierno anuncia año señal 東京 über café 🚀 escándalo niño crisis".split()
+
+
+def random_article(rng: random.Random) -> str:
+    """Artículo con párrafos cortos, largos con frases, largos sin puntuación, multibyte y palabras enormes."""
+    paragraphs = []
+    for _ in range(rng.randint(1, 12)):
+        kind = rng.random()
+        if kind < 0.4:
+            words = rng.choices(WORDS, k=rng.randint(3, 40))
+            paragraphs.append(" ".join(words) + ".")
+        elif kind < 0.7:
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(4, 60))).capitalize() + rng.choice(".!?…") for _ in range(rng.randint(5, 40))]
+            paragraphs.append(" ".join(sentences))
+        elif kind < 0.9:
+            paragraphs.append(" ".join(rng.choices(WORDS, k=rng.randint(200, 1500))))
+        else:
+            paragraphs.append("x" * rng.randint(300, 1500) + " " + "ñ🚀" * rng.randint(100, 500))
+    return "TITULAR: " + " ".join(rng.choices(WORDS, k=8)) + "\nCUERPO:\n" + "\n".join(paragraphs)
+
+
+@pytest.mark.parametrize("max_tokens", [100, 300, 1000])
+def test_chunks_never_exceed_max_tokens(encoding, max_tokens):
+    rng = random.Random(max_tokens)
+    budget = TextBudget(max_tokens, chunk=True)
+    for _ in range(40):
+        text = random_article(rng)
+        chunks = budget.split(text)
+        for chunk in chunks:
+            assert len(encoding.encode_ordinary(chunk)) <= max_tokens
+            assert "�" not in chunk
+        # No se pierde ni se duplica texto del cuerpo
+        body = text.split("CUERPO:", 1)[1]
+        kept = "".join(chunk.split("CUERPO:", 1)[1] for chunk in chunks)
+        assert "".join(kept.split()) == "".join(body.split())
+
+
+@pytest.mark.parametrize("max_tokens", [100, 300, 1000])
+def test_truncate_never_exceeds_max_tokens(encoding, max_tokens):
+    rng = random.Random(max_tokens)
+    budget = TextBudget(max_tokens)
+    for _ in range(40):
+        result = budget.truncate(random_article(rng))
+        assert len(encoding.encode_ordinary(result)) <= max_tokens